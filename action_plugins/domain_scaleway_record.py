@@ -0,0 +1,271 @@
+# encoding: utf-8
+
+# Action plugin of domain_scaleway_record, running on the controller.
+#
+# Without deferred, it runs the module as usual. With deferred: true, the
+# record is only queued, and a task with flush: true (typically a handler
+# with run_once) sends all the records queued for a dns zone as one PATCH,
+# through the domain_scaleway_records module.
+#
+# Each task of each host runs in its own forked worker process, so the queues
+# are kept in lock protected files on the controller, one directory per
+# ansible-playbook process, removed once its queues are flushed.
+#
+# The module supports async as any module. Queuing and flushing do not: they
+# run on the controller, and the flush result is needed to requeue the records.
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.common.validation import check_type_int
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.plugins.action import ActionBase
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+DEFAULT_ENDPOINT = 'https://api.scaleway.com'
+DEFAULT_VERSION = 'v2alpha2'
+DEFERRED_DIR_ENV = 'SCALEWAY_DOMAIN_DEFERRED_DIR'
+DEFAULT_DEFERRED_DIR = os.path.join('~', '.ansible', 'tmp', 'scaleway_domain_deferred')
+
+# the choices of domain_scaleway_record
+RECORD_TYPES = ('A', 'AAAA', 'MX', 'CNAME', 'TXT', 'SRV', 'TLSA', 'NS', 'PTR', 'CAA')
+RECORD_STATES = ('present', 'absent')
+RECORD_OPTIONS = ('name', 'type', 'content', 'ttl', 'priority', 'comment', 'state', 'unique')
+# options of the flush task passed through to domain_scaleway_records
+FLUSH_OPTIONS = ('verify_certs', 'max_retries', 'rate_limit', 'rate_limit_dir', 'chunk_size', 'zone_cache', 'zone_cache_dir',
+                 'collect_metrics')
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def deferred_record(args):
+    # checked as domain_scaleway_record checks it: an invalid record queued
+    # would fail the flush of its whole dns zone, run after run
+    record = dict((option, args[option]) for option in RECORD_OPTIONS if args.get(option) is not None)
+    for option, choices in (('type', RECORD_TYPES), ('state', RECORD_STATES)):
+        if option in record and record[option] not in choices:
+            raise AnsibleActionFail('value of {} must be one of: {}, got: {}' . format(option, ', ' . join(choices), record[option]))
+    for option, convert in (('ttl', check_type_int), ('priority', check_type_int), ('unique', boolean)):
+        if option in record:
+            try:
+                record[option] = convert(record[option])
+            except TypeError as e:
+                raise AnsibleActionFail('{}: {}' . format(option, e))
+    if record.get('state', 'present') == 'present' and record.get('unique') and not record.get('content') and record['type'] != 'CNAME':
+        raise AnsibleActionFail('content empty')
+    return record
+
+
+def run_id(pid):
+    # a pid alone is reused by later runs (the first pids of a container), so
+    # the start time of the process is added when /proc has it
+    try:
+        with open('/proc/{}/stat' . format(pid)) as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return str(pid)
+    # the name of the command, in parentheses, may hold spaces
+    return '{}-{}' . format(pid, stat[stat.rindex(')') + 2:].split()[19])
+
+
+def process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def remove_stale_queues(base):
+    # the queues left by runs which are gone (without a flush), before their
+    # pid could be given to this one
+    for name in os.listdir(base):
+        try:
+            pid = int(name.split('-')[0])
+        except ValueError:
+            continue
+        if not process_running(pid) or run_id(pid) != name:
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+
+def queue_dir():
+    # the workers are forked from the ansible-playbook process, which
+    # identifies the run
+    base = os.environ.get(DEFERRED_DIR_ENV) or DEFAULT_DEFERRED_DIR
+    return os.path.join(os.path.expanduser(base), run_id(os.getppid()))
+
+
+@contextmanager
+def locked_queue(mode):
+    path = queue_dir()
+    lock_path = os.path.join(path, 'queue.lock')
+    while True:
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path, 0o700)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+            else:
+                remove_stale_queues(os.path.dirname(path))
+        try:
+            lock_file = open(lock_path, 'a')
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                continue
+            raise
+        if HAS_FCNTL:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # the queue may have been removed by a flush while waiting for the lock
+        try:
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                break
+        except OSError:
+            pass
+        lock_file.close()
+    try:
+        with open(os.path.join(path, 'queue.jsonl'), mode) as f:
+            yield f
+    finally:
+        if HAS_FCNTL:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def remove_empty_queue():
+    with locked_queue('a+') as f:
+        f.seek(0)
+        if f.read().strip():
+            return
+        path = os.path.dirname(f.name)
+        os.remove(f.name)
+        os.remove(os.path.join(path, 'queue.lock'))
+        os.rmdir(path)
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+    _supports_async = True
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        args = dict(self._task.args)
+        deferred = boolean(args.pop('deferred', False), strict=False)
+        flush = boolean(args.pop('flush', False), strict=False)
+
+        if (flush or deferred) and self._task.async_val:
+            raise AnsibleActionFail('async is not supported with deferred or flush')
+
+        if flush:
+            result.update(self.flush(args, task_vars))
+        elif deferred:
+            result.update(self.defer(args, task_vars))
+        else:
+            wrap_async = self._task.async_val and not self._connection.has_native_async
+            result.update(self._execute_module(module_name='domain_scaleway_record', module_args=args, task_vars=task_vars,
+                                               wrap_async=wrap_async))
+        return result
+
+    def defer(self, args, task_vars):
+        for option in ('token', 'dns_zone', 'name', 'type'):
+            if not args.get(option):
+                raise AnsibleActionFail('{} is required' . format(option))
+
+        entry = {
+            "endpoint": args.get('endpoint') or DEFAULT_ENDPOINT,
+            "version": args.get('version') or DEFAULT_VERSION,
+            "dns_zone": args['dns_zone'],
+            "token": token_hash(args['token']),
+            "host": task_vars.get('inventory_hostname'),
+            "record": deferred_record(args),
+        }
+        with locked_queue('a') as f:
+            f.write(json.dumps(entry) + '\n')
+
+        # changed, so the task can notify the handler flushing the queue
+        return dict(changed=True, deferred=True, dns_zone=args['dns_zone'], record=entry['record'])
+
+    def flush(self, args, task_vars):
+        if not args.get('token'):
+            raise AnsibleActionFail('token is required')
+        token = token_hash(args['token'])
+        dns_zone = args.get('dns_zone')
+
+        # take the entries of this token (and zone), leave the others queued
+        taken = []
+        with locked_queue('a+') as f:
+            f.seek(0)
+            left = []
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry['token'] == token and dns_zone in (None, entry['dns_zone']):
+                    taken.append(entry)
+                else:
+                    left.append(line)
+            f.seek(0)
+            f.truncate()
+            f.writelines(left)
+
+        queues = {}
+        queues_order = []
+        for entry in taken:
+            key = (entry['endpoint'], entry['version'], entry['dns_zone'])
+            if key not in queues:
+                queues[key] = []
+                queues_order.append(key)
+            queues[key].append(entry)
+
+        results = []
+        dns_zones = []
+        metrics = []
+        changed = False
+        for position, key in enumerate(queues_order):
+            endpoint, version, zone = key
+            module_args = dict((option, args[option]) for option in FLUSH_OPTIONS if args.get(option) is not None)
+            module_args.update(
+                token=args['token'],
+                endpoint=endpoint,
+                version=version,
+                dns_zone=zone,
+                records=[entry['record'] for entry in queues[key]],
+            )
+            module_result = self._execute_module(module_name='domain_scaleway_records', module_args=module_args, task_vars=task_vars)
+            if module_result.get('failed'):
+                # queue again the records not sent, for a next flush
+                with locked_queue('a') as f:
+                    for requeued in queues_order[position:]:
+                        f.writelines(json.dumps(entry) + '\n' for entry in queues[requeued])
+                module_result['msg'] = 'flush of {} failed: {}' . format(zone, module_result.get('msg'))
+                return module_result
+
+            changed = changed or module_result.get('changed', False)
+            dns_zones.extend(module_result.get('dns_zones', []))
+            if 'metrics' in module_result:
+                metrics.append(dict(module_result['metrics'], dns_zone=zone))
+            for entry, item in zip(queues[key], module_result.get('results', [])):
+                item['host'] = entry['host']
+                results.append(item)
+
+        remove_empty_queue()
+        result = dict(changed=changed, flushed=len(taken), dns_zones=dns_zones, results=results)
+        if metrics:
+            # one run of domain_scaleway_records per dns zone
+            result['metrics'] = metrics
+        return result
@@ -0,0 +1,329 @@
+# encoding: utf-8
+
+# Callback plugin profiling the domain_scaleway_* tasks of a playbook run.
+#
+# Each run of a module on a host is timed on the controller, with the metrics
+# of its requests when the module returns them (collect_metrics). At the end
+# of the run, a summary shows the slowest tasks, the requests per dns zone,
+# the identical GET requests sent more than once, the latency percentiles
+# and retries per endpoint. The same data can be written as JSON, and as a
+# Chrome trace (chrome://tracing, Perfetto) with a row per host.
+
+import json
+import os
+import re
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    name: scaleway_domain_profile
+    type: aggregate
+    short_description: Profile the Scaleway Domain API usage of the domain_scaleway_* tasks
+    description:
+        - This is a summary of the time and requests of the domain_scaleway_* tasks at the end of the run
+        - The requests are known when the modules return their metrics, collect_metrics is set for the modules run on the controller
+    requirements:
+        - enable in configuration (callbacks_enabled = scaleway_domain_profile)
+    options:
+        json_path:
+            description: Write the profile as JSON to this file
+            env:
+                - name: SCALEWAY_DOMAIN_PROFILE_JSON
+            ini:
+                - section: callback_scaleway_domain_profile
+                  key: json_path
+            type: path
+        trace_path:
+            description: Write a Chrome trace of the tasks and requests to this file
+            env:
+                - name: SCALEWAY_DOMAIN_PROFILE_TRACE
+            ini:
+                - section: callback_scaleway_domain_profile
+                  key: trace_path
+            type: path
+        top:
+            description: Number of lines of each part of the summary
+            env:
+                - name: SCALEWAY_DOMAIN_PROFILE_TOP
+            ini:
+                - section: callback_scaleway_domain_profile
+                  key: top
+            type: int
+            default: 10
+        collect_metrics:
+            description:
+                - Set SCALEWAY_DOMAIN_COLLECT_METRICS for the modules run on the controller (--connection=local), so they return their metrics
+                - On other hosts, set collect_metrics with module_defaults
+            env:
+                - name: SCALEWAY_DOMAIN_PROFILE_COLLECT_METRICS
+            ini:
+                - section: callback_scaleway_domain_profile
+                  key: collect_metrics
+            type: bool
+            default: true
+'''
+
+COLLECT_METRICS_ENV = 'SCALEWAY_DOMAIN_COLLECT_METRICS'
+MODULE_PREFIX = 'domain_scaleway_'
+PERCENTILES = (50, 95, 99)
+ZONE_PATH = re.compile(r'^/dns-zones/([^/]+)')
+
+
+def module_name(action):
+    # the action may be the fully qualified name of a collection
+    return (action or '').rsplit('.', 1)[-1]
+
+
+def percentile(values, rank):
+    """Nearest rank percentile of sorted values."""
+    if not values:
+        return None
+    index = max(0, -(-len(values) * rank // 100) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def endpoint(call):
+    """Method and path of a request, without the dns zone, domain or contact it is about."""
+    parts = call['path'].split('/')
+    # /collection/id/sub-collection: the odd parts are identifiers
+    return "{} {}" . format(call['method'], '/'.join('*' if index % 2 == 0 and index else part
+                                                     for index, part in enumerate(parts)))
+
+
+def call_zone(call, metrics):
+    match = ZONE_PATH.match(call['path'])
+    if match:
+        return match.group(1)
+    return metrics.get('dns_zone')
+
+
+def call_query(call):
+    params = call.get('params') or {}
+    if not params:
+        return call['path']
+    return "{}?{}" . format(call['path'], '&'.join("{}={}" . format(key, params[key]) for key in sorted(params)))
+
+
+def result_metrics(result):
+    """Metrics returned by a module: one, a list (flush of deferred records), or one per loop item."""
+    metrics = result.get('metrics')
+    if isinstance(metrics, dict):
+        return [metrics]
+    if isinstance(metrics, list):
+        return [item for item in metrics if isinstance(item, dict)]
+    found = []
+    for item in result.get('results') or []:
+        if isinstance(item, dict):
+            found.extend(result_metrics(item))
+    return found
+
+
+def build_profile(runs, top):
+    """Summary of the runs of the modules: tasks, dns zones, duplicate requests and endpoints."""
+    zones = {}
+    endpoints = {}
+    requests = {}
+    for run in runs:
+        for metrics in run['metrics']:
+            for call in metrics.get('calls') or []:
+                zone = call_zone(call, metrics)
+                if zone is not None:
+                    stats = zones.setdefault(zone, {"dns_zone": zone, "requests": 0, "retries": 0, "latency": 0.0,
+                                                    "bytes_received": 0, "tasks": set()})
+                    stats['requests'] += 1
+                    stats['retries'] += call.get('retries', 0)
+                    stats['latency'] += call.get('latency', 0.0)
+                    stats['bytes_received'] += call.get('bytes_received', 0)
+                    stats['tasks'].add(run['task'])
+
+                stats = endpoints.setdefault(endpoint(call), {"latencies": [], "retries": 0, "errors": 0})
+                stats['latencies'].append(call.get('latency', 0.0))
+                stats['retries'] += call.get('retries', 0)
+                if not 200 <= (call.get('status') or 0) < 300:
+                    stats['errors'] += 1
+
+                if call['method'] == 'GET':
+                    stats = requests.setdefault(call_query(call), {"count": 0, "tasks": set()})
+                    stats['count'] += 1
+                    stats['tasks'].add(run['task'])
+
+    tasks = {}
+    for run in runs:
+        stats = tasks.setdefault(run['task_id'], {"task": run['task'], "module": run['module'], "hosts": 0,
+                                                  "duration": 0.0, "api_time": 0.0, "requests": 0, "retries": 0,
+                                                  "failed": 0})
+        stats['hosts'] += 1
+        stats['duration'] += run['duration']
+        stats['failed'] += run['status'] in ('failed', 'unreachable')
+        for metrics in run['metrics']:
+            stats['api_time'] += metrics.get('api_time', 0.0)
+            stats['requests'] += metrics.get('requests', 0)
+            stats['retries'] += metrics.get('retries', 0)
+
+    per_endpoint = []
+    for name, stats in endpoints.items():
+        latencies = sorted(stats['latencies'])
+        entry = {"endpoint": name, "requests": len(latencies), "retries": stats['retries'], "errors": stats['errors'],
+                 "max": latencies[-1]}
+        for rank in PERCENTILES:
+            entry["p{}" . format(rank)] = percentile(latencies, rank)
+        per_endpoint.append(entry)
+
+    duplicates = [{"request": "GET {}" . format(query), "count": stats['count'], "tasks": sorted(stats['tasks'])}
+                  for query, stats in requests.items() if stats['count'] > 1]
+
+    for stats in zones.values():
+        stats['tasks'] = len(stats['tasks'])
+
+    return {
+        "runs": len(runs),
+        "duration": sum(run['duration'] for run in runs),
+        "requests": sum(stats['requests'] for stats in tasks.values()),
+        "retries": sum(stats['retries'] for stats in tasks.values()),
+        "api_time": sum(stats['api_time'] for stats in tasks.values()),
+        "duplicate_requests": sum(entry['count'] - 1 for entry in duplicates),
+        "tasks": sorted(tasks.values(), key=lambda stats: -stats['duration'])[:top],
+        "dns_zones": sorted(zones.values(), key=lambda stats: (-stats['requests'], stats['dns_zone']))[:top],
+        "duplicates": sorted(duplicates, key=lambda entry: (-entry['count'], entry['request']))[:top],
+        "endpoints": sorted(per_endpoint, key=lambda entry: (-entry['requests'], entry['endpoint'])),
+    }
+
+
+def trace_events(runs):
+    """Chrome trace events: a row per host, the task runs and their requests inside."""
+    events = []
+    threads = {}
+    for run in runs:
+        if run['host'] not in threads:
+            threads[run['host']] = len(threads) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": threads[run['host']],
+                           "args": {"name": run['host']}})
+        tid = threads[run['host']]
+        events.append({"name": run['task'], "cat": run['module'], "ph": "X", "pid": 1, "tid": tid,
+                       "ts": int(run['start'] * 1e6), "dur": int(run['duration'] * 1e6),
+                       "args": {"status": run['status']}})
+        # each module started total_time before its result, the items of a
+        # loop ran one after the other
+        end = run['start'] + run['duration']
+        for metrics in reversed(run['metrics']):
+            module_start = max(run['start'], end - metrics.get('total_time', 0.0))
+            end = module_start
+            for call in metrics.get('calls') or []:
+                events.append({"name": endpoint(call), "cat": "api", "ph": "X", "pid": 1, "tid": tid,
+                               "ts": int((module_start + call['start']) * 1e6),
+                               "dur": int((call.get('latency', 0.0) + call.get('wait', 0.0)) * 1e6),
+                               "args": dict((key, call[key]) for key in ('path', 'params', 'status', 'retries')
+                                            if key in call)})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class CallbackModule(CallbackBase):
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'scaleway_domain_profile'
+    CALLBACK_NEEDS_ENABLED = True
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.started = time.time()
+        self.task_started = {}
+        self.runs = []
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        # the modules run on the controller inherit the environment of the workers
+        if self.get_option('collect_metrics'):
+            os.environ.setdefault(COLLECT_METRICS_ENV, '1')
+
+    def profiled(self, task):
+        return module_name(task.action).startswith(MODULE_PREFIX)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        if self.profiled(task):
+            self.task_started[task._uuid] = time.time()
+
+    def v2_runner_on_start(self, host, task):
+        if self.profiled(task):
+            self.task_started[(task._uuid, host.get_name())] = time.time()
+
+    def record(self, result, status):
+        task = result._task
+        if not self.profiled(task):
+            return
+        host = result._host.get_name()
+        now = time.time()
+        started = self.task_started.get((task._uuid, host), self.task_started.get(task._uuid, now))
+        self.runs.append({
+            "task": task.get_name(),
+            "task_id": task._uuid,
+            "module": module_name(task.action),
+            "host": host,
+            "status": status,
+            "start": started - self.started,
+            "duration": now - started,
+            "metrics": result_metrics(result._result),
+        })
+
+    def v2_runner_on_ok(self, result):
+        self.record(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.record(result, 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self.record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self.record(result, 'unreachable')
+
+    def profile(self):
+        return build_profile(self.runs, self.get_option('top'))
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.runs:
+            return
+        profile = self.profile()
+        self.display_profile(profile)
+
+        if self.get_option('json_path'):
+            with open(self.get_option('json_path'), 'w') as f:
+                json.dump(dict(profile, runs=self.runs), f, indent=2, sort_keys=True)
+        if self.get_option('trace_path'):
+            with open(self.get_option('trace_path'), 'w') as f:
+                json.dump(trace_events(self.runs), f)
+
+    def display_profile(self, profile):
+        display = self._display.display
+        self._display.banner('SCALEWAY DOMAIN PROFILE')
+        display("{} runs of domain_scaleway_* modules in {:.2f}s, {} api requests ({} retries, {} duplicate GET) "
+                "in {:.2f}s of api time" . format(profile['runs'], profile['duration'], profile['requests'],
+                                                  profile['retries'], profile['duplicate_requests'], profile['api_time']))
+        if not profile['requests']:
+            display("no request metrics: set collect_metrics for the modules which do not run on the controller")
+
+        display("\nTasks:")
+        for stats in profile['tasks']:
+            display("  {:9.2f}s  {:5} requests  {:4} retries  {} host(s)  {} ({})" . format(
+                stats['duration'], stats['requests'], stats['retries'], stats['hosts'], stats['task'], stats['module']))
+
+        if profile['dns_zones']:
+            display("\nRequests per dns zone:")
+            for stats in profile['dns_zones']:
+                display("  {:6} requests  {:4} retries  {:9.2f}s  {:10} bytes  {} task(s)  {}" . format(
+                    stats['requests'], stats['retries'], stats['latency'], stats['bytes_received'], stats['tasks'],
+                    stats['dns_zone']))
+
+        if profile['duplicates']:
+            display("\nIdentical GET requests:")
+            for entry in profile['duplicates']:
+                display("  {:6}x  {}  ({})" . format(entry['count'], entry['request'], ', '.join(entry['tasks'])))
+
+        if profile['endpoints']:
+            display("\nLatency per endpoint (s):")
+            for entry in profile['endpoints']:
+                display("  {:6} requests  p50 {:.3f}  p95 {:.3f}  p99 {:.3f}  max {:.3f}  {:4} retries  {:4} errors  {}" . format(
+                    entry['requests'], entry['p50'], entry['p95'], entry['p99'], entry['max'], entry['retries'],
+                    entry['errors'], entry['endpoint']))
@@ -1,12 +1,19 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+from ansible.module_utils.scaleway_domain import (
+    DEFAULT_MAX_CONCURRENCY,
+    ScalewayDomainAPI,
+    ScalewayDomainAPIError,
+    error_data,
+    run_concurrently,
+    scaleway_domain_argument_spec,
+)
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+import threading
+import time
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -36,11 +43,37 @@ options:
             - This is action requested (get_domain)
         required: true
 
-    domain:
+    id:
+        description:
+            - The id of the contact
+            - One of id or ids is required
+        required: false
+
+    ids:
+        description:
+            - List of contact ids to run the action on, max_concurrency at a time
+        required: false
+
+    contact:
         description:
-            - The domain to manage
+            - The fields of the contact to update, the fields not set are left as they are
+            - update_contact reads the contact first and only sends the fields which differ, nothing when none does
         required: false
 
+    max_concurrency:
+        description:
+            - Maximum number of contacts processed in parallel with ids
+        required: false
+        default: 4
+
+    fail_fast:
+        description:
+            - With ids, stop starting new contacts once one failed
+            - Otherwise every contact is tried, and the module fails at the end if one of them failed
+        required: false
+        type: bool
+        default: True
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -53,6 +86,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -66,6 +125,17 @@ EXAMPLES = '''
         token: "ZETZEGERHG35ERHGERHERSDGDSGS"
         action: "get_contact"
         id: "abcd1234
+
+# To update the email of several contacts, only the ones with another email are written
+- name: update contacts
+    domain_scaleway_contact:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        action: "update_contact"
+        ids:
+            - "abcd1234"
+            - "efgh5678"
+        contact:
+            email: "hostmaster@example.com"
 ```
 '''
 
@@ -75,9 +145,88 @@ meta:
     data: The json error message
 contents:
     the contact
+diff:
+    the fields of the contact before and after update_contact, with --diff
+data:
+    the fields sent by update_contact (or which would be sent in check mode)
+contacts:
+    with ids, the result of each contact (id, changed, failed, msg, meta, contents, data, elapsed, and diff with --diff), skipped when fail_fast stopped before it
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
 
+def contact_changes(current, requested):
+    """Fields of the requested contact which differ from the current contact, unset fields are ignored."""
+    return dict((key, value) for key, value in (requested or {}).items() if value is not None and current.get(key) != value)
+
+
+def contact_request(api, method, path, data=None):
+    response = api.send(method, path, data=data)
+    if not 200 <= response.status_code < 300:
+        raise ScalewayDomainAPIError('Your request failed', response)
+    return response
+
+
+def run_action(module, api, contact_id):
+    """Result of the action on a contact, raises ScalewayDomainAPIError when a request fails.
+
+    update_contact reads the contact and only sends the fields which differ.
+    """
+    path = "/contacts/{}" . format(contact_id)
+    response = contact_request(api, 'GET', path)
+    current = response.json()
+    result = dict(changed=False, meta={"status": response.status_code}, contents=current)
+    if module.params['action'] == 'get_contact':
+        return result
+
+    changes = contact_changes(current, module.params['contact'])
+    result['data'] = changes
+    if module._diff:
+        result['diff'] = {
+            "before": dict((key, current.get(key)) for key in changes),
+            "after": changes,
+        }
+    if not changes:
+        return result
+
+    result['changed'] = True
+    # in check mode, the fields which would be sent are only reported
+    if not module.check_mode:
+        response = contact_request(api, 'PATCH', path, changes)
+        result.update(meta={"status": response.status_code}, contents=response.json())
+    return result
+
+
+def run_contacts(module, api):
+    """Run the action on several contacts, max_concurrency at a time, and exit with the result of each one."""
+    stop = threading.Event()
+
+    def run(contact_id):
+        if stop.is_set():
+            return {"id": contact_id, "changed": False, "skipped": True}
+        start = time.time()
+        try:
+            result = run_action(module, api, contact_id)
+        except ScalewayDomainAPIError as e:
+            result = dict(changed=False, failed=True, msg=str(e))
+            if e.response is not None:
+                result['meta'] = {"status": e.response.status_code, "data": error_data(e.response)}
+            module.log('{} {}: {}' . format(module.params['action'], contact_id, e))
+            if module.params['fail_fast']:
+                stop.set()
+        result.update(id=contact_id, elapsed=round(time.time() - start, 3))
+        return result
+
+    results = run_concurrently(run, module.params['ids'], module.params['max_concurrency'])
+    failed = [result['id'] for result in results if result.get('failed')]
+    changed = any(result['changed'] for result in results)
+    if failed:
+        module.fail_json(msg='{} of {} contacts failed: {}' . format(len(failed), len(results), ', '.join(failed)),
+                         changed=changed, contacts=results)
+    module.exit_json(changed=changed, meta={"status": 200}, contacts=results)
+
+
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
@@ -95,59 +244,38 @@ def run_module():
         lang=dict(type='str', required=False),
         resale=dict(type='str', required=False),
     )
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(
         action=dict(choices=['get_contact', 'update_contact'], required=True),
-        id=dict(type='str', required=True),
+        id=dict(type='str', required=False),
+        ids=dict(type='list', elements='str', required=False),
         contact=dict(type='dict', options=contact_args),
-        token=dict(type='str', required=True),
-        verify_certs=dict(type='bool', required=False)
+        max_concurrency=dict(type='int', required=False, default=DEFAULT_MAX_CONCURRENCY),
+        fail_fast=dict(type='bool', required=False, default=True),
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[['id', 'ids']],
+        required_one_of=[['id', 'ids']],
+        required_if=[['action', 'update_contact', ['contact']]],
         supports_check_mode=True
     )
+    collect_metrics(module)
 
-    if module.check_mode:
-        return result
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
+    api = ScalewayDomainAPI(module)
 
-    result['original_message'] = module.params['action']
-    result['message'] = 'working'
+    if module.params['ids'] is not None:
+        run_contacts(module, api)
 
-    headers = {
-        "x-auth-token": module.params['token']
-    }
-
-    url_contact = "{}/domain/{}/contacts/{}" . format(module.params['endpoint'], module.params['version'], module.params['id'])
-
-    contents = []
-    if module.params['action'] == 'get_contact':
-        result = requests.get(url_contact, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'update_contact':
-        data = module.params['contact']
-        result = requests.patch(url_contact, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-
-    module.exit_json(meta= {"status": result.status_code}, contents=contents)
+    try:
+        result = run_action(module, api, module.params['id'])
+    except ScalewayDomainAPIError as e:
+        api.fail_error(e)
+    module.exit_json(**result)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_contact', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
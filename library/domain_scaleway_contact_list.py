@@ -1,12 +1,10 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, scaleway_domain_argument_spec, scaleway_domain_pagination_spec
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -41,6 +39,18 @@ options:
             - The domain to manage
         required: false
 
+    page_size:
+        description:
+            - Number of items fetched per page of the api
+        required: false
+        default: 1000
+
+    max_concurrency:
+        description:
+            - Maximum number of pages fetched in parallel
+        required: false
+        default: 4
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -53,6 +63,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -79,59 +115,42 @@ meta:
     data: The json error message
 contents:
     list of contacts
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_pagination_spec())
+    module_args.update(
         action=dict(choices=['list_contacts'], required=True),
         domain=dict(type='str', required=False, default=''),
-        token=dict(type='str', required=True),
-        verify_certs=dict(type='bool', required=False)
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
+    collect_metrics(module)
 
-    if module.check_mode:
-        return result
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
-
-    result['original_message'] = module.params['action']
-    result['message'] = 'working'
-
-    headers = {
-        "x-auth-token": module.params['token']
-    }
+    # this module only reads, it runs as usual in check mode
+    api = ScalewayDomainAPI(module)
 
-    url_list_contacts = "{}/domain/{}/contacts" . format(module.params['endpoint'], module.params['version'])
+    params = {}
     if module.params['domain'] != '':
-        url_list_contacts = "{}?domain={}" . format(url_list_contacts, module.params['domain'])
+        params['domain'] = module.params['domain']
 
     contents = []
     if module.params['action'] == 'list_contacts':
-        result = requests.get(url_list_contacts, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results['contacts']
+        contents = list(api.paginate("/contacts", 'contacts', params=params))
 
-    module.exit_json(meta= {"status": result.status_code}, contents=contents)
+    module.exit_json(changed=False, meta= {"status": 200}, contents=contents)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_contact_list', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
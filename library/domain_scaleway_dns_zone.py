@@ -1,13 +1,49 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
+from ansible.module_utils.scaleway_domain import (
+    DNS_ZONE_FAILED_STATUSES,
+    DNS_ZONE_PENDING_STATUSES,
+    ScalewayDomainAPI,
+    run_concurrently,
+    scaleway_domain_argument_spec,
+    scaleway_domain_pagination_spec,
+    scaleway_domain_wait_spec,
+    wait_error,
+    wait_for_status,
+)
+from ansible.module_utils.scaleway_domain_cache import invalidate_zone, read_zone_records, scaleway_domain_cache_spec, zone_cache
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+from ansible.module_utils.scaleway_domain_records import (
+    PRIORITY_TYPES,
+    ZoneRecords,
+    format_records,
+    get_dns_zone,
+    keep_zone_ns,
+    normalize_data,
+    normalize_name,
+    plan_zone_import,
+    records_diff,
+    split_changes,
+)
+from ansible.module_utils.scaleway_domain_zonefile import ZoneFileError, ZoneFileParser, entries
 import base64
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+import copy
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_TTL = 86400
+DEFAULT_CHUNK_SIZE = 500
+MAX_ERRORS = 20
+# base64 characters decoded at a time by export_raw with dest, a multiple of 4
+EXPORT_CHUNK_SIZE = 4 * 65536
+# bytes of the export searched for the SOA
+EXPORT_HEAD_SIZE = 65536
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -35,7 +71,26 @@ options:
     dns_zone:
         description:
             - This is the dns zone requested
-        required: true
+            - One of dns_zone, dns_zones or domain is required
+        required: false
+
+    dns_zones:
+        description:
+            - List of dns zones to run the action on, max_concurrency at a time (all the actions but import_raw)
+        required: false
+
+    domain:
+        description:
+            - Run the action on all the dns zones of this domain, as dns_zones
+        required: false
+
+    fail_fast:
+        description:
+            - With dns_zones or domain, stop starting new dns zones once one failed
+            - Otherwise every dns zone is tried, and the module fails at the end if one of them failed
+        required: false
+        type: bool
+        default: True
     
     refresh_recreate_dns_zone:
         description:
@@ -46,6 +101,21 @@ options:
         description:
             - Recreate the sub dns zone records after refresh
         required: false
+
+    wait:
+        description:
+            - With refresh, wait until the dns zone is no longer pending, polling it with a growing delay
+            - Fails if the dns zone ends in error, or is still pending after wait_timeout
+            - Not done in check mode
+        required: false
+        type: bool
+        default: false
+
+    wait_timeout:
+        description:
+            - Maximum number of seconds to wait for each dns zone with wait
+        required: false
+        default: 600
     
     export_format:
         description:
@@ -62,11 +132,97 @@ options:
             - Import raw string content
         required: false
 
+    src:
+        description:
+            - Path of the zone file to import, instead of import_content
+        required: false
+
+    import_mode:
+        description:
+            - records parses and validates the zone file locally, then brings the records of the dns zone to the ones of the file with PATCH requests of chunk_size records (bind format only)
+            - In records mode, only the rrsets which differ are sent, each one set at once, and the rrsets missing from the file are deleted by the last requests. The zone serves its old and new records while the requests are sent, a failed request leaves it with the changes of the previous ones
+            - raw sends the content as is in one request, for small zones
+            - records by default with src, raw with import_content
+        choices:
+            - records
+            - raw
+        required: false
+
+    chunk_size:
+        description:
+            - Maximum number of records sent per request by import_raw in records mode
+        required: false
+        default: 500
+
+    dest:
+        description:
+            - Path of the file export_raw writes the dns zone to, instead of returning it in contents
+            - With dns_zones or domain, a directory in which each dns zone is written to <dns zone>.zone
+            - The file is replaced atomically, and left untouched when its sha256 is the one of the export
+            - Accepts the file attributes of the file module (mode, owner, group...)
+        required: false
+
     action:
         description:
             - This is action requested (list_records, refresh, clear, delete, import_raw, export_raw)
+            - clear reads the records first and leaves an empty dns zone as it is, as in check mode
         required: true
 
+    name:
+        description:
+            - With list_records, only return the records of this name (filtered by the api)
+        required: false
+
+    name_prefix:
+        description:
+            - With list_records, only return the records whose name starts with this prefix
+        required: false
+
+    type:
+        description:
+            - With list_records, only return the records of these types (filtered by the api for a single type)
+        required: false
+
+    data:
+        description:
+            - With list_records, only return the records with this data (hostnames compared without case and trailing dot)
+        required: false
+
+    fields:
+        description:
+            - With list_records, only return these fields of each record (name, ttl, type, data, comment, priority), all of them by default
+        required: false
+
+    count_only:
+        description:
+            - With list_records, only return the number of records left by the filters in count, contents is empty
+        required: false
+        type: bool
+        default: false
+
+    page_size:
+        description:
+            - Number of items fetched per page of the api
+        required: false
+        default: 1000
+
+    max_concurrency:
+        description:
+            - Maximum number of pages fetched in parallel, and of dns zones processed in parallel with dns_zones or domain
+        required: false
+        default: 4
+
+    zone_cache:
+        description:
+            - Read the dns zone records from an on disk snapshot shared by the tasks, validated against the serial of the zone
+        required: false
+        default: false
+
+    zone_cache_dir:
+        description:
+            - Directory of the dns zone snapshots ($SCALEWAY_DOMAIN_CACHE_DIR or ~/.ansible/tmp/scaleway_domain_zones by default)
+        required: false
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -79,6 +235,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -94,6 +276,16 @@ EXAMPLES = '''
         dns_zone: "example.com"
         action: "list_records"
 
+# To list the TXT records of the acme challenges, with their name and data only
+- name: list acme challenges of example.com
+    domain_scaleway_dns_zone:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        dns_zone: "example.com"
+        action: "list_records"
+        name_prefix: "_acme-challenge"
+        type: TXT
+        fields: [name, data]
+
 # To clear a dns zone records. Restart from scratch with default scaleway NS
 - name: clear records of example.com
     domain_scaleway_record:
@@ -117,6 +309,15 @@ EXAMPLES = '''
         refresh_recreate_dns_zone: True
         refresh_recreate_sub_dns_zone: True
 
+# To recreate a dns zone, and wait until it is active again
+- name: recreate example.com
+    domain_scaleway_dns_zone:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        dns_zone: "example.com"
+        action: "refresh"
+        refresh_recreate_dns_zone: True
+        wait: True
+
 # To export the content of a dns zone.
 - name: export with BIND format
     domain_scaleway_record:
@@ -125,6 +326,24 @@ EXAMPLES = '''
         action: "export_raw"
         export_format: "bind"
 
+# To export a dns zone to a file, only its size, sha256 and serial are returned.
+- name: export example.com to a file
+    domain_scaleway_record:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        dns_zone: "example.com"
+        action: "export_raw"
+        dest: "/srv/zones/example.com.zone"
+        mode: "0644"
+
+# To refresh several dns zones, 8 at a time.
+- name: refresh the dns zones of example.com
+    domain_scaleway_record:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        domain: "example.com"
+        action: "refresh"
+        max_concurrency: 8
+        fail_fast: false
+
 # To import the content of a dns zone.
 - name: import with BIND format
     domain_scaleway_record:
@@ -133,6 +352,15 @@ EXAMPLES = '''
         action: "import_raw"
         import_format: "bind"
         import_content: ""
+
+# To import a large zone file, validated then sent by chunks of records.
+- name: import a zone file
+    domain_scaleway_record:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        dns_zone: "example.com"
+        action: "import_raw"
+        src: "/srv/zones/example.com.zone"
+        chunk_size: 1000
 ```
 '''
 
@@ -143,89 +371,425 @@ meta:
 dns_zone:
     the dns zone name requested
 contents:
-    array of dns zone's records
+    array of dns zone's records (name, ttl, type, data, comment, and priority for MX and SRV, limited to fields), or the exported zone file without dest
+count:
+    with list_records, the number of records left by the filters
+dest:
+    path of the file written by export_raw
+size:
+    size in bytes of the zone file exported to dest
+sha256:
+    sha256 checksum of the zone file exported to dest
+serial:
+    serial of the SOA of the zone file exported to dest
+status:
+    with refresh and wait, the status of the dns zone once the wait is over
+polls:
+    with refresh and wait, the number of reads of the dns zone
+waited:
+    with refresh and wait, the number of seconds waited
+diff:
+    the records before and after clear, delete or import_raw, with --diff
+imported:
+    number of records imported by import_raw in records mode
+skipped:
+    number of records of the zone file skipped (SOA and NS of the dns zone, managed by Scaleway)
+batches:
+    the requests of import_raw in records mode, with their number of records set or added, of rrsets deleted, and the lines of the zone file they carry
+errors:
+    the invalid lines of the zone file, when the validation fails
+dns_zones:
+    with dns_zones or domain, the result of each dns zone (dns_zone, changed, failed, msg, meta, elapsed and the results of its action), skipped when fail_fast stopped before it
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
+WRITE_ACTIONS = ('refresh', 'clear', 'delete', 'import_raw')
 
-def run_module():
-    # define the available arguments/parameters that a user can pass to
-    # the module
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
-        action=dict(choices=['list_records', 'refresh', 'clear', 'delete', 'export_raw', 'import_raw'], required=True),
-        token=dict(type='str', required=True),
-        dns_zone=dict(type='str', required=True),
-        refresh_recreate_dns_zone=dict(type='bool', required=False, default=False),
-        refresh_recreate_sub_dns_zone=dict(type='bool', required=False, default=False),
-        export_format=dict(type='str', required=False, default="bind"),
-        import_format=dict(type='str', required=False, default="bind"),
-        import_content=dict(type='str', required=False),
-        verify_certs=dict(type='bool', required=False)
-    )
 
-    result = {}
+class ZoneResult(Exception):
+    """Result of the action on one dns zone, raised by ZoneModule.exit_json and fail_json."""
 
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
+    def __init__(self, result):
+        super(ZoneResult, self).__init__(result.get('msg'))
+        self.result = result
+
+
+class ZoneModule(object):
+    """The module as seen by the action on one of several dns zones.
+
+    Its params point to the dns zone, and exit_json and fail_json raise a
+    ZoneResult instead of exiting, so the action can run in a worker thread.
+    """
 
-    if module.check_mode:
+    def __init__(self, module, dns_zone):
+        self.module = module
+        self.params = dict(module.params, dns_zone=dns_zone)
+        if module.params['dest']:
+            self.params['dest'] = os.path.join(module.params['dest'], "{}.zone" . format(dns_zone))
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def exit_json(self, **kwargs):
+        raise ZoneResult(kwargs)
+
+    def fail_json(self, msg, **kwargs):
+        kwargs.update(failed=True, msg=msg)
+        raise ZoneResult(kwargs)
+
+
+def import_mode(module):
+    if module.params['import_mode']:
+        return module.params['import_mode']
+    return 'records' if module.params['src'] else 'raw'
+
+
+def import_lines(module):
+    """Lines of the zone file to import, read as they are consumed."""
+    if module.params['src']:
+        with open(module.params['src']) as f:
+            for line in f:
+                yield line
+    else:
+        for line in (module.params['import_content'] or '').splitlines():
+            yield line
+
+
+def import_content(module):
+    """Content of the zone file for the raw mode."""
+    if module.params['src']:
+        try:
+            with open(module.params['src']) as f:
+                return f.read()
+        except (IOError, OSError) as e:
+            module.fail_json(msg='can not read {}: {}' . format(module.params['src'], e))
+    return module.params['import_content']
+
+
+def import_parser(module):
+    return ZoneFileParser(module.params['dns_zone'], DEFAULT_TTL)
+
+
+def validate_zone_file(module):
+    """Parse the whole zone file once, fail with its invalid lines, return the number of records and skipped."""
+    if module.params['import_format'] != 'bind':
+        module.fail_json(msg='import_mode records only supports the bind format')
+
+    parser = import_parser(module)
+    errors = []
+    count = 0
+    try:
+        for line, record in parser.records(import_lines(module), errors):
+            count += 1
+    except ZoneFileError as e:
+        errors.append(e)
+    except (IOError, OSError) as e:
+        module.fail_json(msg='can not read {}: {}' . format(module.params['src'], e))
+
+    if errors:
+        module.fail_json(msg='invalid zone file, {} error(s), first at line {}' . format(len(errors), errors[0].line),
+                         errors=[{"line": e.line, "msg": e.msg} for e in errors[:MAX_ERRORS]])
+    return count, parser.skipped
+
+
+def import_plan(module, api):
+    """Validate the zone file, and plan the changes bringing the zone to its records.
+
+    Return the number of records of the file, the number skipped, and the
+    changes with the lines of the file each one carries.
+    """
+    count, skipped = validate_zone_file(module)
+    lines = {}
+    desired = []
+    try:
+        for line, record in import_parser(module).records(import_lines(module)):
+            lines[id(record)] = line
+            desired.append(record)
+    except (ZoneFileError, IOError, OSError) as e:
+        # the file changed since it was validated, nothing is sent
+        module.fail_json(msg='import of {} interrupted: {}' . format(module.params['src'], e))
+
+    current = ZoneRecords(read_zone_records(api, module.params['dns_zone']))
+    changes = []
+    for change in plan_zone_import(current, desired, keep=keep_zone_ns):
+        if 'add' in change:
+            # the new records are sent in the order of the file
+            change['add']['records'].sort(key=lambda record: lines[id(record)])
+        records = change.get('add', change.get('set', {})).get('records', [])
+        changes.append((change, [lines[id(record)] for record in records]))
+    return count, skipped, changes
+
+
+def import_records(module, api, path):
+    """Bring the records of the zone to the records of the zone file, by PATCH requests of chunk_size records.
+
+    The zone is never cleared: the rrsets which differ are set, the new
+    ones added, and the rrsets missing from the file deleted by the last
+    requests, so the zone serves all its records during the import.
+    """
+    count, skipped, changes = import_plan(module, api)
+    batches = []
+    imported = 0
+    for chunk in split_changes(changes, module.params['chunk_size']):
+        lines = [line for change, indexes in chunk for line in indexes]
+        records = sum(len(change.get('add', change.get('set', {})).get('records', [])) for change, indexes in chunk)
+        response = api.patch(path + "/records", {"return_all_records": False, "changes": [change for change, indexes in chunk]},
+                             fail_on_error=False)
+        batch = {
+            "request": len(batches),
+            "records": records,
+            "deleted": sum(1 for change, indexes in chunk if 'delete' in change),
+            "first_line": min(lines) if lines else None,
+            "last_line": max(lines) if lines else None,
+            "status": response.status_code,
+        }
+        if response.status_code != 200:
+            invalidate_zone(api, module.params['dns_zone'])
+            api.fail(response, dns_zone=module.params['dns_zone'], batch=batch, batches=batches, imported=imported)
+        batches.append(batch)
+        imported += records
+        module.log('import_raw {}: request {} sent, {} records set or added' . format(
+            module.params['dns_zone'], batch['request'] + 1, imported))
+
+    invalidate_zone(api, module.params['dns_zone'])
+    module.exit_json(changed=bool(batches), meta={"status": 200}, dns_zone=module.params['dns_zone'], contents=[],
+                     imported=count, skipped=skipped, batches=batches)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(EXPORT_HEAD_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def soa_serial(head):
+    """Serial of the SOA found in the first lines of a zone file, or None."""
+    lines = head.decode('utf-8', 'replace').splitlines()
+    try:
+        for line, blank, tokens in entries(lines):
+            types = [token.upper() for token in tokens]
+            if 'SOA' in types:
+                return int(tokens[types.index('SOA') + 3])
+    except (ZoneFileError, ValueError, IndexError):
+        pass
+    return None
+
+
+def export_to_dest(module, api, path):
+    """Write the export of the zone to dest, replaced only when its checksum changed."""
+    dest = module.params['dest']
+    directory = os.path.dirname(os.path.abspath(dest))
+    if not os.path.isdir(directory):
+        module.fail_json(msg='destination directory {} does not exist' . format(directory))
+
+    result = api.get(path + "/raw", params={"format": module.params['export_format']})
+    encoded = result.json()["content"]
+    del result
+    if '\n' in encoded:
+        encoded = encoded.replace('\n', '')
+
+    # the zone is decoded by chunks into a temporary file next to dest, never
+    # whole in memory, and not written at all in check mode
+    tmp = None
+    f = None
+    if not module.check_mode:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.{}.' . format(os.path.basename(dest)))
+        f = os.fdopen(fd, 'wb')
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    try:
+        for start in range(0, len(encoded), EXPORT_CHUNK_SIZE):
+            block = base64.b64decode(encoded[start:start + EXPORT_CHUNK_SIZE])
+            digest.update(block)
+            size += len(block)
+            if len(head) < EXPORT_HEAD_SIZE:
+                head += block[:EXPORT_HEAD_SIZE - len(head)]
+            if f is not None:
+                f.write(block)
+    except (TypeError, ValueError) as e:
+        if tmp is not None:
+            f.close()
+            os.remove(tmp)
+        module.fail_json(msg='invalid export of {}: {}' . format(module.params['dns_zone'], e))
+    finally:
+        if f is not None:
+            f.close()
+    del encoded
+
+    sha256 = digest.hexdigest()
+    changed = not os.path.exists(dest) or file_sha256(dest) != sha256
+    if tmp is not None:
+        if changed:
+            module.atomic_move(tmp, dest)
+        else:
+            os.remove(tmp)
+
+    if os.path.exists(dest):
+        file_args = module.load_file_common_arguments(module.params, path=dest)
+        changed = module.set_fs_attributes_if_different(file_args, changed)
+
+    module.exit_json(changed=changed, meta={"status": 200}, dns_zone=module.params['dns_zone'], contents=[],
+                     dest=dest, size=size, sha256=sha256, serial=soa_serial(head))
+
+
+def check_mode_exit(module, api):
+    """Exit with the result a writing action would have, computed from reads only."""
+    dns_zone = module.params['dns_zone']
+    if get_dns_zone(api, dns_zone) is None:
+        module.fail_json(msg='dns zone {} not found' . format(dns_zone), meta={"status": 404})
+
+    result = dict(changed=True, dns_zone=dns_zone, contents=[])
+    if module.params['action'] in ('clear', 'delete'):
+        before = ZoneRecords(read_zone_records(api, dns_zone))
+        if module.params['action'] == 'clear':
+            result['changed'] = bool(before.rrsets)
+        if module._diff:
+            result['diff'] = records_diff(before, ZoneRecords(), None, dns_zone)
+    elif module.params['action'] == 'import_raw':
+        if import_mode(module) == 'records':
+            result['imported'], result['skipped'], changes = import_plan(module, api)
+            result['changed'] = bool(changes)
+        if module._diff:
+            if import_mode(module) == 'records':
+                after = format_records(record for line, record in import_parser(module).records(import_lines(module)))
+            else:
+                after = import_content(module)
+            result['diff'] = {
+                "before": format_records(read_zone_records(api, dns_zone)),
+                "after": after,
+                "before_header": "{} (current)" . format(dns_zone),
+                "after_header": "{} (imported)" . format(dns_zone),
+            }
+    module.exit_json(meta={"status": 200}, **result)
+
+
+def record_filter(module):
+    """Match function of the list_records filters."""
+    params = module.params
+    name = normalize_name(params['name']) if params['name'] is not None else None
+    prefix = normalize_name(params['name_prefix']) if params['name_prefix'] else None
+    types = set(params['type'] or ())
+
+    def match(record):
+        record_name = normalize_name(record['name'])
+        if name is not None and record_name != name:
+            return False
+        if prefix is not None and not record_name.startswith(prefix):
+            return False
+        if types and record['type'] not in types:
+            return False
+        if params['data'] is not None and \
+                normalize_data(record['type'], record['data']) != normalize_data(record['type'], params['data']):
+            return False
+        return True
+    return match
+
+
+def list_records(module, api):
+    """Records of the dns zone left by the filters: name and a single type are filtered by the api.
+
+    The records are streamed page by page, only the matching ones are kept.
+    With the zone cache, the snapshot of the zone is filtered instead.
+    """
+    dns_zone = module.params['dns_zone']
+    cache = zone_cache(api)
+    if cache is not None:
+        records = cache.records(dns_zone)
+    else:
+        params = {}
+        if module.params['name'] is not None:
+            params['name'] = module.params['name']
+        if module.params['type'] and len(module.params['type']) == 1:
+            params['type'] = module.params['type'][0]
+        records = api.paginate("/dns-zones/{}/records" . format(dns_zone), 'records', params=params)
+    match = record_filter(module)
+    return (record for record in records if match(record))
+
+
+def format_record(record, fields):
+    result = {
+        "name": record['name'],
+        "ttl": record['ttl'],
+        "type": record['type'],
+        "data": record['data'],
+        "comment": record['comment'],
+    }
+    if record['type'] in PRIORITY_TYPES:
+        result['priority'] = record['priority']
+    if not fields:
         return result
+    return dict((field, result.get(field)) for field in fields)
 
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
 
-    result['original_message'] = module.params['action']+' '+module.params['dns_zone']
-    result['message'] = 'working'
+def wait_dns_zone(module, api):
+    """Poll the dns zone until the work of refresh is done, return the fields it adds to the result."""
+    dns_zone = module.params['dns_zone']
 
-    headers = {
-        "x-auth-token": module.params['token']
-    }
+    def read():
+        zone = get_dns_zone(api, dns_zone)
+        if zone is None:
+            module.fail_json(msg='dns zone {} is not found' . format(dns_zone), changed=True, dns_zone=dns_zone)
+        return zone
+
+    zone, polls, waited = wait_for_status(read, DNS_ZONE_PENDING_STATUSES, module.params['wait_timeout'])
+    result = {"status": zone.get('status'), "polls": polls, "waited": waited}
+    msg = wait_error('dns zone {}' . format(dns_zone), zone, DNS_ZONE_PENDING_STATUSES, DNS_ZONE_FAILED_STATUSES,
+                     module.params['wait_timeout'])
+    if msg:
+        module.fail_json(msg=msg, changed=True, dns_zone=dns_zone, **result)
+    return result
+
+
+def run_action(module, api):
+    """Run the action on the dns_zone of the module, exit with its result."""
+    # list_records and export_raw only read, they run as usual in check mode
+    if module.check_mode and module.params['action'] in WRITE_ACTIONS:
+        check_mode_exit(module, api)
 
-    url_get_records = "{}/domain/{}/dns-zones/{}/records?page=1&page_size=10000" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
-    url_clear_records = "{}/domain/{}/dns-zones/{}/records" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
-    url_refresh = "{}/domain/{}/dns-zones/{}/refresh" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
-    url_export_raw = "{}/domain/{}/dns-zones/{}/raw?format={}" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'], module.params['export_format'])
-    url_import_raw = "{}/domain/{}/dns-zones/{}/raw" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
-    url = "{}/domain/{}/dns-zones/{}" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
+    path = "/dns-zones/{}" . format(module.params['dns_zone'])
 
     contents = []
+    extra = {}
     if module.params['action']=='refresh':
         data = {
             "recreate_dns_zone": module.params['refresh_recreate_dns_zone'],
-	        "recreate_sub_dns_zone": module.params['refresh_recreate_sub_dns_zone']
+            "recreate_sub_dns_zone": module.params['refresh_recreate_sub_dns_zone']
         }
-        result = requests.post(url_refresh, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
+        result = api.post(path + "/refresh", data)
+        if module.params['wait']:
+            extra = wait_dns_zone(module, api)
 
     if module.params['action']=='export_raw':
-        data = {
-            "format": module.params['export_format']
-        }
-        result = requests.get(url_export_raw, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
+        if module.params['dest']:
+            export_to_dest(module, api, path)
+
+        result = api.get(path + "/raw", params={"format": module.params['export_format']})
 
         contents.append(
-            base64.b64decode(result.json()["content"])
+            base64.b64decode(result.json()["content"]).decode('utf-8')
         )
 
     if module.params['action']=='import_raw':
+        if import_mode(module) == 'records':
+            import_records(module, api, path)
+
         data = {
             "format": module.params['import_format'],
-            "content": module.params['import_content']
+            "content": import_content(module)
         }
-        result = requests.post(url_import_raw, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
+        result = api.post(path + "/raw", data)
 
     if module.params['action']=='clear':
+        # the same read as in check mode: an empty zone is left as it is
+        before = ZoneRecords(read_zone_records(api, module.params['dns_zone']))
+        if module._diff:
+            extra['diff'] = records_diff(before, ZoneRecords(), None, module.params['dns_zone'])
+        if not before.rrsets:
+            module.exit_json(changed=False, meta={"status": 200}, dns_zone=module.params['dns_zone'], contents=contents, **extra)
         data = {
             "return_all_records": True,
             "changes": [
@@ -234,44 +798,126 @@ def run_module():
                 }
             ]
         }
-        result = requests.patch(url_clear_records, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
+        result = api.patch(path + "/records", data)
 
     if module.params['action']=='delete':
-        result = requests.delete(url, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
+        result = api.delete(path)
 
     if module.params['action']=='list_records':
-        result = requests.get(url_get_records, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
-        else:
-            dns_zones = result.json()['records']
-            for z in range(len(dns_zones)):
-                dns_zone = {
-                    "name":dns_zones[z]['name'],
-                    "ttl":dns_zones[z]['ttl'],
-                    "type":dns_zones[z]['type'],
-                    "data":dns_zones[z]['data'],
-                    "comment":dns_zones[z]['comment'],
-                }
-                
-                if dns_zone['type'] == 'MX':
-                    dns_zone['priority'] = dns_zones[z]['priority']
+        result = None
+        count = 0
+        for record in list_records(module, api):
+            count += 1
+            if not module.params['count_only']:
+                contents.append(format_record(record, module.params['fields']))
+        extra['count'] = count
+
+    status = result.status_code if result is not None else 200
+    changed = module.params['action'] in WRITE_ACTIONS
+    if changed:
+        invalidate_zone(api, module.params['dns_zone'])
+    module.exit_json(changed=changed, meta= {"status": status}, dns_zone=module.params['dns_zone'], contents=contents, **extra)
+
+
+def zone_names(module, api):
+    """The dns zones of dns_zones, or of the domain."""
+    if module.params['dns_zones'] is not None:
+        return list(module.params['dns_zones'])
+    names = []
+    for zone in api.paginate("/dns-zones", 'dns_zones', params={"domain": module.params['domain']}):
+        names.append(zone['subdomain'] and "{}.{}" . format(zone['subdomain'], zone['domain']) or zone['domain'])
+    return names
+
+
+def run_zones(module, api):
+    """Run the action on several dns zones, max_concurrency at a time, and exit with the result of each one."""
+    if module.params['action'] == 'import_raw':
+        module.fail_json(msg='import_raw runs on a single dns_zone')
+    if module.params['dest'] and not os.path.isdir(module.params['dest']):
+        module.fail_json(msg='dest must be a directory with dns_zones or domain')
+
+    dns_zones = zone_names(module, api)
+    stop = threading.Event()
+
+    def run(dns_zone):
+        if stop.is_set():
+            return {"dns_zone": dns_zone, "changed": False, "skipped": True}
+        # the api of the dns zone shares the connections and the rate limiter
+        zone_api = copy.copy(api)
+        zone_api.module = ZoneModule(module, dns_zone)
+        start = time.time()
+        try:
+            run_action(zone_api.module, zone_api)
+        except ZoneResult as e:
+            result = e.result
+        result.update(dns_zone=dns_zone, elapsed=round(time.time() - start, 3))
+        result.setdefault('changed', False)
+        if result.get('failed'):
+            module.log('{} {}: {}' . format(module.params['action'], dns_zone, result['msg']))
+            if module.params['fail_fast']:
+                stop.set()
+        return result
+
+    results = run_concurrently(run, dns_zones, module.params['max_concurrency'])
+    failed = [result['dns_zone'] for result in results if result.get('failed')]
+    changed = any(result['changed'] for result in results)
+    if failed:
+        module.fail_json(msg='{} of {} dns zones failed: {}' . format(len(failed), len(results), ', '.join(failed)),
+                         changed=changed, dns_zones=results)
+    module.exit_json(changed=changed, meta={"status": 200}, dns_zones=results)
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_cache_spec())
+    module_args.update(scaleway_domain_pagination_spec())
+    module_args.update(scaleway_domain_wait_spec())
+    module_args.update(
+        action=dict(choices=['list_records', 'refresh', 'clear', 'delete', 'export_raw', 'import_raw'], required=True),
+        dns_zone=dict(type='str', required=False),
+        dns_zones=dict(type='list', elements='str', required=False),
+        domain=dict(type='str', required=False),
+        fail_fast=dict(type='bool', required=False, default=True),
+        refresh_recreate_dns_zone=dict(type='bool', required=False, default=False),
+        refresh_recreate_sub_dns_zone=dict(type='bool', required=False, default=False),
+        export_format=dict(type='str', required=False, default="bind"),
+        import_format=dict(type='str', required=False, default="bind"),
+        import_content=dict(type='str', required=False),
+        src=dict(type='path', required=False),
+        import_mode=dict(choices=['records', 'raw'], required=False),
+        chunk_size=dict(type='int', required=False, default=DEFAULT_CHUNK_SIZE),
+        dest=dict(type='path', required=False),
+        name=dict(type='str', required=False),
+        name_prefix=dict(type='str', required=False),
+        type=dict(type='list', elements='str', required=False),
+        data=dict(type='str', required=False),
+        fields=dict(type='list', elements='str', required=False),
+        count_only=dict(type='bool', required=False, default=False),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[['src', 'import_content'], ['dns_zone', 'dns_zones', 'domain']],
+        required_one_of=[['dns_zone', 'dns_zones', 'domain']],
+        add_file_common_args=True,
+        supports_check_mode=True
+    )
+    collect_metrics(module)
+
+    if module.params['chunk_size'] < 1:
+        module.fail_json(msg='chunk_size must be greater than 0')
+
+    api = ScalewayDomainAPI(module)
 
-                contents.append(
-                    dns_zone
-                )
+    if module.params['dns_zone'] is None:
+        run_zones(module, api)
+    run_action(module, api)
 
-    module.exit_json(meta= {"status": result.status_code}, dns_zone=module.params['dns_zone'], contents=contents)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_dns_zone', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
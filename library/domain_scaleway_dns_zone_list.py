@@ -1,12 +1,10 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, scaleway_domain_argument_spec, scaleway_domain_pagination_spec
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -41,6 +39,18 @@ options:
             - This is action requested (list_dns_zones)
         required: true
 
+    page_size:
+        description:
+            - Number of items fetched per page of the api
+        required: false
+        default: 1000
+
+    max_concurrency:
+        description:
+            - Maximum number of pages fetched in parallel
+        required: false
+        default: 4
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -53,6 +63,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -86,64 +122,45 @@ contents:
     array of dns zone's records
 total:
     total number of dns zones
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_pagination_spec())
+    module_args.update(
         action=dict(choices=['list_dns_zones'], required=True),
-        token=dict(type='str', required=True),
         domain=dict(type='str', required=False),
-        verify_certs=dict(type='bool', required=False)
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
+    collect_metrics(module)
 
-    if module.check_mode:
-        return result
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
-
-    result['original_message'] = module.params['action']
-    if module.params['domain']:
-        result['original_message'] += module.params['domain']
-    result['message'] = 'working'
-
-    headers = {
-        "x-auth-token": module.params['token']
-    }
+    # this module only reads, it runs as usual in check mode
+    api = ScalewayDomainAPI(module)
 
-    url = "{}/domain/{}/dns-zones?" . format(module.params['endpoint'], module.params['version'])
+    params = {}
     if module.params['domain']:
-        url += "domain={}&" . format(module.params['domain'])
-    url += "page=1&page_size=10000"
+        params['domain'] = module.params['domain']
 
     total = 0
     contents = []
     if module.params['action']=='list_dns_zones':
-        result = requests.get(url, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            total = results['total_count']
-            contents = results['dns_zones']
+        pages = api.paginate("/dns-zones", 'dns_zones', params=params)
+        contents = list(pages)
+        total = pages.total_count
 
-    module.exit_json(meta= {"status": result.status_code}, domain=module.params['domain'], contents=contents, total=total)
+    module.exit_json(changed=False, meta= {"status": 200}, domain=module.params['domain'], contents=contents, total=total)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_dns_zone_list', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
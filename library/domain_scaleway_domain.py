@@ -1,12 +1,26 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+from ansible.module_utils.scaleway_domain import (
+    ScalewayDomainAPI,
+    ScalewayDomainAPIError,
+    DOMAIN_FAILED_STATUSES,
+    DOMAIN_PENDING_STATUSES,
+    domain_auto_renew_enabled,
+    domain_transfer_locked,
+    error_data,
+    run_concurrently,
+    scaleway_domain_argument_spec,
+    scaleway_domain_pagination_spec,
+    scaleway_domain_wait_spec,
+    wait_error,
+    wait_for_status,
+)
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+import threading
+import time
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -34,12 +48,56 @@ options:
     action:
         description:
             - This is action requested (get_domain, buy_domain)
+            - The writing actions but renew_domain read the domain first, and send nothing when it is already in the requested state (already owned with buy_domain), as in check mode
         required: true
 
     domain:
         description:
             - The domain to manage
-        required: true
+            - One of domain or domains is required
+        required: false
+
+    domains:
+        description:
+            - List of domains to run the action on, max_concurrency at a time (all the actions but buy_domain)
+            - The domains already in the requested state are skipped, after one read of the domains list (lock, unlock, enable and disable auto renew) or of each domain (update_domain)
+            - The requests are bound by rate_limit (50 requests per second by default), raise it for thousands of domains
+        required: false
+
+    max_concurrency:
+        description:
+            - Maximum number of domains processed in parallel with domains, and of pages fetched in parallel
+        required: false
+        default: 4
+
+    page_size:
+        description:
+            - Number of items fetched per page of the api, when reading the domains list
+        required: false
+        default: 1000
+
+    fail_fast:
+        description:
+            - With domains, stop starting new domains once one failed
+            - Otherwise every domain is tried, and the module fails at the end if one of them failed
+        required: false
+        type: bool
+        default: True
+
+    wait:
+        description:
+            - With buy_domain and renew_domain, wait until the domain is no longer creating or renewing, polling it with a growing delay
+            - Fails if the domain ends in an error status, or is still pending after wait_timeout
+            - Not done in check mode
+        required: false
+        type: bool
+        default: false
+
+    wait_timeout:
+        description:
+            - Maximum number of seconds to wait for each domain with wait
+        required: false
+        default: 600
 
     endpoint:
         description:
@@ -53,6 +111,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -77,6 +161,27 @@ EXAMPLES = '''
         "organization_id": "YOUR_SCALEWAY_ORGANIZATION_ID",
         "period": 1,
         "contact_id": "abcd1234"
+
+# To lock the transfer of many domains, 8 at a time
+- name: lock the transfer of our domains
+    domain_scaleway_domain:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        domains: "{{ our_domains }}"
+        action: "lock_domain_transfer"
+        max_concurrency: 8
+
+# To renew many domains in the background, and wait for the renewals to be done
+- name: renew our domains
+    domain_scaleway_domain:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        domains: "{{ our_domains }}"
+        action: "renew_domain"
+        period: 1
+        wait: true
+        wait_timeout: 1800
+    async: 3600
+    poll: 0
+    register: renewals
 ```
 '''
 
@@ -88,8 +193,229 @@ domain:
     the domain requested
 contents:
     domain details
+data:
+    the request sent to the api (or which would be sent in check mode)
+status:
+    with wait, the status of the domain once the wait is over
+polls:
+    with wait, the number of reads of the domain
+waited:
+    with wait, the number of seconds waited
+diff:
+    the state of the domain before and after the action, with --diff
+domains:
+    with domains, the result of each domain (domain, changed, failed, msg, meta, contents, data, elapsed, status, polls and waited with wait, and diff with --diff), skipped when fail_fast stopped before it
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
+READ_ACTIONS = ('get_domain', 'get_domain_auth_code')
+# actions whose work goes on once the api answered
+WAIT_ACTIONS = ('buy_domain', 'renew_domain')
+CONTACT_TYPES = ('owner_contact', 'administrative_contact', 'technical_contact')
+# actions whose state is in the domains list
+LIST_STATE_ACTIONS = ('lock_domain_transfer', 'unlock_domain_transfer', 'enable_domain_auto_renew', 'disable_domain_auto_renew')
+
+# method and path, under the path of the domain, of the request of each action
+ACTION_REQUESTS = {
+    'get_domain': ('GET', ''),
+    'renew_domain': ('POST', '/renew'),
+    'update_domain': ('PATCH', ''),
+    'lock_domain_transfer': ('POST', '/lock-transfer'),
+    'unlock_domain_transfer': ('POST', '/unlock-transfer'),
+    'enable_domain_auto_renew': ('POST', '/enable-auto-renew'),
+    'disable_domain_auto_renew': ('POST', '/disable-auto-renew'),
+    'get_domain_auth_code': ('GET', '/auth-code'),
+}
+
+
+def request_data(params):
+    """Body of the request of the action."""
+    data = {}
+    if params['action'] == 'buy_domain':
+        data = {
+            'domain': params['domain'],
+            'organization_id': params['organization_id'],
+            'period': params['period']
+        }
+        if params['contact'] != None:
+            data['contact'] = params['contact']
+        if params['contact_id'] != None:
+            data['contact_id'] = params['contact_id']
+    elif params['action'] == 'renew_domain':
+        data = {
+            'domain': params['domain'],
+            'period': params['period']
+        }
+    elif params['action'] == 'update_domain':
+        for contact_type in CONTACT_TYPES:
+            if params[contact_type] != None:
+                data[contact_type] = params[contact_type]
+            if params[contact_type + '_id'] != None:
+                data[contact_type + '_id'] = params[contact_type + '_id']
+    return data
+
+
+def domain_state(params, domain):
+    """Part of the domain state the action changes, with the values requested."""
+    action = params['action']
+    if action in ('lock_domain_transfer', 'unlock_domain_transfer'):
+        return {'transfer_locked': domain_transfer_locked(domain)}, {'transfer_locked': action == 'lock_domain_transfer'}
+    if action in ('enable_domain_auto_renew', 'disable_domain_auto_renew'):
+        return {'auto_renew': domain_auto_renew_enabled(domain)}, {'auto_renew': action == 'enable_domain_auto_renew'}
+    if action == 'update_domain':
+        before, after = {}, {}
+        for contact_type in CONTACT_TYPES:
+            current = domain.get(contact_type) or {}
+            if params[contact_type + '_id'] != None:
+                before[contact_type + '_id'] = current.get('id')
+                after[contact_type + '_id'] = params[contact_type + '_id']
+            if params[contact_type] != None:
+                for key, value in params[contact_type].items():
+                    if value is not None:
+                        before.setdefault(contact_type, {})[key] = current.get(key)
+                        after.setdefault(contact_type, {})[key] = value
+        return before, after
+    # renew_domain always changes the expiration date
+    return {'expired_at': domain.get('expired_at')}, {'expired_at': domain.get('expired_at'), 'period': params['period']}
+
+
+def unchanged_exit(module, api, path, data):
+    """Read the domain before a writing action, and exit when it is already in the requested state.
+
+    In check mode, exit with the result the action would have. Otherwise
+    return the diff of the action, if any, and let it run.
+    """
+    response = api.get(path, fail_on_error=False)
+    if module.params['action'] == 'buy_domain':
+        if response.status_code not in (200, 404):
+            api.fail(response)
+        result = dict(changed=response.status_code == 404, meta={"status": response.status_code}, contents={},
+                      domain=module.params['domain'], data=data)
+    else:
+        if response.status_code != 200:
+            api.fail(response)
+        before, after = domain_state(module.params, response.json()['domain'])
+        result = dict(changed=before != after, meta={"status": response.status_code}, contents={},
+                      domain=module.params['domain'], data=data)
+        if module._diff:
+            result['diff'] = {"before": before, "after": after}
+    if module.check_mode or not result['changed']:
+        module.exit_json(**result)
+    return result.get('diff')
+
+
+def response_contents(action, response):
+    if action == 'get_domain':
+        return response.json()['domain']
+    return response.json()
+
+
+def wait_domain(module, api, name):
+    """Poll the domain until the work of the action is done, return the fields it adds to the result."""
+    def read():
+        response = api.send('GET', "/domains/{}" . format(name))
+        if response.status_code != 200:
+            raise ScalewayDomainAPIError('Your request failed', response)
+        return response.json()['domain']
+
+    domain, polls, waited = wait_for_status(read, DOMAIN_PENDING_STATUSES, module.params['wait_timeout'])
+    result = {"contents": {"domain": domain}, "status": domain.get('status'), "polls": polls, "waited": waited}
+    msg = wait_error('domain {}' . format(name), domain, DOMAIN_PENDING_STATUSES, DOMAIN_FAILED_STATUSES,
+                     module.params['wait_timeout'])
+    if msg:
+        result.update(failed=True, msg=msg)
+    return result
+
+
+def domain_states(module, api, names):
+    """The domains of names, read once to skip the ones already in the requested state."""
+    action = module.params['action']
+    if action in LIST_STATE_ACTIONS:
+        wanted = set(names)
+        return dict((domain['domain'], domain) for domain in api.paginate("/domains", 'domains') if domain['domain'] in wanted)
+    if action == 'update_domain':
+        # the contacts are only in the details of each domain
+        def fetch(name):
+            response = api.send('GET', "/domains/{}" . format(name))
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                raise ScalewayDomainAPIError('Your request failed', response)
+            return response.json()['domain']
+        try:
+            domains = run_concurrently(fetch, names, module.params['max_concurrency'])
+        except ScalewayDomainAPIError as e:
+            api.fail_error(e)
+        return dict((name, domain) for name, domain in zip(names, domains) if domain is not None)
+    return None
+
+
+def run_domains(module, api):
+    """Run the action on several domains, max_concurrency at a time, and exit with the result of each one."""
+    action = module.params['action']
+    if action == 'buy_domain':
+        module.fail_json(msg='buy_domain runs on a single domain')
+
+    names = module.params['domains']
+    states = domain_states(module, api, names)
+    method, suffix = ACTION_REQUESTS[action]
+    stop = threading.Event()
+
+    def run(name):
+        params = dict(module.params, domain=name)
+        result = {"domain": name, "changed": False, "contents": {}, "data": request_data(params)}
+        if stop.is_set():
+            result['skipped'] = True
+            return result
+        start = time.time()
+        if states is not None:
+            if name not in states:
+                result.update(failed=True, msg='domain {} is not found' . format(name), meta={"status": 404})
+                return result
+            before, after = domain_state(params, states[name])
+            if module._diff:
+                result['diff'] = {"before": before, "after": after}
+            if before == after:
+                result['meta'] = {"status": 200}
+                return result
+
+        if module.check_mode and action not in READ_ACTIONS:
+            result.update(changed=True, meta={"status": 200})
+            return result
+
+        try:
+            response = api.send(method, "/domains/{}{}" . format(name, suffix),
+                                data=result['data'] if method != 'GET' else None)
+        except ScalewayDomainAPIError as e:
+            result.update(failed=True, msg=str(e))
+        else:
+            result['meta'] = {"status": response.status_code}
+            if 200 <= response.status_code < 300:
+                result.update(changed=action not in READ_ACTIONS, contents=response_contents(action, response))
+                if module.params['wait'] and action in WAIT_ACTIONS:
+                    try:
+                        result.update(wait_domain(module, api, name))
+                    except ScalewayDomainAPIError as e:
+                        result.update(failed=True, msg=str(e))
+            else:
+                result.update(failed=True, msg='Your request failed')
+                result['meta']['data'] = error_data(response)
+        result['elapsed'] = round(time.time() - start, 3)
+        if result.get('failed'):
+            module.log('{} {}: {}' . format(action, name, result['msg']))
+            if module.params['fail_fast']:
+                stop.set()
+        return result
+
+    results = run_concurrently(run, names, module.params['max_concurrency'])
+    failed = [result['domain'] for result in results if result.get('failed')]
+    changed = any(result['changed'] for result in results)
+    if failed:
+        module.fail_json(msg='{} of {} domains failed: {}' . format(len(failed), len(results), ', '.join(failed)),
+                         changed=changed, domains=results)
+    module.exit_json(changed=changed, meta={"status": 200}, domains=results)
+
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
@@ -113,9 +439,10 @@ def run_module():
         lang=dict(type='str', required=False),
         resale=dict(type='str', required=False),
     )
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_pagination_spec())
+    module_args.update(scaleway_domain_wait_spec())
+    module_args.update(
         action=dict(choices=[
             'get_domain',
             'buy_domain',
@@ -127,7 +454,9 @@ def run_module():
             'disable_domain_auto_renew',
             'get_domain_auth_code'
         ], required=True),
-        domain=dict(type='str', required=True),
+        domain=dict(type='str', required=False),
+        domains=dict(type='list', elements='str', required=False),
+        fail_fast=dict(type='bool', required=False, default=True),
         organization_id=dict(type='str', required=False),
         period=dict(type='int', required=False),
         contact=dict(type='dict', options=contact_args),
@@ -138,143 +467,52 @@ def run_module():
         owner_contact_id=dict(type='str', required=False),
         administrative_contact_id=dict(type='str', required=False),
         technical_contact_id=dict(type='str', required=False),
-        token=dict(type='str', required=True),
-        verify_certs=dict(type='bool', required=False)
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
+        mutually_exclusive=[['domain', 'domains']],
+        required_one_of=[['domain', 'domains']],
         supports_check_mode=True
     )
-
-    if module.check_mode:
-        return result
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
-
-    result['original_message'] = module.params['action']
-    result['message'] = 'working'
-
-    headers = {
-        "x-auth-token": module.params['token']
-    }
-
-    url_get_domain = "{}/domain/{}/domains/{}" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_buy_domain = "{}/domain/{}/domains" . format(module.params['endpoint'], module.params['version'])
-    url_renew_domain = "{}/domain/{}/domains/{}/renew" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_update_domain = url_get_domain
-    url_lock_domain_transfer = "{}/domain/{}/domains/{}/lock-transfer" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_unlock_domain_transfer = "{}/domain/{}/domains/{}/unlock-transfer" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_enable_domain_auto_renew = "{}/domain/{}/domains/{}/enable-auto-renew" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_disable_domain_auto_renew = "{}/domain/{}/domains/{}/disable-auto-renew" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-    url_get_domain_auth_code = "{}/domain/{}/domains/{}/auth-code" . format(module.params['endpoint'], module.params['version'], module.params['domain'])
-
-    contents = []
-    data = {}
-    if module.params['action'] == 'get_domain':
-        result = requests.get(url_get_domain, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results['domain']
-    elif module.params['action'] == 'buy_domain':
-        data = {
-            'domain': module.params['domain'],
-            'organization_id': module.params['organization_id'],
-            'period': module.params['period']
-        }
-        if module.params['contact'] != None:
-            data['contact'] = module.params['contact']
-        if module.params['contact_id'] != None:
-            data['contact_id'] = module.params['contact_id']
-
-        result = requests.post(url_buy_domain, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'renew_domain':
-        data = {
-            'domain': module.params['domain'],
-            'period': module.params['period']
-        }
-
-        result = requests.post(url_renew_domain, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'update_domain':
-        data = {}
-        if module.params['owner_contact'] != None:
-            data['owner_contact'] = module.params['owner_contact']
-        if module.params['administrative_contact'] != None:
-            data['administrative_contact'] = module.params['administrative_contact']
-        if module.params['technical_contact'] != None:
-            data['technical_contact'] = module.params['technical_contact']
-        if module.params['owner_contact_id'] != None:
-            data['owner_contact_id'] = module.params['owner_contact_id']
-        if module.params['administrative_contact_id'] != None:
-            data['administrative_contact_id'] = module.params['administrative_contact_id']
-        if module.params['technical_contact_id'] != None:
-            data['technical_contact_id'] = module.params['technical_contact_id']
-
-        result = requests.patch(url_update_domain, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'lock_domain_transfer':
-        data = {}
-        result = requests.post(url_lock_domain_transfer, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'unlock_domain_transfer':
-        data = {}
-        result = requests.post(url_unlock_domain_transfer, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'enable_domain_auto_renew':
-        data = {}
-        result = requests.post(url_enable_domain_auto_renew, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'disable_domain_auto_renew':
-        data = {}
-        result = requests.post(url_disable_domain_auto_renew, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-    elif module.params['action'] == 'get_domain_auth_code':
-        result = requests.get(url_get_domain_auth_code, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            contents = results
-
-    module.exit_json(meta= {"status": result.status_code}, contents=contents, domain=module.params['domain'], data=data)
+    collect_metrics(module)
+
+    api = ScalewayDomainAPI(module)
+
+    if module.params['domains'] is not None:
+        run_domains(module, api)
+
+    path = "/domains/{}" . format(module.params['domain'])
+    data = request_data(module.params)
+
+    # the same read as in check mode, so both report the same changed. A
+    # renewal always changes the domain, it is only read in check mode
+    diff = None
+    if module.params['action'] not in READ_ACTIONS and (module.check_mode or module.params['action'] != 'renew_domain'):
+        diff = unchanged_exit(module, api, path, data)
+
+    if module.params['action'] == 'buy_domain':
+        result = api.post("/domains", data)
+    else:
+        method, suffix = ACTION_REQUESTS[module.params['action']]
+        result = api.request(method, path + suffix, data=data if method != 'GET' else None)
+    contents = response_contents(module.params['action'], result)
+
+    changed = module.params['action'] not in READ_ACTIONS
+    result = dict(changed=changed, meta= {"status": result.status_code}, contents=contents, domain=module.params['domain'], data=data)
+    if diff is not None:
+        result['diff'] = diff
+    if module.params['wait'] and module.params['action'] in WAIT_ACTIONS:
+        try:
+            result.update(wait_domain(module, api, module.params['domain']))
+        except ScalewayDomainAPIError as e:
+            api.fail_error(e, changed=changed, domain=module.params['domain'])
+        if result.get('failed'):
+            module.fail_json(**result)
+    module.exit_json(**result)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_domain', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
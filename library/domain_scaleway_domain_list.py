@@ -1,12 +1,19 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
-
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
+from ansible.module_utils.scaleway_domain import (
+    ScalewayDomainAPI,
+    ScalewayDomainAPIError,
+    domain_auto_renew_enabled,
+    domain_transfer_locked,
+    run_concurrently,
+    scaleway_domain_argument_spec,
+    scaleway_domain_pagination_spec,
+)
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+import datetime
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -36,6 +43,54 @@ options:
             - This is action requested (list_domains)
         required: true
 
+    details:
+        description:
+            - Fetch the details of every listed domain (contacts, dnssec, dns zones...), max_concurrency at a time
+            - Only the domains left by the filters are fetched
+            - The fetches are bound by rate_limit (50 requests per second by default), raise it for thousands of domains
+        required: false
+        type: bool
+        default: false
+
+    status:
+        description:
+            - Only return the domains with one of these status (filtered by the api for a single status)
+        required: false
+
+    expires_within:
+        description:
+            - Only return the domains expiring in less than this number of days (expired ones included)
+        required: false
+
+    auto_renew:
+        description:
+            - Only return the domains whose auto renew is enabled (true) or disabled (false)
+        required: false
+        type: bool
+
+    transfer_locked:
+        description:
+            - Only return the domains whose transfer is locked (true) or unlocked (false)
+        required: false
+        type: bool
+
+    fields:
+        description:
+            - Only return these fields of each domain, all of them by default
+        required: false
+
+    page_size:
+        description:
+            - Number of items fetched per page of the api
+        required: false
+        default: 1000
+
+    max_concurrency:
+        description:
+            - Maximum number of pages, and of domain details, fetched in parallel
+        required: false
+        default: 4
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -48,6 +103,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -61,6 +142,21 @@ EXAMPLES = '''
     domain_scaleway_domain_list:
         token: "ZETZEGERHG35ERHGERHERSDGDSGS"
         action: "list_domains"
+
+# To audit the domains expiring in the next 30 days without auto renew
+- name: domains to renew
+    domain_scaleway_domain_list:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        action: "list_domains"
+        expires_within: 30
+        auto_renew: false
+        details: true
+        max_concurrency: 16
+        rate_limit: 200
+        fields:
+            - domain
+            - expired_at
+            - owner_contact
 ```
 '''
 
@@ -69,61 +165,119 @@ meta:
     status: The http code returned by the api
     data: The json error message
 contents:
-    array of domains
+    array of domains, left by the filters and limited to fields
 total:
     total number of domains
+matched:
+    number of domains left by the filters
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
 
+def parse_date(value):
+    return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+def domain_filter(module):
+    """Whether a domain of the list matches the filters of the module."""
+    params = module.params
+    expires_before = None
+    if params['expires_within'] is not None:
+        expires_before = datetime.datetime.utcnow() + datetime.timedelta(days=params['expires_within'])
+
+    def match(domain):
+        if params['status'] and domain.get('status') not in params['status']:
+            return False
+        if expires_before is not None:
+            if not domain.get('expired_at'):
+                return False
+            try:
+                if parse_date(domain['expired_at']) > expires_before:
+                    return False
+            except ValueError:
+                return False
+        if params['auto_renew'] is not None and domain_auto_renew_enabled(domain) != params['auto_renew']:
+            return False
+        if params['transfer_locked'] is not None and domain_transfer_locked(domain) != params['transfer_locked']:
+            return False
+        return True
+    return match
+
+
+def project(domain, fields):
+    if not fields:
+        return domain
+    return dict((field, domain.get(field)) for field in fields)
+
+
+def domain_details(module, api, domains):
+    """The details of the domains, fetched max_concurrency at a time and limited to fields."""
+    def fetch(domain):
+        response = api.send('GET', "/domains/{}" . format(domain['domain']))
+        if response.status_code != 200:
+            raise ScalewayDomainAPIError('Your request failed', response)
+        return project(response.json()['domain'], module.params['fields'])
+
+    try:
+        return run_concurrently(fetch, domains, module.params['max_concurrency'])
+    except ScalewayDomainAPIError as e:
+        api.fail_error(e)
+
+
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_pagination_spec())
+    module_args.update(
         action=dict(choices=['list_domains'], required=True),
-        token=dict(type='str', required=True),
-        verify_certs=dict(type='bool', required=False)
+        details=dict(type='bool', required=False, default=False),
+        status=dict(type='list', elements='str', required=False),
+        expires_within=dict(type='int', required=False),
+        auto_renew=dict(type='bool', required=False),
+        transfer_locked=dict(type='bool', required=False),
+        fields=dict(type='list', elements='str', required=False),
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
+    collect_metrics(module)
 
-    if module.check_mode:
-        return result
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
-
-    result['original_message'] = module.params['action']
-    result['message'] = 'working'
-
-    headers = {
-        "x-auth-token": module.params['token']
-    }
-
-    url_list_domains = "{}/domain/{}/domains?page=1&page_size=10000" . format(module.params['endpoint'], module.params['version'])
+    # this module only reads, it runs as usual in check mode
+    api = ScalewayDomainAPI(module)
 
     total = 0
     contents = []
     if module.params['action'] == 'list_domains':
-        result = requests.get(url_list_domains, headers=headers, verify=module.params['verify_certs'])
-        if result.status_code != 200:
-            # if error
-            module.fail_json(msg = 'Your request failed', meta = {"status": result.status_code, "data": result.json()})
-        else:
-            results = result.json()
-            total = results['total_count']
-            contents = results['domains']
+        params = {}
+        # the api filters a single status, the others are filtered here
+        if module.params['status'] and len(module.params['status']) == 1:
+            params['status'] = module.params['status'][0]
+        match = domain_filter(module)
+        pages = api.paginate("/domains", 'domains', params=params)
+        batch = []
+        for domain in pages:
+            if not match(domain):
+                continue
+            if not module.params['details']:
+                contents.append(project(domain, module.params['fields']))
+                continue
+            # the details are fetched by batches of a page while listing
+            batch.append(domain)
+            if len(batch) >= pages.page_size:
+                contents.extend(domain_details(module, api, batch))
+                batch = []
+        if batch:
+            contents.extend(domain_details(module, api, batch))
+        total = pages.total_count
 
-    module.exit_json(meta= {"status": result.status_code}, contents=contents, total=total)
+    module.exit_json(changed=False, meta= {"status": 200}, contents=contents, total=total, matched=len(contents))
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_domain_list', run_module)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
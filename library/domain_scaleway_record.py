@@ -1,14 +1,27 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import requests
 from ansible.module_utils.basic import AnsibleModule
-import json
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, scaleway_domain_argument_spec
+from ansible.module_utils.scaleway_domain_cache import (
+    invalidate_zone,
+    read_rrset,
+    read_zone_records,
+    scaleway_domain_cache_spec,
+)
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+from ansible.module_utils.scaleway_domain_records import (
+    ZoneRecords,
+    get_dns_zone,
+    plan_record_changes,
+    records_diff,
+    rrset_key,
+    zone_serial,
+)
 
 DEFAULT_TTL = 86400
 DEFAULT_PRIORITY = 10
-DEFAULT_ENDPOINT = 'https://api.scaleway.com'
-DEFAULT_VERSION = 'v2alpha2'
 
 ANSIBLE_METADATA = {
     'metadata_version': '0.1',
@@ -77,6 +90,43 @@ options:
             - This is priority requested (for MX)
         required: true
 
+    deferred:
+        description:
+            - Only queue the record on the controller, it is sent with the other queued records of the dns zone by a task with flush
+            - Handled by the domain_scaleway_record action plugin
+        required: false
+        default: false
+
+    flush:
+        description:
+            - Send the records queued with deferred for this token (and dns_zone if given), one PATCH per dns zone
+            - Handled by the domain_scaleway_record action plugin, the other record options are then ignored
+        required: false
+        default: false
+
+    return_records:
+        description:
+            - Return the records of the dns zone after the changes in records, those of this name and type (rrset) or all of them (zone), and the serial of the dns zone in meta
+            - The records are taken from the response of the changes, the serial is read from the dns zones listing after them
+            - In check mode and without changes, the records the changes would give
+        choices:
+            - none
+            - rrset
+            - zone
+        required: false
+        default: none
+
+    zone_cache:
+        description:
+            - Read the dns zone records from an on disk snapshot shared by the tasks, validated against the serial of the zone
+        required: false
+        default: false
+
+    zone_cache_dir:
+        description:
+            - Directory of the dns zone snapshots ($SCALEWAY_DOMAIN_CACHE_DIR or ~/.ansible/tmp/scaleway_domain_zones by default)
+        required: false
+
     endpoint:
         description:
             - This is the endpoint to use, will allow use of sandbox api
@@ -89,6 +139,32 @@ options:
         type: bool
         default: True
 
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
 extends_documentation_fragment
 
 author:
@@ -144,6 +220,35 @@ EXAMPLES = '''
     state: present
 ```
 
+# register every host in one request at the end of the play
+```yaml
+- hosts: all
+  tasks:
+    - domain_scaleway_record:
+        dns_zone: example.com
+        name: "{{ inventory_hostname }}"
+        type: A
+        content: "{{ ansible_default_ipv4.address }}"
+        deferred: true
+      notify: flush dns records
+  handlers:
+    - name: flush dns records
+      domain_scaleway_record:
+        flush: true
+      run_once: true
+```
+
+# update a record and get the records of its name, for a template
+```yaml
+- domain_scaleway_record:
+    name: host01
+    dns_zone: example.com
+    type: A
+    content: 192.168.1.234
+    return_records: rrset
+  register: host01
+```
+
 # delete all record with same name and type
 ```yaml
 - domain_scaleway_record:
@@ -158,16 +263,23 @@ RETURN = '''
 meta:
     status: The http code returned by the api
     data: The json error message
-    serial: The new serial of the dns zone
+    serial: The new serial of the dns zone, with return_records
+changes:
+    the changes sent to the api (or which would be sent in check mode), empty when the record was already in the requested state
+records:
+    with return_records, the records of this name and type, or of the dns zone, after the changes (id, name, type, data, ttl, priority, comment)
+diff:
+    the records of this name and type before and after the changes, with --diff
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
 '''
 
 def run_module():
     # define the available arguments/parameters that a user can pass to
     # the module
-    module_args = dict(
-        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
-        version=dict(type='str', required=False, default=DEFAULT_VERSION),
-        token=dict(type='str', required=True),
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_cache_spec())
+    module_args.update(
         dns_zone=dict(type='str', required=True),
         name=dict(type='str', required=True),
         type=dict(choices=['A','AAAA','MX','CNAME','TXT','SRV','TLSA','NS','PTR','CAA'], required=True),
@@ -177,89 +289,74 @@ def run_module():
         comment=dict(type='str', required=False),
         state=dict(choices=['present','absent'], required=False, default='present'),
         unique=dict(type='bool', required=False, default=False),
-        verify_certs=dict(type='bool', required=False)
+        return_records=dict(choices=['none', 'rrset', 'zone'], required=False, default='none'),
     )
 
-    result = {}
-
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True
     )
+    collect_metrics(module)
 
-    if module.check_mode:
-        module.exit_json()
-
-    if module.params['endpoint']=='':
-        module.params['endpoint']=DEFAULT_ENDPOINT
+    if module.params['unique'] and module.params['state'] == 'present':
+        if ((module.params['content'] == '') and (module.params['type'] != 'CNAME')):
+            module.fail_json(msg = 'content empty')
 
-    if module.params['version']=='':
-        module.params['version']=DEFAULT_VERSION
+    api = ScalewayDomainAPI(module)
 
-    result['original_message'] = module.params['name']+' '+module.params['type']
-    result['message'] = 'working'
-
-    headers = {
-        "x-auth-token": module.params['token']
+    desired = {
+        "name": module.params['name'],
+        "type": module.params['type'],
+        "ttl": module.params['ttl'],
+        "priority": module.params['priority'],
+        "data": module.params['content'],
+        "comment": module.params['comment'] or None,
     }
 
-    url = "{}/domain/{}/dns-zones/{}/records" . format(module.params['endpoint'], module.params['version'], module.params['dns_zone'])
-
-    data = {}
-
-    action = ""
-    if (module.params['state'] == 'present'):
-        comment = None
-        if module.params['comment']:
-            comment = module.params['comment']
-        data = {
-            "records": [
-                {
-                    "name": module.params['name'],
-                    "type": module.params['type'],
-                    "ttl": module.params['ttl'],
-                    "priority": module.params['priority'],
-                    "data": module.params['content'],
-                    "comment": comment,
-                }
-            ]
-        }
-        if (module.params['unique']):
-            action = "set"
-            data["name"] = module.params['name']
-            data["type"] = module.params['type']
-            if ((module.params['content'] == '') and (module.params['type'] != 'CNAME')):
-                module.fail_json(msg = 'content empty')
-        else:
-            action = "add"
-    else:
-        action = "delete"
-        data = {
-            "name": module.params['name'],
-            "type": module.params['type']
-        }
-        if module.params['content'] != '':
-            data['data'] = module.params['content']
+    # read the current records of this name and type, and only write when
+    # they differ from the requested state
+    current = read_rrset(api, module.params['dns_zone'], module.params['name'], module.params['type'])
+    changes = plan_record_changes(current, desired, module.params['state'], module.params['unique'])
+
+    result = dict(changed=bool(changes), changes=changes)
+    if module._diff:
+        before = ZoneRecords(current)
+        after = before.copy()
+        after.apply(changes)
+        result['diff'] = records_diff(before, after, [rrset_key(desired)], module.params['dns_zone'])
+
+    dns_zone = module.params['dns_zone']
+    return_records = module.params['return_records']
+    key = rrset_key(desired)
+
+    # in check mode, the changes which would be sent are only reported
+    if not changes or module.check_mode:
+        meta = {"status": 200}
+        if return_records != 'none':
+            after = ZoneRecords(current if return_records == 'rrset' else read_zone_records(api, dns_zone))
+            after.apply(changes)
+            result['records'] = after.records([key] if return_records == 'rrset' else None)
+            meta['serial'] = zone_serial(get_dns_zone(api, dns_zone))
+        module.exit_json(meta=meta, **result)
 
     data = {
-        "return_all_records": False,
-        "changes": [
-            {
-                action: data
-            }
-        ]
+        "return_all_records": return_records != 'none',
+        "changes": changes
     }
 
-    result = requests.patch(url, json.dumps(data), headers=headers, verify=module.params['verify_certs'])
-
-    if result.status_code != 200:
-       # if error
-       module.fail_json(msg='Your request failed', meta= {"status": result.status_code, "data": result.json()})
-
-    module.exit_json(meta= {"status": result.status_code})
+    response = api.patch("/dns-zones/{}/records" . format(dns_zone), data)
+    # the snapshot is not replaced with the records of the response: another
+    # write may come before the serial is read, which would validate them
+    invalidate_zone(api, dns_zone)
+    meta = {"status": response.status_code}
+    if return_records != 'none':
+        # the response holds all the records of the zone after the changes
+        result['records'] = ZoneRecords(response.json()['records']).records([key] if return_records == 'rrset' else None)
+        meta['serial'] = zone_serial(get_dns_zone(api, dns_zone))
+    module.exit_json(meta=meta, **result)
 
 def main():
-    run_module()
+    profile_module('domain_scaleway_record', run_module)
 
 if __name__ == '__main__':
     main()
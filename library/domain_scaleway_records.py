@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, scaleway_domain_argument_spec
+from ansible.module_utils.scaleway_domain_cache import invalidate_zone, read_zone_records, scaleway_domain_cache_spec
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+from ansible.module_utils.scaleway_domain_records import (
+    ZoneRecords,
+    plan_record_changes,
+    plan_rrset_changes,
+    records_diff,
+    rrset_key,
+    split_changes,
+)
+
+DEFAULT_TTL = 86400
+DEFAULT_PRIORITY = 10
+DEFAULT_CHUNK_SIZE = 500
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'domain-team@scaleway.com'
+}
+
+DOCUMENTATION = '''
+---
+module: scaleway-domain
+
+short_description: This is a little ansible module to update many Scaleway dns records at once
+
+version_added: "0.1"
+
+description:
+    - "This is a little ansible module to update many Scaleway dns records at once"
+    - "The dns zones are read once and only the records which differ from their requested state are sent"
+    - "All the changes of a dns zone are sent in a single PATCH request (split in chunks for big lists)"
+
+options:
+    token:
+        description:
+            - This is the secret key of Scaleway account
+        required: true
+
+    dns_zone:
+        description:
+            - This is the dns zone requested, used for records without their own dns_zone
+        required: true
+
+    records:
+        description:
+            - This is the list of records to update
+            - Each record accepts the options of domain_scaleway_record (name, type, content, ttl, priority, comment, state, unique)
+            - A record can also have its own dns_zone
+            - The records are applied in the order of the list, consecutive unique records of a name and type give it all their contents
+        required: true
+
+    chunk_size:
+        description:
+            - This is the maximum number of records sent in one PATCH request
+        required: false
+        default: 500
+
+    zone_cache:
+        description:
+            - Read the dns zone records from an on disk snapshot shared by the tasks, validated against the serial of the zone
+        required: false
+        default: false
+
+    zone_cache_dir:
+        description:
+            - Directory of the dns zone snapshots ($SCALEWAY_DOMAIN_CACHE_DIR or ~/.ansible/tmp/scaleway_domain_zones by default)
+        required: false
+
+    endpoint:
+        description:
+            - This is the endpoint to use, will allow use of sandbox api
+        required: false
+
+    verify_certs:
+        description:
+            - Ignore ssl certificate verification
+        required: false
+        type: bool
+        default: True
+
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
+extends_documentation_fragment
+
+author:
+    - domain-team@scaleway.com
+'''
+
+EXAMPLES = '''
+# add several A records in one request
+```yaml
+- domain_scaleway_records:
+    dns_zone: example.com
+    records:
+      - name: host01
+        type: A
+        content: 192.168.1.234
+        ttl: 1440
+      - name: host01
+        type: A
+        content: 192.168.1.235
+        ttl: 1440
+      - name: database
+        type: CNAME
+        content: host01.example.com
+        unique: true
+      - name: old
+        type: A
+        state: absent
+```
+'''
+
+RETURN = '''
+meta:
+    status: The http code returned by the api
+    data: The json error message
+dns_zones:
+    the dns zones updated with the number of changes and requests sent for each one
+results:
+    per record result (dns_zone, name, type, state, changed and the index of the request which carried it)
+diff:
+    the records changed in each dns zone before and after the changes, with --diff
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
+'''
+
+RECORD_TYPES = ['A', 'AAAA', 'MX', 'CNAME', 'TXT', 'SRV', 'TLSA', 'NS', 'PTR', 'CAA']
+
+
+def desired_record(module, record):
+    if record['state'] == 'present' and record['unique']:
+        if (record['content'] == '') and (record['type'] != 'CNAME'):
+            module.fail_json(msg='content empty', record=record)
+    return {
+        "name": record['name'],
+        "type": record['type'],
+        "ttl": record['ttl'],
+        "priority": record['priority'],
+        "data": record['content'],
+        "comment": record['comment'] or None,
+    }
+
+
+def plan_changes(module, zone_records, records):
+    """Plan the changes array of the records of one dns zone.
+
+    Each record is planned against the zone state left by the previous ones,
+    so records already in their requested state carry no change. The unique
+    records with the same name and type, with no other record of that name
+    and type between them, are planned together as one set, and consecutive
+    adds are merged into a single add. Each change keeps the indexes of the
+    records it carries. zone_records is updated in place.
+    """
+    # the unique records of a group, by the index of its first record
+    unique_groups = {}
+    open_groups = {}
+    for index, record in records:
+        key = rrset_key(record)
+        if record['state'] == 'present' and record['unique']:
+            if key not in open_groups:
+                open_groups[key] = unique_groups[index] = []
+            open_groups[key].append(index)
+        else:
+            # the next unique record of this name and type sets it again
+            open_groups.pop(key, None)
+
+    changes = []
+    grouped = set()
+    changed = {}
+    for index, record in records:
+        if index in grouped:
+            continue
+        desired = desired_record(module, record)
+        current = zone_records.get(desired['name'], desired['type'])
+        if index in unique_groups:
+            indexes = unique_groups[index]
+            grouped.update(indexes)
+            planned = plan_rrset_changes(current, [desired_record(module, module.params['records'][i]) for i in indexes])
+        else:
+            indexes = [index]
+            planned = plan_record_changes(current, desired, record['state'], False)
+
+        zone_records.apply(planned)
+        for i in indexes:
+            changed[i] = bool(planned)
+        for change in planned:
+            if "add" in change and changes and "add" in changes[-1][0]:
+                changes[-1][0]["add"]["records"].extend(change["add"]["records"])
+                changes[-1][1].extend(indexes)
+            else:
+                changes.append((change, list(indexes)))
+    return changes, changed
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    record_args = dict(
+        dns_zone=dict(type='str', required=False),
+        name=dict(type='str', required=True),
+        type=dict(choices=RECORD_TYPES, required=True),
+        content=dict(type='str', required=False, default=''),
+        ttl=dict(type='int', required=False, default=DEFAULT_TTL),
+        priority=dict(type='int', required=False, default=DEFAULT_PRIORITY),
+        comment=dict(type='str', required=False),
+        state=dict(choices=['present', 'absent'], required=False, default='present'),
+        unique=dict(type='bool', required=False, default=False),
+    )
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_cache_spec())
+    module_args.update(
+        dns_zone=dict(type='str', required=True),
+        records=dict(type='list', elements='dict', options=record_args, required=True),
+        chunk_size=dict(type='int', required=False, default=DEFAULT_CHUNK_SIZE),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+    collect_metrics(module)
+
+    if module.params['chunk_size'] < 1:
+        module.fail_json(msg='chunk_size must be greater than 0')
+
+    api = ScalewayDomainAPI(module)
+
+    # group the records by dns zone, keeping their order inside each zone
+    zones = {}
+    zones_order = []
+    for index, record in enumerate(module.params['records']):
+        zone = record['dns_zone'] or module.params['dns_zone']
+        if zone not in zones:
+            zones[zone] = []
+            zones_order.append(zone)
+        zones[zone].append((index, record))
+
+    results = [None] * len(module.params['records'])
+    dns_zones = []
+    diff = {"before": "", "after": ""}
+    status = 200
+    for zone in zones_order:
+        # one read of the zone, then only the records which differ are sent
+        before = ZoneRecords(read_zone_records(api, zone))
+        after = before.copy()
+        changes, changed = plan_changes(module, after, zones[zone])
+        chunks = split_changes(changes, module.params['chunk_size'])
+
+        for index, record in zones[zone]:
+            results[index] = {
+                "dns_zone": zone,
+                "name": record['name'],
+                "type": record['type'],
+                "state": record['state'],
+                "changed": changed[index],
+                "request": None,
+            }
+
+        if module._diff and changes:
+            keys = set(rrset_key(results[index]) for index, record in zones[zone] if changed[index])
+            zone_diff = records_diff(before, after, keys, zone)
+            diff["before"] += "; {}\n{}" . format(zone, zone_diff["before"])
+            diff["after"] += "; {}\n{}" . format(zone, zone_diff["after"])
+
+        dns_zones.append({
+            "dns_zone": zone,
+            "changes": len(changes),
+            "requests": 0 if module.check_mode else len(chunks),
+        })
+
+        # in check mode, the changes which would be sent are only reported
+        if module.check_mode:
+            continue
+
+        for request_index, chunk in enumerate(chunks):
+            data = {
+                "return_all_records": False,
+                "changes": [change for change, indexes in chunk]
+            }
+
+            result = api.patch("/dns-zones/{}/records" . format(zone), data, fail_on_error=False)
+            invalidate_zone(api, zone)
+            if result.status_code != 200:
+                # if error
+                api.fail(result, dns_zone=zone, request=request_index, results=results)
+            status = result.status_code
+
+            for change, indexes in chunk:
+                for index in indexes:
+                    results[index]["request"] = request_index
+
+    result = dict(changed=any(item["changed"] for item in results), meta={"status": status}, dns_zones=dns_zones, results=results)
+    if module._diff:
+        result['diff'] = diff
+    module.exit_json(**result)
+
+
+def main():
+    profile_module('domain_scaleway_records', run_module)
+
+if __name__ == '__main__':
+    main()
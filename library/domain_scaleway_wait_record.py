@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, run_concurrently, scaleway_domain_argument_spec
+from ansible.module_utils.scaleway_domain_dns import ANSWER_RCODES, DNSError, encode_name, query, resolve_address
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+from ansible.module_utils.scaleway_domain_records import get_dns_zone, normalize_data
+import socket
+import time
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_DELAY = 1
+DEFAULT_MAX_DELAY = 16
+DEFAULT_QUERY_TIMEOUT = 3
+DEFAULT_MAX_CONCURRENCY = 10
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'domain-team@scaleway.com'
+}
+
+DOCUMENTATION = '''
+---
+module: scaleway-domain
+
+short_description: This is a little ansible module to wait for Scaleway dns records to be served
+
+version_added: "0.1"
+
+description:
+    - "This is a little ansible module to wait until dns records are present or absent on the nameservers of a dns zone"
+    - "The nameservers are queried in parallel over udp (tcp for truncated responses) with an exponential backoff"
+
+options:
+    dns_zone:
+        description:
+            - This is the dns zone of the records
+        required: true
+
+    name:
+        description:
+            - This is the name of the record to wait for (in the dns zone, empty or @ for the dns zone itself)
+        required: false
+
+    type:
+        description:
+            - This is the type of the record to wait for
+        required: false
+
+    content:
+        description:
+            - This is the content to wait for, any content of this name and type when empty
+        required: false
+
+    state:
+        description:
+            - Wait for the record to be present or absent
+        choice:
+            - present,absent
+        required: false
+        default: present
+
+    records:
+        description:
+            - List of records to wait for, each one with name, type, content and state, instead of a single record
+        required: false
+
+    dns_servers:
+        description:
+            - The nameservers to query (addresses or hostnames)
+            - By default, the nameservers of the dns zone given by the api (token required)
+        required: false
+        aliases: [dns_server]
+
+    token:
+        description:
+            - This is the secret key of Scaleway account, to get the nameservers of the dns zone
+        required: false
+
+    timeout:
+        description:
+            - Maximum number of seconds to wait
+        required: false
+        default: 300
+
+    delay:
+        description:
+            - Seconds between the first two checks, doubled after each check up to max_delay
+        required: false
+        default: 1
+
+    max_delay:
+        description:
+            - Maximum number of seconds between two checks
+        required: false
+        default: 16
+
+    query_timeout:
+        description:
+            - Seconds to wait for the answer of a nameserver
+        required: false
+        default: 3
+
+    protocol:
+        description:
+            - Protocol of the dns queries
+        choices:
+            - udp
+            - tcp
+        required: false
+        default: udp
+
+    port:
+        description:
+            - Port of the nameservers
+        required: false
+        default: 53
+
+    max_concurrency:
+        description:
+            - Maximum number of dns queries sent in parallel
+        required: false
+        default: 10
+
+    endpoint:
+        description:
+            - This is the endpoint to use, will allow use of sandbox api
+        required: false
+
+    verify_certs:
+        description:
+            - Ignore ssl certificate verification
+        required: false
+        type: bool
+        default: True
+
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
+extends_documentation_fragment
+
+author:
+    - domain-team@scaleway.com
+'''
+
+EXAMPLES = '''
+```
+# wait for a record on the nameservers of the dns zone
+- name: wait for host01
+    domain_scaleway_wait_record:
+        token: "ZETZEGERHG35ERHGERHERSDGDSGS"
+        dns_zone: "example.com"
+        name: "host01"
+        type: "A"
+        content: "192.168.1.234"
+
+# wait for records on a given nameserver
+- name: wait for the records
+    domain_scaleway_wait_record:
+        dns_zone: "example.com"
+        dns_server: "9.9.9.9"
+        records:
+          - name: "host01"
+            type: "A"
+            content: "192.168.1.234"
+          - name: "old"
+            type: "A"
+            state: "absent"
+        timeout: 120
+```
+'''
+
+RETURN = '''
+elapsed:
+    number of seconds waited
+attempts:
+    number of checks of the nameservers
+dns_servers:
+    the nameservers queried
+records:
+    the records waited for, with the answers (and rcode) of each nameserver at the last check, a nameserver answering other than NOERROR or NXDOMAIN is still waited for
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
+'''
+
+RECORD_TYPES = ['A', 'AAAA', 'MX', 'CNAME', 'TXT', 'SRV', 'TLSA', 'NS', 'PTR', 'CAA']
+
+
+def record_fqdn(dns_zone, name):
+    name = (name or '').rstrip('.')
+    if name in ('', '@'):
+        return dns_zone.rstrip('.') + '.'
+    return "{}.{}." . format(name, dns_zone.rstrip('.'))
+
+
+def content_matches(record_type, content, answer):
+    """Whether a dns answer holds the content, which may not have the priority of MX and SRV records."""
+    expected = normalize_data(record_type, content)
+    if normalize_data(record_type, answer) == expected:
+        return True
+    if record_type in ('MX', 'SRV') and ' ' in answer:
+        return normalize_data(record_type, answer.split(' ', 1)[1]) == expected
+    return False
+
+
+def record_done(record, answers):
+    fqdn = record['fqdn'].lower()
+    matching = [answer['data'] for answer in answers if answer['type'] == record['type'] and answer['name'].lower() == fqdn]
+    if record['content']:
+        found = any(content_matches(record['type'], record['content'], answer) for answer in matching)
+    else:
+        found = bool(matching)
+    return found == (record['state'] == 'present')
+
+
+def dns_servers(module):
+    """Addresses of the nameservers to query."""
+    servers = module.params['dns_servers']
+    if not servers:
+        if not module.params['token']:
+            module.fail_json(msg='dns_servers or token is required')
+        api = ScalewayDomainAPI(module)
+        zone = get_dns_zone(api, module.params['dns_zone'])
+        if zone is None:
+            module.fail_json(msg='dns zone {} not found' . format(module.params['dns_zone']))
+        servers = zone.get('ns') or zone.get('ns_default') or []
+        if not servers:
+            module.fail_json(msg='no nameserver for dns zone {}' . format(module.params['dns_zone']))
+
+    addresses = []
+    for server in servers:
+        try:
+            addresses.append(resolve_address(server.rstrip('.')))
+        except socket.error as e:
+            module.fail_json(msg='can not resolve nameserver {}: {}' . format(server, e))
+    return addresses
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    record_args = dict(
+        name=dict(type='str', required=True),
+        type=dict(choices=RECORD_TYPES, required=True),
+        content=dict(type='str', required=False, default=''),
+        state=dict(choices=['present', 'absent'], required=False, default='present'),
+    )
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(
+        token=dict(type='str', required=False, no_log=True),
+        dns_zone=dict(type='str', required=True),
+        name=dict(type='str', required=False),
+        type=dict(choices=RECORD_TYPES, required=False),
+        content=dict(type='str', required=False, default=''),
+        state=dict(choices=['present', 'absent'], required=False, default='present'),
+        records=dict(type='list', elements='dict', options=record_args, required=False),
+        dns_servers=dict(type='list', elements='str', required=False, aliases=['dns_server']),
+        timeout=dict(type='int', required=False, default=DEFAULT_TIMEOUT),
+        delay=dict(type='float', required=False, default=DEFAULT_DELAY),
+        max_delay=dict(type='float', required=False, default=DEFAULT_MAX_DELAY),
+        query_timeout=dict(type='float', required=False, default=DEFAULT_QUERY_TIMEOUT),
+        protocol=dict(choices=['udp', 'tcp'], required=False, default='udp'),
+        port=dict(type='int', required=False, default=53),
+        max_concurrency=dict(type='int', required=False, default=DEFAULT_MAX_CONCURRENCY),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        mutually_exclusive=[['name', 'records']],
+        required_one_of=[['name', 'records']],
+        required_together=[['name', 'type']],
+        supports_check_mode=True
+    )
+    collect_metrics(module)
+
+    # the records are not written in check mode, waiting for them would fail
+    if module.check_mode:
+        module.exit_json(changed=False, skipped=True, msg='not waiting in check mode')
+
+    records = module.params['records'] or [dict(
+        name=module.params['name'],
+        type=module.params['type'],
+        content=module.params['content'],
+        state=module.params['state'],
+    )]
+    for record in records:
+        record['fqdn'] = record_fqdn(module.params['dns_zone'], record['name'])
+        # an invalid name would only fail each query, until the timeout
+        try:
+            encode_name(record['fqdn'])
+        except DNSError as e:
+            module.fail_json(msg=str(e), record=record)
+        record['answers'] = {}
+
+    servers = dns_servers(module)
+
+    def check(item):
+        record, server = item
+        try:
+            response = query(server, record['fqdn'], record['type'], port=module.params['port'],
+                             timeout=module.params['query_timeout'], protocol=module.params['protocol'])
+        except (DNSError, socket.error) as e:
+            return False, {"error": str(e)}
+        if response['rcode'] not in ANSWER_RCODES:
+            return False, response
+        return record_done(record, response['answers']), response
+
+    start = time.time()
+    delay = module.params['delay']
+    attempts = 0
+    pending = [(record, server) for record in records for server in servers]
+    while True:
+        attempts += 1
+        checks = run_concurrently(check, pending, module.params['max_concurrency'])
+        still_pending = []
+        for item, (done, response) in zip(pending, checks):
+            item[0]['answers'][item[1]] = response
+            if not done:
+                still_pending.append(item)
+        pending = still_pending
+
+        elapsed = time.time() - start
+        if not pending:
+            break
+        if elapsed >= module.params['timeout']:
+            module.fail_json(msg='timeout waiting for the records', elapsed=elapsed, attempts=attempts, dns_servers=servers,
+                             pending=[dict(fqdn=record['fqdn'], type=record['type'], content=record['content'],
+                                           state=record['state'], dns_server=server) for record, server in pending],
+                             records=records)
+        time.sleep(min(delay, module.params['timeout'] - elapsed))
+        delay = min(delay * 2, module.params['max_delay'])
+
+    module.exit_json(changed=False, elapsed=elapsed, attempts=attempts, dns_servers=servers, records=records)
+
+
+def main():
+    profile_module('domain_scaleway_wait_record', run_module)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.scaleway_domain import ScalewayDomainAPI, scaleway_domain_argument_spec
+from ansible.module_utils.scaleway_domain_cache import invalidate_zone, read_zone_records, scaleway_domain_cache_spec
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics
+from ansible.module_utils.scaleway_domain_profiler import profile_module
+from ansible.module_utils.scaleway_domain_records import (
+    ZoneRecords,
+    cname_conflicts,
+    keep_zone_ns,
+    plan_zone_sync,
+    records_diff,
+    split_changes,
+)
+
+DEFAULT_TTL = 86400
+DEFAULT_PRIORITY = 10
+DEFAULT_CHUNK_SIZE = 500
+
+ANSIBLE_METADATA = {
+    'metadata_version': '0.1',
+    'status': ['preview'],
+    'supported_by': 'domain-team@scaleway.com'
+}
+
+DOCUMENTATION = '''
+---
+module: scaleway-domain
+
+short_description: This is a little ansible module to sync all the records of a Scaleway dns zone
+
+version_added: "0.1"
+
+description:
+    - "This is a little ansible module to sync all the records of a Scaleway dns zone"
+    - "The dns zone ends up with the requested records and nothing else, without being cleared first"
+    - "The zone is read once and only the records which differ are sent: new records are added, missing ones deleted and changed ones set"
+    - "The deletes are sent before the sets and adds, so a CNAME replacing the other records of a name never conflicts with them"
+
+options:
+    token:
+        description:
+            - This is the secret key of Scaleway account
+        required: true
+
+    dns_zone:
+        description:
+            - This is the dns zone requested
+        required: true
+
+    records:
+        description:
+            - This is the whole list of records of the dns zone
+            - Each record accepts name, type, content, ttl, priority and comment as domain_scaleway_record
+            - The NS records of the dns zone itself are managed by Scaleway, they are kept unless some are listed
+        required: true
+
+    chunk_size:
+        description:
+            - This is the maximum number of records sent in one PATCH request
+        required: false
+        default: 500
+
+    zone_cache:
+        description:
+            - Read the dns zone records from an on disk snapshot shared by the tasks, validated against the serial of the zone
+        required: false
+        default: false
+
+    zone_cache_dir:
+        description:
+            - Directory of the dns zone snapshots ($SCALEWAY_DOMAIN_CACHE_DIR or ~/.ansible/tmp/scaleway_domain_zones by default)
+        required: false
+
+    endpoint:
+        description:
+            - This is the endpoint to use, will allow use of sandbox api
+        required: false
+
+    verify_certs:
+        description:
+            - Ignore ssl certificate verification
+        required: false
+        type: bool
+        default: True
+
+    max_retries:
+        description:
+            - Number of retries of a request rejected by rate limiting or by a temporary server error
+        required: false
+        default: 5
+
+    rate_limit:
+        description:
+            - Maximum number of requests per second to the api, shared by all the modules running at the same time with the same endpoint and token (0 to disable)
+            - Lowered while the api answers 429 or rate limit headers
+        required: false
+        default: 50
+
+    rate_limit_dir:
+        description:
+            - Directory of the rate limiter state files, $SCALEWAY_DOMAIN_RATE_LIMIT_DIR or ~/.ansible/tmp/scaleway_domain_rate_limit by default
+        required: false
+
+    collect_metrics:
+        description:
+            - Return the metrics of the run in metrics, the requests sent to the api with their latency, retries and sizes, and the time spent in the api and locally
+            - $SCALEWAY_DOMAIN_COLLECT_METRICS by default
+        required: false
+        type: bool
+        default: false
+
+extends_documentation_fragment
+
+author:
+    - domain-team@scaleway.com
+'''
+
+EXAMPLES = '''
+# example.com gets these records and nothing else
+```yaml
+- domain_scaleway_zone_sync:
+    dns_zone: example.com
+    records:
+      - name: ""
+        type: MX
+        content: mx.example.com.
+        priority: 10
+      - name: www
+        type: A
+        content: 192.168.1.234
+        ttl: 1440
+      - name: blog
+        type: CNAME
+        content: www.example.com.
+```
+'''
+
+RETURN = '''
+meta:
+    status: The http code returned by the api
+    data: The json error message
+dns_zone:
+    the dns zone name requested
+changes:
+    number of changes of the plan (deletes, sets and one add)
+records:
+    number of records carried by the changes
+requests:
+    number of PATCH requests sent
+plan:
+    number of rrsets deleted, records deleted, rrsets set and records added
+diff:
+    the records changed before and after the sync, with --diff
+metrics:
+    with collect_metrics, the number of requests, retries, bytes sent and received, the time spent waiting (backoff and rate limit), in the api and locally, and each request with its method, path, status, start, latency, wait, retries and sizes
+'''
+
+RECORD_TYPES = ['A', 'AAAA', 'MX', 'CNAME', 'TXT', 'SRV', 'TLSA', 'NS', 'PTR', 'CAA']
+
+
+def desired_records(module):
+    records = []
+    for record in module.params['records']:
+        if record['content'] == '':
+            module.fail_json(msg='content empty', record=record)
+        records.append({
+            "name": '' if record['name'] == '@' else record['name'],
+            "type": record['type'],
+            "ttl": record['ttl'],
+            "priority": record['priority'],
+            "data": record['content'],
+            "comment": record['comment'] or None,
+        })
+    conflicts = cname_conflicts(records)
+    if conflicts:
+        module.fail_json(msg='a CNAME can not be next to other records of its name: {}' . format(', '.join(conflicts)))
+    return records
+
+
+def plan_summary(changes):
+    plan = {"rrsets_deleted": 0, "records_deleted": 0, "rrsets_set": 0, "records_added": 0}
+    for change in changes:
+        if "delete" in change:
+            plan["records_deleted" if change["delete"].get("data") is not None else "rrsets_deleted"] += 1
+        elif "set" in change:
+            plan["rrsets_set"] += 1
+        elif "add" in change:
+            plan["records_added"] += len(change["add"]["records"])
+    return plan
+
+
+def change_size(change):
+    if "add" in change:
+        return len(change["add"]["records"])
+    if "set" in change:
+        return len(change["set"]["records"])
+    return 1
+
+
+def run_module():
+    # define the available arguments/parameters that a user can pass to
+    # the module
+    record_args = dict(
+        name=dict(type='str', required=True),
+        type=dict(choices=RECORD_TYPES, required=True),
+        content=dict(type='str', required=True),
+        ttl=dict(type='int', required=False, default=DEFAULT_TTL),
+        priority=dict(type='int', required=False, default=DEFAULT_PRIORITY),
+        comment=dict(type='str', required=False),
+    )
+    module_args = scaleway_domain_argument_spec()
+    module_args.update(scaleway_domain_cache_spec())
+    module_args.update(
+        dns_zone=dict(type='str', required=True),
+        records=dict(type='list', elements='dict', options=record_args, required=True),
+        chunk_size=dict(type='int', required=False, default=DEFAULT_CHUNK_SIZE),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+    collect_metrics(module)
+
+    if module.params['chunk_size'] < 1:
+        module.fail_json(msg='chunk_size must be greater than 0')
+
+    dns_zone = module.params['dns_zone']
+    desired = desired_records(module)
+    api = ScalewayDomainAPI(module)
+
+    # one read of the zone, then only the records which differ are sent
+    before = ZoneRecords(read_zone_records(api, dns_zone))
+    changes = plan_zone_sync(before, desired, keep=keep_zone_ns)
+    chunks = split_changes([(change, []) for change in changes], module.params['chunk_size'])
+
+    result = dict(
+        changed=bool(changes),
+        meta={"status": 200},
+        dns_zone=dns_zone,
+        changes=len(changes),
+        records=sum(change_size(change) for change in changes),
+        requests=0 if module.check_mode else len(chunks),
+        plan=plan_summary(changes),
+    )
+    if module._diff:
+        after = before.copy()
+        keys = after.apply(changes)
+        result['diff'] = records_diff(before, after, keys, dns_zone)
+
+    # in check mode, the changes which would be sent are only reported
+    if module.check_mode:
+        module.exit_json(**result)
+
+    for request_index, chunk in enumerate(chunks):
+        data = {
+            "return_all_records": False,
+            "changes": [change for change, indexes in chunk]
+        }
+
+        response = api.patch("/dns-zones/{}/records" . format(dns_zone), data, fail_on_error=False)
+        invalidate_zone(api, dns_zone)
+        if response.status_code != 200:
+            # if error
+            api.fail(response, dns_zone=dns_zone, request=request_index, requests=len(chunks))
+        result['meta']['status'] = response.status_code
+
+    module.exit_json(**result)
+
+
+def main():
+    profile_module('domain_scaleway_zone_sync', run_module)
+
+if __name__ == '__main__':
+    main()
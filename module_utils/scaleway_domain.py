@@ -0,0 +1,377 @@
+# encoding: utf-8
+
+# Shared client for the Scaleway Domain API, used by all the domain_scaleway_*
+# modules. It holds one pool of keep-alive connections per module run (see
+# scaleway_domain_http, requests is not required), retries the requests
+# rejected by rate limiting or by a temporary server error, and paces the
+# requests with the rate limiter shared by the module processes. With
+# collect_metrics, every request is logged in the metrics of the module run.
+
+import json
+import random
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+from ansible.module_utils.scaleway_domain_http import IDEMPOTENT_METHODS, TransportError, transport
+from ansible.module_utils.scaleway_domain_metrics import collect_metrics, scaleway_domain_metrics_spec
+from ansible.module_utils.scaleway_domain_ratelimit import rate_limiter, scaleway_domain_rate_limit_spec
+from ansible.module_utils.six.moves import queue
+
+DEFAULT_ENDPOINT = 'https://api.scaleway.com'
+DEFAULT_VERSION = 'v2alpha2'
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_MAX_CONCURRENCY = 4
+
+# 429 and 503 mean the request has not been processed, they are retried for
+# every method. Other server errors are only retried for idempotent methods.
+RETRY_ALWAYS_STATUS_CODES = (429, 503)
+RETRY_IDEMPOTENT_STATUS_CODES = (500, 502, 504)
+
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# buying or renewing a domain and recreating a dns zone go on once the api
+# answered, until the status of the domain or the dns zone leaves the pending
+# statuses. With wait, the modules poll it, WAIT_DELAY seconds after the first
+# read then twice longer each time, up to WAIT_MAX_DELAY.
+DEFAULT_WAIT_TIMEOUT = 600
+WAIT_DELAY = 1
+WAIT_MAX_DELAY = 30
+DOMAIN_PENDING_STATUSES = ('creating', 'renewing', 'xfering', 'updating', 'checking', 'deleting')
+DOMAIN_FAILED_STATUSES = ('create_error', 'renew_error', 'xfer_error')
+DNS_ZONE_PENDING_STATUSES = ('pending',)
+DNS_ZONE_FAILED_STATUSES = ('error',)
+
+
+def scaleway_domain_argument_spec():
+    spec = dict(
+        endpoint=dict(type='str', required=False, default=DEFAULT_ENDPOINT),
+        version=dict(type='str', required=False, default=DEFAULT_VERSION),
+        token=dict(type='str', required=True, no_log=True),
+        verify_certs=dict(type='bool', required=False),
+        max_retries=dict(type='int', required=False, default=DEFAULT_MAX_RETRIES),
+    )
+    spec.update(scaleway_domain_rate_limit_spec())
+    spec.update(scaleway_domain_metrics_spec())
+    return spec
+
+
+def scaleway_domain_pagination_spec():
+    return dict(
+        page_size=dict(type='int', required=False, default=DEFAULT_PAGE_SIZE),
+        max_concurrency=dict(type='int', required=False, default=DEFAULT_MAX_CONCURRENCY),
+    )
+
+
+def scaleway_domain_wait_spec():
+    return dict(
+        wait=dict(type='bool', required=False, default=False),
+        wait_timeout=dict(type='int', required=False, default=DEFAULT_WAIT_TIMEOUT),
+    )
+
+
+def parse_retry_after(value):
+    """Return the number of seconds asked by a Retry-After header, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+def backoff_delay(retries, retry_after=None):
+    """Exponential backoff with full jitter, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** retries)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def error_data(response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def domain_transfer_locked(domain):
+    """Whether the transfer of a domain is locked, from its epp status codes."""
+    return 'clienttransferprohibited' in [code.lower() for code in domain.get('epp_code') or []]
+
+
+def domain_auto_renew_enabled(domain):
+    return domain.get('auto_renew_status') in ('enabled', 'enabling')
+
+
+def wait_for_status(read, pending, timeout):
+    """Call read until the status of what it returns is not in pending, or for timeout seconds.
+
+    Return the last resource read, the number of reads and the seconds waited.
+    The status of the resource is still pending when the timeout expired.
+    """
+    start = time.time()
+    delay = WAIT_DELAY
+    polls = 0
+    while True:
+        resource = read()
+        polls += 1
+        remaining = timeout - (time.time() - start)
+        if resource.get('status') not in pending or remaining <= 0:
+            return resource, polls, round(time.time() - start, 3)
+        time.sleep(min(delay, remaining))
+        delay = min(WAIT_MAX_DELAY, delay * 2)
+
+
+def wait_error(name, resource, pending, failed, timeout):
+    """Message of a wait which timed out or ended in a failed status, None if it succeeded."""
+    if resource.get('status') in pending:
+        return '{} is still {} after {}s' . format(name, resource['status'], timeout)
+    if resource.get('status') in failed:
+        return '{} is {}' . format(name, resource['status'])
+    return None
+
+
+def run_concurrently(func, items, max_workers):
+    """Call func on every item with at most max_workers threads.
+
+    The results are returned in the order of the items. If a call raised an
+    exception, the exception of the first failed item is raised once all the
+    calls are done, so the caller can fail from the main thread.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    todo = queue.Queue()
+    for index, item in enumerate(items):
+        todo.put((index, item))
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                index, item = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = func(item)
+            except Exception as e:
+                errors.append((index, e))
+
+    threads = [threading.Thread(target=worker) for dummy in range(min(max_workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise min(errors, key=lambda error: error[0])[1]
+    return results
+
+
+class ScalewayDomainAPIError(Exception):
+
+    def __init__(self, msg, response=None):
+        super(ScalewayDomainAPIError, self).__init__(msg)
+        self.response = response
+
+
+class Pages(object):
+    """Items of a list endpoint, fetched page after page while iterating.
+
+    The first page gives the total_count, the following pages are then
+    fetched by windows of max_concurrency pages in parallel. Only one window
+    is held in memory at a time and the items are yielded in the api order.
+    A listing shorter than the total_count fails rather than being truncated.
+    """
+
+    def __init__(self, api, path, key, params=None, page_size=DEFAULT_PAGE_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.api = api
+        self.path = path
+        self.key = key
+        self.params = dict(params or {})
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.total_count = None
+
+    def fetch(self, page, page_size=None):
+        params = dict(self.params, page=page, page_size=page_size or self.page_size)
+        response = self.api.send('GET', self.path, params=params)
+        if not 200 <= response.status_code < 300:
+            raise ScalewayDomainAPIError('Your request failed', response)
+        return response.json()
+
+    def __iter__(self):
+        try:
+            first = self.fetch(1)
+            self.total_count = first.get('total_count')
+            for item in first[self.key]:
+                yield item
+
+            # the api may cap page_size: the first page then gives the size
+            # of the pages
+            page_size = self.page_size
+            if 0 < len(first[self.key]) < page_size and len(first[self.key]) < (self.total_count or 0):
+                page_size = len(first[self.key])
+
+            if self.total_count is None:
+                # no total count: walk until a page which is not full
+                page, items = 1, first[self.key]
+                while len(items) >= page_size:
+                    page += 1
+                    items = self.fetch(page, page_size)[self.key]
+                    for item in items:
+                        yield item
+                return
+
+            count = len(first[self.key])
+            pages = (self.total_count + page_size - 1) // page_size
+            remaining = list(range(2, pages + 1))
+            for start in range(0, len(remaining), self.max_concurrency):
+                window = remaining[start:start + self.max_concurrency]
+                for body in run_concurrently(lambda page: self.fetch(page, page_size), window, self.max_concurrency):
+                    count += len(body[self.key])
+                    for item in body[self.key]:
+                        yield item
+            if count < self.total_count:
+                raise ScalewayDomainAPIError('listed {} {} of {}' . format(count, self.key, self.total_count))
+        except ScalewayDomainAPIError as e:
+            self.api.fail_error(e)
+
+
+class ScalewayDomainAPI(object):
+
+    def __init__(self, module, pool_size=DEFAULT_POOL_SIZE):
+        self.module = module
+
+        if not module.params['endpoint']:
+            module.params['endpoint'] = DEFAULT_ENDPOINT
+        if not module.params['version']:
+            module.params['version'] = DEFAULT_VERSION
+
+        self.base_url = "{}/domain/{}" . format(module.params['endpoint'].rstrip('/'), module.params['version'])
+        self.max_retries = max(0, module.params['max_retries'])
+        self.verify = module.params['verify_certs']
+        self.rate_limiter = rate_limiter(module)
+        self.metrics = collect_metrics(module)
+
+        # keep one connection per worker thread in the pool
+        pool_size = max(pool_size, module.params.get('max_concurrency') or 0)
+
+        self.transport = transport({
+            "x-auth-token": module.params['token'],
+            "Content-Type": "application/json",
+        }, self.verify, pool_size)
+
+    def url(self, path):
+        return self.base_url + path
+
+    def should_retry(self, method, status_code):
+        if status_code in RETRY_ALWAYS_STATUS_CODES:
+            return True
+        return status_code in RETRY_IDEMPOTENT_STATUS_CODES and method in IDEMPOTENT_METHODS
+
+    def send(self, method, path, data=None, params=None):
+        """Send a request and return the response, whatever its status.
+
+        Rate limited and temporary failed requests are retried up to
+        max_retries times. It never fails the module, so it can be called
+        from worker threads: a connection error raises ScalewayDomainAPIError.
+        """
+        body = None
+        if data is not None:
+            body = json.dumps(data, separators=(',', ':'))
+        stats = {"latency": 0.0, "wait": 0.0, "retries": 0, "bytes_sent": 0, "bytes_received": 0}
+        if self.metrics is None:
+            return self.send_retried(method, path, body, params, stats)
+
+        started = self.metrics.begin()
+        response = None
+        try:
+            response = self.send_retried(method, path, body, params, stats)
+            return response
+        finally:
+            self.metrics.end(method, path, started, params=params, status=getattr(response, 'status_code', None), **stats)
+
+    def send_retried(self, method, path, body, params, stats):
+        """Send the request until it is not retried, counting each attempt in stats."""
+        while True:
+            if self.rate_limiter is not None:
+                stats['wait'] += self.rate_limiter.acquire()
+            started = time.time()
+            try:
+                response = self.transport.request(method, self.url(path), body=body, params=params, timeout=DEFAULT_TIMEOUT)
+            except TransportError as e:
+                stats['latency'] += time.time() - started
+                if method not in IDEMPOTENT_METHODS or stats['retries'] >= self.max_retries:
+                    raise ScalewayDomainAPIError('Your request failed: {}' . format(e))
+                delay = backoff_delay(stats['retries'])
+            else:
+                stats['latency'] += time.time() - started
+                stats['bytes_sent'] += len(body or '')
+                stats['bytes_received'] += len(response.content)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if self.rate_limiter is not None:
+                    self.rate_limiter.update(response.status_code, response.headers, retry_after)
+                if stats['retries'] >= self.max_retries or not self.should_retry(method, response.status_code):
+                    return response
+                delay = backoff_delay(stats['retries'], retry_after)
+            time.sleep(delay)
+            stats['wait'] += delay
+            stats['retries'] += 1
+
+    def request(self, method, path, data=None, params=None, fail_on_error=True):
+        """Send a request and return the response.
+
+        Unless fail_on_error is False, the module fails with the api error
+        when the final response is not a success.
+        """
+        try:
+            response = self.send(method, path, data=data, params=params)
+        except ScalewayDomainAPIError as e:
+            self.fail_error(e)
+
+        if fail_on_error and not 200 <= response.status_code < 300:
+            self.fail(response)
+        return response
+
+    def get(self, path, params=None, **kwargs):
+        return self.request('GET', path, params=params, **kwargs)
+
+    def post(self, path, data=None, **kwargs):
+        return self.request('POST', path, data=data, **kwargs)
+
+    def patch(self, path, data=None, **kwargs):
+        return self.request('PATCH', path, data=data, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def paginate(self, path, key, params=None, page_size=None, max_concurrency=None):
+        """Return the Pages of a list endpoint, sized by the module options by default."""
+        if page_size is None:
+            page_size = self.module.params.get('page_size') or DEFAULT_PAGE_SIZE
+        if max_concurrency is None:
+            max_concurrency = self.module.params.get('max_concurrency') or DEFAULT_MAX_CONCURRENCY
+        if page_size < 1 or max_concurrency < 1:
+            self.module.fail_json(msg='page_size and max_concurrency must be greater than 0')
+        return Pages(self, path, key, params=params, page_size=page_size, max_concurrency=max_concurrency)
+
+    def fail_error(self, error, **kwargs):
+        if error.response is not None:
+            self.fail(error.response, **kwargs)
+        self.module.fail_json(msg=str(error), **kwargs)
+
+    def fail(self, response, **kwargs):
+        self.module.fail_json(msg='Your request failed', meta={"status": response.status_code, "data": error_data(response)}, **kwargs)
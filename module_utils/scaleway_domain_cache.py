@@ -0,0 +1,143 @@
+# encoding: utf-8
+
+# On disk snapshots of the records of dns zones, shared by the module
+# processes running at the same time (forks, loops, successive tasks).
+#
+# A snapshot is keyed by endpoint, version, token and dns zone, and is only
+# used while the dns zones listing reports the same serial/updated_at as when
+# it was stored. The fetch of a zone holds a lock on its snapshot, so the
+# processes asking for the same zone wait for the first one instead of all
+# downloading it.
+
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from ansible.module_utils.scaleway_domain_records import ZoneRecords, get_dns_zone, list_zone_records
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+CACHE_FORMAT = 1
+CACHE_DIR_ENV = 'SCALEWAY_DOMAIN_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join('~', '.ansible', 'tmp', 'scaleway_domain_zones')
+
+
+def scaleway_domain_cache_spec():
+    return dict(
+        zone_cache=dict(type='bool', required=False, default=False),
+        zone_cache_dir=dict(type='path', required=False),
+    )
+
+
+def zone_validator(zone):
+    """What changes when the records of the zone change."""
+    return [zone.get('serial'), zone.get('updated_at')]
+
+
+class ZoneCache(object):
+
+    def __init__(self, api, cache_dir):
+        self.api = api
+        self.cache_dir = os.path.expanduser(cache_dir)
+
+    def path(self, dns_zone):
+        params = self.api.module.params
+        token = hashlib.sha256(params['token'].encode('utf-8')).hexdigest()
+        key = json.dumps([CACHE_FORMAT, params['endpoint'], params['version'], token, dns_zone])
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    @contextmanager
+    def lock(self, dns_zone):
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir, 0o700)
+            except OSError:
+                if not os.path.isdir(self.cache_dir):
+                    raise
+        lock_file = open(self.path(dns_zone) + '.lock', 'a')
+        try:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+        finally:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def read(self, dns_zone):
+        try:
+            with open(self.path(dns_zone)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def write(self, dns_zone, validator, records):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"validator": validator, "records": records}, f)
+            os.rename(tmp_path, self.path(dns_zone))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def records(self, dns_zone):
+        """Records of the zone, from the snapshot if it is still valid."""
+        zone = get_dns_zone(self.api, dns_zone)
+        if zone is None or not any(zone_validator(zone)):
+            # nothing to validate a snapshot with, or let the records
+            # listing fail with the api error
+            return list_zone_records(self.api, dns_zone)
+        validator = zone_validator(zone)
+
+        with self.lock(dns_zone):
+            entry = self.read(dns_zone)
+            if entry is not None and entry['validator'] == validator:
+                return entry['records']
+            records = list_zone_records(self.api, dns_zone)
+            self.write(dns_zone, validator, records)
+            return records
+
+    def invalidate(self, dns_zone):
+        with self.lock(dns_zone):
+            try:
+                os.remove(self.path(dns_zone))
+            except OSError:
+                pass
+
+
+def zone_cache(api):
+    """The ZoneCache of the module, or None when zone_cache is disabled."""
+    params = api.module.params
+    if not params.get('zone_cache'):
+        return None
+    cache_dir = params.get('zone_cache_dir') or os.environ.get(CACHE_DIR_ENV) or DEFAULT_CACHE_DIR
+    return ZoneCache(api, cache_dir)
+
+
+def read_zone_records(api, dns_zone):
+    """Records of a dns zone, through the snapshot cache when it is enabled."""
+    cache = zone_cache(api)
+    if cache is None:
+        return list_zone_records(api, dns_zone)
+    return cache.records(dns_zone)
+
+
+def read_rrset(api, dns_zone, name, record_type):
+    """Records of a name and type: from the zone snapshot when the cache is enabled, else filtered by the api."""
+    cache = zone_cache(api)
+    if cache is None:
+        return list_zone_records(api, dns_zone, name, record_type)
+    return ZoneRecords(cache.records(dns_zone)).get(name, record_type)
+
+
+def invalidate_zone(api, dns_zone):
+    cache = zone_cache(api)
+    if cache is not None:
+        cache.invalidate(dns_zone)
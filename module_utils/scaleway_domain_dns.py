@@ -0,0 +1,215 @@
+# encoding: utf-8
+
+# Minimal DNS client speaking the wire protocol over UDP and TCP, used to
+# check that dns records are served by the nameservers without dig or any
+# dns library on the target.
+
+import random
+import socket
+import struct
+
+QTYPES = {
+    'A': 1,
+    'NS': 2,
+    'CNAME': 5,
+    'SOA': 6,
+    'PTR': 12,
+    'MX': 15,
+    'TXT': 16,
+    'AAAA': 28,
+    'SRV': 33,
+    'TLSA': 52,
+    'CAA': 257,
+}
+QTYPE_NAMES = dict((value, key) for key, value in QTYPES.items())
+
+RCODE_NAMES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+# the rcodes of an authoritative answer, the others (REFUSED or SERVFAIL of a
+# nameserver which has not loaded the zone yet...) say nothing of the records
+ANSWER_RCODES = ('NOERROR', 'NXDOMAIN')
+
+FLAG_RD = 0x0100
+FLAG_TC = 0x0200
+UDP_PAYLOAD_SIZE = 4096
+
+
+class DNSError(Exception):
+    pass
+
+
+def encode_name(name):
+    data = bytearray()
+    for label in name.rstrip('.').split('.'):
+        if not label:
+            continue
+        try:
+            # the codec checks the length of the label too
+            label = label.encode('idna')
+        except UnicodeError as e:
+            raise DNSError('invalid name {}: {}' . format(name, e))
+        data.append(len(label))
+        data.extend(label)
+    data.append(0)
+    return data
+
+
+def build_query(query_id, name, qtype):
+    # recursion desired, so a recursive resolver can be asked too
+    data = bytearray(struct.pack('!HHHHHH', query_id, FLAG_RD, 1, 0, 0, 0))
+    data.extend(encode_name(name))
+    data.extend(struct.pack('!HH', QTYPES[qtype], 1))
+    return bytes(data)
+
+
+def read_name(data, offset):
+    """Read a possibly compressed name, return it with the offset following it."""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        if offset >= len(data):
+            raise DNSError('truncated name')
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            if jumps > 64:
+                raise DNSError('compression loop')
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    return '.'.join(labels) + '.', end if end is not None else offset
+
+
+def read_character_strings(rdata):
+    strings = []
+    offset = 0
+    while offset < len(rdata):
+        length = rdata[offset]
+        strings.append(rdata[offset + 1:offset + 1 + length].decode('utf-8', 'replace'))
+        offset += 1 + length
+    return strings
+
+
+def decode_rdata(data, offset, length, rtype):
+    """Text presentation of a record data, as in a zone file."""
+    rdata = data[offset:offset + length]
+    name = QTYPE_NAMES.get(rtype)
+    if name == 'A':
+        return socket.inet_ntoa(bytes(rdata))
+    if name == 'AAAA':
+        return socket.inet_ntop(socket.AF_INET6, bytes(rdata))
+    if name in ('NS', 'CNAME', 'PTR'):
+        return read_name(data, offset)[0]
+    if name == 'MX':
+        preference = struct.unpack('!H', bytes(rdata[:2]))[0]
+        return "{} {}" . format(preference, read_name(data, offset + 2)[0])
+    if name == 'SRV':
+        priority, weight, port = struct.unpack('!HHH', bytes(rdata[:6]))
+        return "{} {} {} {}" . format(priority, weight, port, read_name(data, offset + 6)[0])
+    if name == 'TXT':
+        return ''.join(read_character_strings(rdata))
+    if name == 'CAA':
+        tag_length = rdata[1]
+        tag = rdata[2:2 + tag_length].decode('ascii', 'replace')
+        value = rdata[2 + tag_length:].decode('utf-8', 'replace')
+        return '{} {} "{}"' . format(rdata[0], tag, value)
+    return ''.join('{:02x}' . format(byte) for byte in rdata)
+
+
+def parse_response(data, query_id):
+    data = bytearray(data)
+    if len(data) < 12:
+        raise DNSError('response too short')
+    response_id, flags, qdcount, ancount, nscount, arcount = struct.unpack('!HHHHHH', bytes(data[:12]))
+    if response_id != query_id:
+        raise DNSError('unexpected response id')
+
+    # a truncated or malformed response runs past its data or holds rdata of
+    # the wrong length
+    try:
+        offset = 12
+        for dummy in range(qdcount):
+            offset = read_name(data, offset)[1] + 4
+
+        answers = []
+        for dummy in range(ancount):
+            name, offset = read_name(data, offset)
+            rtype, rclass, ttl, length = struct.unpack('!HHIH', bytes(data[offset:offset + 10]))
+            offset += 10
+            if offset + length > len(data):
+                raise DNSError('malformed response: truncated record data')
+            answers.append({
+                "name": name,
+                "type": QTYPE_NAMES.get(rtype, str(rtype)),
+                "ttl": ttl,
+                "data": decode_rdata(data, offset, length, rtype),
+            })
+            offset += length
+    except (struct.error, IndexError, ValueError, socket.error) as e:
+        raise DNSError('malformed response: {}' . format(e))
+
+    return {
+        "rcode": RCODE_NAMES.get(flags & 0x000F, str(flags & 0x000F)),
+        "truncated": bool(flags & FLAG_TC),
+        "answers": answers,
+    }
+
+
+def recv_exactly(sock, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise DNSError('connection closed')
+        data.extend(chunk)
+    return data
+
+
+def query_udp(address, port, packet, timeout):
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.settimeout(timeout)
+        sock.sendto(packet, (address, port))
+        return sock.recvfrom(UDP_PAYLOAD_SIZE)[0]
+    finally:
+        sock.close()
+
+
+def query_tcp(address, port, packet, timeout):
+    family = socket.AF_INET6 if ':' in address else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect((address, port))
+        sock.sendall(struct.pack('!H', len(packet)) + packet)
+        length = struct.unpack('!H', bytes(recv_exactly(sock, 2)))[0]
+        return recv_exactly(sock, length)
+    finally:
+        sock.close()
+
+
+def query(address, name, qtype, port=53, timeout=3, protocol='udp'):
+    """Ask a nameserver for the records of a name and type.
+
+    Over udp, a truncated response is asked again over tcp. Raises DNSError
+    (or socket.error) when the server does not answer properly.
+    """
+    query_id = random.randint(0, 0xFFFF)
+    packet = build_query(query_id, name, qtype)
+    if protocol == 'udp':
+        response = parse_response(query_udp(address, port, packet, timeout), query_id)
+        if not response['truncated']:
+            return response
+    return parse_response(query_tcp(address, port, packet, timeout), query_id)
+
+
+def resolve_address(server):
+    """Address of a nameserver given by address or hostname."""
+    return socket.getaddrinfo(server, None)[0][4][0]
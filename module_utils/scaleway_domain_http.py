@@ -0,0 +1,232 @@
+# encoding: utf-8
+
+# Transport of the requests of the api client, without a requirement on the
+# hosts running the modules.
+#
+# requests is used when it is installed. Otherwise the keep-alive connections
+# of the standard library are pooled and shared by the threads of the module,
+# with gzip responses. Through a proxy, the requests go through open_url of
+# ansible.module_utils.urls, which handles the proxy settings.
+
+import json
+import select
+import socket
+import ssl
+import threading
+import zlib
+
+from ansible.module_utils.six import text_type
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.parse import urlencode, urlsplit
+from ansible.module_utils.six.moves.urllib.request import getproxies, proxy_bypass
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+GZIP_MAGIC = b'\x1f\x8b'
+# the methods a request can be sent twice with, the others are sent again
+# only when they failed before being written
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+
+class TransportError(Exception):
+    """The request got no response: connection error or timeout."""
+
+
+class Headers(dict):
+    """Response headers, case insensitive."""
+
+    def __init__(self, items):
+        super(Headers, self).__init__((name.lower(), value) for name, value in items)
+
+    def get(self, name, default=None):
+        return super(Headers, self).get(name.lower(), default)
+
+    def __getitem__(self, name):
+        return super(Headers, self).__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super(Headers, self).__contains__(name.lower())
+
+
+class Response(object):
+    """The parts of a requests response the api client uses."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def decode_content(headers, content):
+    # open_url may have decompressed the body already
+    if 'gzip' in (headers.get('Content-Encoding') or '') and content[:2] == GZIP_MAGIC:
+        return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+    return content
+
+
+def connection_dropped(connection):
+    """Whether the server closed an idle connection: with no request pending, it is only readable at its end."""
+    if connection.sock is None:
+        return False
+    try:
+        readable = select.select([connection.sock], [], [], 0)[0]
+    except (ValueError, select.error, socket.error):
+        return True
+    return bool(readable)
+
+
+def request_target(url, params):
+    """Path and query of the url, with the params without a value dropped as requests does."""
+    parts = urlsplit(url)
+    target = parts.path or '/'
+    query = [parts.query] if parts.query else []
+    if params:
+        query.append(urlencode([(key, value) for key, value in params.items() if value is not None], doseq=True))
+    query = '&'.join(part for part in query if part)
+    if query:
+        target += '?' + query
+    return parts, target
+
+
+class RequestsTransport(object):
+    """Transport on a requests session, pooling pool_size connections."""
+
+    def __init__(self, headers, verify, pool_size):
+        self.verify = verify
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(headers)
+
+    def request(self, method, url, body=None, params=None, timeout=None):
+        try:
+            return self.session.request(method, url, data=body, params=params, verify=self.verify, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise TransportError(str(e))
+
+
+class HTTPTransport(object):
+    """Transport on the keep-alive connections of the standard library.
+
+    The idle connections are kept, at most pool_size of them, and reused by
+    any thread. A kept connection the server closed in the meantime is
+    dropped before it is used. If a kept connection fails once the request
+    was written, the request is only sent again on another one when its
+    method is idempotent: the server may have processed it.
+    """
+
+    def __init__(self, headers, verify, pool_size):
+        self.headers = dict(headers)
+        self.headers.setdefault('Accept-Encoding', 'gzip')
+        self.verify = verify is not False
+        self.pool_size = pool_size
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.context = None
+        self.proxies = getproxies()
+
+    def ssl_context(self):
+        if self.context is None:
+            context = ssl.create_default_context()
+            if not self.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            self.context = context
+        return self.context
+
+    def acquire(self, parts, timeout):
+        """An idle connection to the host of the url and whether it was used before, or a new one."""
+        key = (parts.scheme, parts.netloc)
+        while True:
+            with self.lock:
+                idle = self.idle.get(key)
+                if not idle:
+                    break
+                connection = idle.pop()
+            if connection_dropped(connection):
+                connection.close()
+                continue
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+        if parts.scheme == 'https':
+            return http_client.HTTPSConnection(parts.netloc, timeout=timeout, context=self.ssl_context()), False
+        return http_client.HTTPConnection(parts.netloc, timeout=timeout), False
+
+    def release(self, parts, connection):
+        with self.lock:
+            idle = self.idle.setdefault((parts.scheme, parts.netloc), [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def use_proxy(self, parts):
+        return bool(self.proxies.get(parts.scheme)) and not proxy_bypass(parts.hostname)
+
+    def request(self, method, url, body=None, params=None, timeout=None):
+        parts, target = request_target(url, params)
+        if isinstance(body, text_type):
+            body = body.encode('utf-8')
+        headers = dict(self.headers)
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+        if self.use_proxy(parts):
+            return self.urls_request(method, parts, target, body, headers, timeout)
+
+        while True:
+            connection, reused = self.acquire(parts, timeout)
+            try:
+                connection.request(method, target, body, headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (http_client.HTTPException, socket.error) as e:
+                connection.close()
+                if reused and method in IDEMPOTENT_METHODS and not isinstance(e, socket.timeout):
+                    continue
+                raise TransportError(str(e) or e.__class__.__name__)
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(parts, connection)
+        headers = Headers(response.getheaders())
+        return Response(response.status, headers, decode_content(headers, content))
+
+    def urls_request(self, method, parts, target, body, headers, timeout):
+        from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+        from ansible.module_utils.urls import open_url
+
+        url = "{}://{}{}" . format(parts.scheme, parts.netloc, target)
+        try:
+            response = open_url(url, data=body, headers=headers, method=method, validate_certs=self.verify,
+                                timeout=timeout, use_proxy=True)
+        except HTTPError as e:
+            response = e
+        except (URLError, http_client.HTTPException, socket.error) as e:
+            raise TransportError(str(e))
+        content = response.read()
+        headers = Headers(response.info().items())
+        return Response(response.getcode(), headers, decode_content(headers, content))
+
+
+def transport(headers, verify, pool_size):
+    """The transport of the api client: requests when it is installed."""
+    if HAS_REQUESTS:
+        return RequestsTransport(headers, verify, pool_size)
+    return HTTPTransport(headers, verify, pool_size)
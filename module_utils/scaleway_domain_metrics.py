@@ -0,0 +1,117 @@
+# encoding: utf-8
+
+# Timing of a module run, returned in its result with collect_metrics.
+#
+# Every request sent by the api client is logged with its method, path,
+# final status, latency, retries and sizes. The time of the run is split
+# between the api (while at least one request is in flight, retries and rate
+# limiting included, so concurrent requests are not counted twice) and the
+# local processing of the module.
+
+import threading
+import time
+
+from ansible.module_utils.basic import env_fallback
+
+METRICS_PRECISION = 4
+COLLECT_METRICS_ENV = 'SCALEWAY_DOMAIN_COLLECT_METRICS'
+
+
+def scaleway_domain_metrics_spec():
+    return dict(
+        collect_metrics=dict(type='bool', required=False, default=False, fallback=(env_fallback, [COLLECT_METRICS_ENV])),
+    )
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.calls = []
+        self.in_flight = 0
+        self.api_since = None
+        self.api_time = 0.0
+
+    def begin(self):
+        """A request is sent, return its start time."""
+        now = time.time()
+        with self.lock:
+            if self.in_flight == 0:
+                self.api_since = now
+            self.in_flight += 1
+        return now
+
+    def end(self, method, path, started, params=None, status=None, latency=0.0, wait=0.0, retries=0, bytes_sent=0,
+            bytes_received=0):
+        """The request started at started got its final response, or none (status None)."""
+        now = time.time()
+        call = {
+            "method": method,
+            "path": path,
+            "status": status,
+            "start": round(started - self.started, METRICS_PRECISION),
+            "latency": round(latency, METRICS_PRECISION),
+            "wait": round(wait, METRICS_PRECISION),
+            "retries": retries,
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+        }
+        # the query, so the pages of a list are told apart
+        params = dict((key, value) for key, value in (params or {}).items() if value is not None)
+        if params:
+            call['params'] = params
+        with self.lock:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.api_time += now - self.api_since
+            self.calls.append(call)
+
+    def result(self):
+        now = time.time()
+        with self.lock:
+            api_time = self.api_time
+            if self.in_flight:
+                api_time += now - self.api_since
+            calls = sorted(self.calls, key=lambda call: call['start'])
+        total_time = now - self.started
+        return {
+            "requests": len(calls),
+            "retries": sum(call['retries'] for call in calls),
+            "bytes_sent": sum(call['bytes_sent'] for call in calls),
+            "bytes_received": sum(call['bytes_received'] for call in calls),
+            "wait_time": round(sum(call['wait'] for call in calls), METRICS_PRECISION),
+            "api_time": round(api_time, METRICS_PRECISION),
+            "local_time": round(max(0.0, total_time - api_time), METRICS_PRECISION),
+            "total_time": round(total_time, METRICS_PRECISION),
+            "calls": calls,
+        }
+
+
+def collect_metrics(module):
+    """Start the metrics of the module run when collect_metrics is set, or return None.
+
+    The api clients of the module log their requests in it, and exit_json and
+    fail_json add it to the result of the module as metrics.
+    """
+    if not module.params.get('collect_metrics'):
+        return None
+    metrics = getattr(module, 'scaleway_domain_metrics', None)
+    if metrics is not None:
+        return metrics
+
+    metrics = Metrics()
+    exit_json, fail_json = module.exit_json, module.fail_json
+
+    def exit_with_metrics(**kwargs):
+        kwargs['metrics'] = metrics.result()
+        exit_json(**kwargs)
+
+    def fail_with_metrics(msg, **kwargs):
+        kwargs['metrics'] = metrics.result()
+        fail_json(msg=msg, **kwargs)
+
+    module.exit_json = exit_with_metrics
+    module.fail_json = fail_with_metrics
+    module.scaleway_domain_metrics = metrics
+    return metrics
@@ -0,0 +1,202 @@
+# encoding: utf-8
+
+# Opt-in profiling of a module run on the host running it.
+#
+# With $SCALEWAY_DOMAIN_PROFILE_DIR set (with the environment keyword of a
+# task, for instance), run_module is run under cProfile, the worker threads of
+# the module included, and tracemalloc. A .pstats file and a .memory.txt
+# report are written to the directory, named after the module, its action
+# and its dns zone or domain. The profile covers the whole run, the
+# serialization of the result by exit_json included, and the memory report
+# lists the largest allocations alive when the module exits.
+#
+# tracemalloc slows the module down: $SCALEWAY_DOMAIN_PROFILE_MEMORY=false
+# only keeps cProfile, for timings closer to an unprofiled run.
+#
+# Every module imports this file: the profiling modules are only imported by
+# a profiled run.
+
+import os
+import re
+import threading
+import time
+
+from ansible.module_utils import basic
+from ansible.module_utils.parsing.convert_bool import boolean
+
+PROFILE_DIR_ENV = 'SCALEWAY_DOMAIN_PROFILE_DIR'
+PROFILE_MEMORY_ENV = 'SCALEWAY_DOMAIN_PROFILE_MEMORY'
+TRACEBACK_DEPTH = 10
+TOP_ALLOCATIONS = 25
+
+
+def name_part(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or '-'
+
+
+def profile_name(module_name, params):
+    """module-action-zone, the zone being the dns zone, the domain or the number of dns zones or domains."""
+    action = params.get('action') or params.get('state') or ''
+    target = params.get('dns_zone') or params.get('domain')
+    for key in ('dns_zones', 'domains', 'ids'):
+        if not target and params.get(key):
+            target = "{}-{}" . format(len(params[key]), key)
+    parts = [module_name]
+    if action:
+        parts.append(action)
+    if target:
+        parts.append(target)
+    return '-'.join(name_part(part) for part in parts)
+
+
+def module_params():
+    # the arguments of a module which did not exit, read again once it ran
+    try:
+        return basic._load_params()
+    except Exception:
+        return {}
+
+
+def format_size(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return "{:.1f} {}" . format(size, unit)
+        size /= 1024.0
+    return "{:.1f} GiB" . format(size)
+
+
+class ModuleProfiler(object):
+    """cProfile of all the threads of the module, and tracemalloc when memory is set."""
+
+    def __init__(self, memory=True):
+        import cProfile
+        try:
+            import tracemalloc
+        except ImportError:
+            tracemalloc = None
+        self.tracemalloc = tracemalloc
+        self.memory = memory and tracemalloc is not None
+        self.profile_class = cProfile.Profile
+        self.profile = cProfile.Profile()
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.traced_at_exit = None
+        self.params = None
+        self.methods = {}
+
+    def profile_thread(self, frame, event, arg):
+        # first event of a new thread: it gets its own profiler
+        profile = self.profile_class()
+        try:
+            profile.enable()
+        except ValueError:
+            # a single profiler already sees every thread (python 3.12+)
+            return
+        with self.lock:
+            self.thread_profiles.append(profile)
+
+    def take_snapshot(self):
+        if self.memory and self.snapshot is None:
+            self.traced_at_exit = self.tracemalloc.get_traced_memory()
+            self.snapshot = self.tracemalloc.take_snapshot()
+
+    def snapshot_before(self, method):
+        def exit_method(module, *args, **kwargs):
+            if self.params is None:
+                self.params = module.params
+            self.take_snapshot()
+            return method(module, *args, **kwargs)
+        return exit_method
+
+    def start(self):
+        # raises ValueError when another profiler is running
+        self.profile.enable()
+        self.started = time.time()
+        if self.memory:
+            self.tracemalloc.start(TRACEBACK_DEPTH)
+        # the allocations alive when the module exits, its result included
+        for method in ('exit_json', 'fail_json'):
+            self.methods[method] = getattr(basic.AnsibleModule, method)
+            setattr(basic.AnsibleModule, method, self.snapshot_before(self.methods[method]))
+        threading.setprofile(self.profile_thread)
+
+    def stop(self):
+        self.profile.disable()
+        self.elapsed = time.time() - self.started
+        threading.setprofile(None)
+        for method, original in self.methods.items():
+            setattr(basic.AnsibleModule, method, original)
+        if self.memory:
+            self.traced = self.tracemalloc.get_traced_memory()
+            self.tracemalloc.stop()
+
+    def stats(self):
+        import pstats
+        stats = pstats.Stats(self.profile)
+        for profile in self.thread_profiles:
+            profile.create_stats()
+            stats.add(profile)
+        return stats
+
+    def memory_report(self, name):
+        lines = ["{} in {:.3f}s" . format(name, self.elapsed)]
+        try:
+            import resource
+        except ImportError:
+            pass
+        else:
+            lines.append("max rss: {} KiB" . format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+        if not self.memory:
+            lines.append("tracemalloc {}" . format('disabled' if self.tracemalloc is not None else 'not available'))
+            return '\n'.join(lines) + '\n'
+
+        lines.append("traced peak: {}" . format(format_size(self.traced[1])))
+        if self.snapshot is not None:
+            lines.append("traced at exit: {}" . format(format_size(self.traced_at_exit[0])))
+            lines.append('')
+            lines.append("largest allocations alive at exit:")
+            tracemalloc = self.tracemalloc
+            snapshot = self.snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for statistic in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                frame = statistic.traceback[0]
+                lines.append("  {:>12} {:>9} blocks  {}:{}" . format(
+                    format_size(statistic.size), statistic.count, frame.filename, frame.lineno))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory, name):
+        """Write the profile and the memory report, return their paths."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        base = os.path.join(directory, "{}-{}-{}" . format(name, time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+        self.stats().dump_stats(base + '.pstats')
+        with open(base + '.memory.txt', 'w') as f:
+            f.write(self.memory_report(name))
+        return base + '.pstats', base + '.memory.txt'
+
+
+def profile_module(module_name, run_module):
+    """Run the module, profiled when $SCALEWAY_DOMAIN_PROFILE_DIR is set."""
+    directory = os.environ.get(PROFILE_DIR_ENV)
+    if not directory:
+        return run_module()
+
+    profiler = ModuleProfiler(memory=boolean(os.environ.get(PROFILE_MEMORY_ENV, True), strict=False))
+    try:
+        profiler.start()
+    except ValueError:
+        # another profiler is running, the module runs as usual
+        return run_module()
+    try:
+        return run_module()
+    finally:
+        profiler.stop()
+        try:
+            params = profiler.params if profiler.params is not None else module_params()
+            profiler.write(os.path.expanduser(directory), profile_name(module_name, params))
+        except (IOError, OSError):
+            # the result is already sent, a profile which can not be written is lost
+            pass
@@ -0,0 +1,167 @@
+# encoding: utf-8
+
+# Token bucket limiting the rate of the requests sent to the api, shared by
+# all the module processes running at the same time on a host (the forks of
+# a play running the modules on the controller).
+#
+# The bucket is kept in a lock protected state file keyed by endpoint and
+# token. A request takes a token, or reserves the next one and waits for it,
+# so the processes share the rate instead of all bursting. A 429 halves the
+# rate and blocks every process until its Retry-After, rate limit headers
+# lower the rate to what is left of the quota, and the rate grows back to
+# rate_limit with the successful requests.
+
+import hashlib
+import json
+import os
+import time
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+DEFAULT_RATE_LIMIT = 50
+RATE_LIMIT_DIR_ENV = 'SCALEWAY_DOMAIN_RATE_LIMIT_DIR'
+DEFAULT_RATE_LIMIT_DIR = os.path.join('~', '.ansible', 'tmp', 'scaleway_domain_rate_limit')
+
+MIN_RATE = 0.5
+# multiplicative decrease on 429, additive increase on success
+RATE_DECREASE = 0.5
+RATE_INCREASE = 0.02
+
+REMAINING_HEADERS = ('X-RateLimit-Remaining', 'RateLimit-Remaining')
+RESET_HEADERS = ('X-RateLimit-Reset', 'RateLimit-Reset')
+
+
+def scaleway_domain_rate_limit_spec():
+    return dict(
+        rate_limit=dict(type='float', required=False, default=DEFAULT_RATE_LIMIT),
+        rate_limit_dir=dict(type='path', required=False),
+    )
+
+
+def header_value(headers, names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def rate_limit_quota(headers, now):
+    """Requests left and seconds until the quota resets, from the rate limit headers, or None."""
+    remaining = header_value(headers, REMAINING_HEADERS)
+    reset = header_value(headers, RESET_HEADERS)
+    if remaining is None or reset is None:
+        return None
+    # the reset is either a number of seconds or a timestamp
+    if reset > now / 2:
+        reset -= now
+    return remaining, max(0.0, reset)
+
+
+class RateLimiter(object):
+
+    def __init__(self, path, rate):
+        self.path = path
+        self.max_rate = float(rate)
+        # rate of the bucket when this process last took a token
+        self.rate = self.max_rate
+
+    def initial_state(self, now):
+        return {"rate": self.max_rate, "tokens": self.max_rate, "updated": now, "blocked_until": 0}
+
+    def update_state(self, func):
+        """Call func(state, now) with the state locked, save and return its result."""
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory, 0o700)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        with open(self.path, 'a+') as f:
+            if HAS_FCNTL:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                except ValueError:
+                    state = self.initial_state(now)
+                # the rate_limit may have changed since the state was saved
+                state['rate'] = min(state['rate'], self.max_rate)
+
+                # refill the bucket, at most one second of requests
+                elapsed = max(0.0, now - state['updated'])
+                state['tokens'] = min(state['rate'], state['tokens'] + elapsed * state['rate'])
+                state['updated'] = now
+
+                result = func(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def acquire(self):
+        """Take a token for a request, waiting for it when the bucket is empty."""
+        def take(state, now):
+            # the token is taken even when the bucket is empty: the
+            # processes queue up behind the reserved tokens
+            state['tokens'] -= 1
+            self.rate = state['rate']
+            wait = max(0.0, -state['tokens'] / state['rate'])
+            return max(wait, state['blocked_until'] - now)
+
+        wait = self.update_state(take)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def update(self, status_code, headers, retry_after=None):
+        """Adapt the rate to a response of the api."""
+        quota = None
+        if headers is not None:
+            quota = rate_limit_quota(headers, time.time())
+
+        def adapt(state, now):
+            if status_code == 429:
+                state['rate'] = max(MIN_RATE, state['rate'] * RATE_DECREASE)
+                state['tokens'] = min(state['tokens'], 0)
+                if retry_after is not None:
+                    state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+            elif 200 <= status_code < 300:
+                state['rate'] = min(self.max_rate, state['rate'] + self.max_rate * RATE_INCREASE)
+
+            if quota is not None:
+                remaining, reset = quota
+                if remaining < 1:
+                    state['blocked_until'] = max(state['blocked_until'], now + reset)
+                elif reset > 0:
+                    state['rate'] = min(state['rate'], max(MIN_RATE, remaining / reset))
+
+        # a success only changes the state when the rate has been lowered
+        if status_code == 429 or quota is not None or self.rate < self.max_rate:
+            self.update_state(adapt)
+
+
+def rate_limiter(module):
+    """The RateLimiter shared by the processes using the same endpoint and token, or None when disabled."""
+    params = module.params
+    if not params.get('rate_limit') or params['rate_limit'] <= 0:
+        return None
+    directory = params.get('rate_limit_dir') or os.environ.get(RATE_LIMIT_DIR_ENV) or DEFAULT_RATE_LIMIT_DIR
+    token = hashlib.sha256(params['token'].encode('utf-8')).hexdigest()
+    key = json.dumps([params['endpoint'], token])
+    name = hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json'
+    return RateLimiter(os.path.join(os.path.expanduser(directory), name), params['rate_limit'])
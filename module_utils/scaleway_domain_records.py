@@ -0,0 +1,342 @@
+# encoding: utf-8
+
+# Helpers comparing the records of a dns zone with a desired state, shared by
+# the modules which only send the changes really needed.
+
+# types whose data is a hostname, compared case insensitively and without the
+# trailing dot
+HOSTNAME_TYPES = ('CNAME', 'MX', 'NS', 'PTR', 'SRV')
+PRIORITY_TYPES = ('MX', 'SRV')
+
+
+def normalize_name(name):
+    name = (name or '').strip().rstrip('.').lower()
+    if name == '@':
+        return ''
+    return name
+
+
+def normalize_data(record_type, data):
+    data = (data or '').strip()
+    if record_type in HOSTNAME_TYPES:
+        return data.rstrip('.').lower()
+    if record_type == 'TXT' and len(data) >= 2 and data[0] == '"' and data[-1] == '"':
+        return data[1:-1]
+    return data
+
+
+def rrset_key(record):
+    """Hashable identity of the rrset of a record: its name and type."""
+    return (normalize_name(record['name']), record['type'])
+
+
+def record_key(record):
+    """Hashable identity of a record: its name, type and data."""
+    return (normalize_name(record['name']), record['type'], normalize_data(record['type'], record['data']))
+
+
+def index_records(records):
+    return dict((record_key(record), record) for record in records)
+
+
+def same_record(current, desired):
+    """Whether an existing record already has the attributes of the desired one."""
+    if current.get('ttl') != desired['ttl']:
+        return False
+    if desired['type'] in PRIORITY_TYPES and current.get('priority') != desired['priority']:
+        return False
+    if desired.get('comment') is not None and current.get('comment') != desired['comment']:
+        return False
+    return True
+
+
+def get_dns_zone(api, dns_zone):
+    """The dns zone as returned by the dns zones listing, or None if it does not exist."""
+    for zone in api.paginate("/dns-zones", 'dns_zones', params={"dns_zone": dns_zone}):
+        name = zone.get('subdomain') and "{}.{}" . format(zone['subdomain'], zone['domain']) or zone.get('domain')
+        if name == dns_zone:
+            return zone
+    return None
+
+
+def zone_serial(zone):
+    """Serial of a dns zone of the listing, its updated_at when the api gives no serial."""
+    if zone is None:
+        return None
+    return zone.get('serial') or zone.get('updated_at')
+
+
+def list_zone_records(api, dns_zone, name=None, record_type=None):
+    """Records of a dns zone, filtered on their name and type by the api."""
+    params = {}
+    if name is not None:
+        params['name'] = name
+    if record_type is not None:
+        params['type'] = record_type
+
+    records = []
+    for record in api.paginate("/dns-zones/{}/records" . format(dns_zone), 'records', params=params):
+        if name is not None and normalize_name(record['name']) != normalize_name(name):
+            continue
+        if record_type is not None and record['type'] != record_type:
+            continue
+        records.append(record)
+    return records
+
+
+class ZoneRecords(object):
+    """Records of a dns zone indexed by rrset, on which changes can be simulated."""
+
+    def __init__(self, records=()):
+        self.rrsets = {}
+        for record in records:
+            self.rrsets.setdefault(rrset_key(record), []).append(record)
+
+    def get(self, name, record_type):
+        return self.rrsets.get((normalize_name(name), record_type), [])
+
+    def records(self, keys=None):
+        if keys is None:
+            keys = self.rrsets.keys()
+        records = []
+        for key in sorted(keys):
+            records.extend(self.rrsets.get(key, []))
+        return records
+
+    def copy(self):
+        copy = ZoneRecords()
+        copy.rrsets = dict((key, list(records)) for key, records in self.rrsets.items())
+        return copy
+
+    def apply(self, changes):
+        """Apply a changes array the way the api does, return the rrset keys touched."""
+        touched = set()
+        for change in changes:
+            if "clear" in change:
+                touched.update(self.rrsets.keys())
+                self.rrsets = {}
+            elif "add" in change:
+                for record in change["add"]["records"]:
+                    key = rrset_key(record)
+                    rrset = self.rrsets.setdefault(key, [])
+                    if not any(record_key(existing) == record_key(record) for existing in rrset):
+                        rrset.append(record)
+                    touched.add(key)
+            elif "set" in change:
+                key = rrset_key(change["set"])
+                self.rrsets[key] = list(change["set"]["records"])
+                touched.add(key)
+            elif "delete" in change:
+                key = rrset_key(change["delete"])
+                if change["delete"].get("data") is None:
+                    self.rrsets.pop(key, None)
+                else:
+                    deleted = record_key(change["delete"])
+                    self.rrsets[key] = [record for record in self.rrsets.get(key, []) if record_key(record) != deleted]
+                touched.add(key)
+        for key in touched:
+            if not self.rrsets.get(key):
+                self.rrsets.pop(key, None)
+        return touched
+
+
+def format_records(records):
+    """Records as sorted zone file like lines, used for the diff output."""
+    lines = []
+    for record in records:
+        line = "{} {} {}" . format(record['name'] or '@', record['ttl'], record['type'])
+        if record['type'] in PRIORITY_TYPES and record.get('priority') is not None:
+            line += " {}" . format(record['priority'])
+        lines.append("{} {}\n" . format(line, record['data']))
+    return ''.join(sorted(lines))
+
+
+def records_diff(before, after, keys, dns_zone):
+    """Ansible diff between two ZoneRecords, limited to the rrsets keys."""
+    return {
+        "before": format_records(before.records(keys)),
+        "after": format_records(after.records(keys)),
+        "before_header": "{} (current)" . format(dns_zone),
+        "after_header": "{} (requested)" . format(dns_zone),
+    }
+
+
+def plan_rrset_changes(current, desired):
+    """Changes array replacing the records of an rrset by the desired ones, if they differ."""
+    if len(current) == len(desired):
+        index = index_records(current)
+        if all(record_key(record) in index and same_record(index[record_key(record)], record) for record in desired):
+            return []
+    return [{"set": {"name": desired[0]['name'], "type": desired[0]['type'], "records": list(desired)}}]
+
+
+def plan_record_changes(current, desired, state, unique):
+    """Minimal changes array bringing the records of a name and type to the desired state.
+
+    current are the existing records with the name and type of desired. For
+    state=absent, an empty desired data deletes all of them. An empty list
+    means the records are already in the desired state.
+    """
+    index = index_records(current)
+    existing = index.get(record_key(desired))
+
+    if state == 'absent':
+        if desired['data'] == '':
+            if not current:
+                return []
+            return [{"delete": {"name": desired['name'], "type": desired['type']}}]
+        if existing is None:
+            return []
+        return [{"delete": {"name": desired['name'], "type": desired['type'], "data": existing['data']}}]
+
+    if unique:
+        return plan_rrset_changes(current, [desired])
+
+    if existing is None:
+        return [{"add": {"records": [desired]}}]
+    if same_record(existing, desired):
+        return []
+    return [
+        {"delete": {"name": desired['name'], "type": desired['type'], "data": existing['data']}},
+        {"add": {"records": [desired]}},
+    ]
+
+
+def keep_zone_ns(key):
+    # the NS of the dns zone itself are managed by Scaleway
+    return key == ('', 'NS')
+
+
+def plan_zone_sync(current, desired, keep=None):
+    """Minimal changes array replacing the records of a zone by the desired ones.
+
+    current is the ZoneRecords of the zone and desired its whole list of
+    records. The rrsets are compared by name and type: an rrset which is not
+    desired is deleted, a new one is added, and a changed one is either set or
+    patched by deletes and an add, whichever carries less records. The
+    deletes come first, then the sets and the adds, so a CNAME is never next
+    to the other records of its name. The rrsets not desired for which
+    keep(key) is true are left alone.
+    """
+    wanted = ZoneRecords()
+    for record in desired:
+        rrset = wanted.rrsets.setdefault(rrset_key(record), [])
+        if not any(record_key(existing) == record_key(record) for existing in rrset):
+            rrset.append(record)
+
+    deletes = []
+    sets = []
+    adds = []
+    for key in sorted(set(current.rrsets) | set(wanted.rrsets)):
+        existing = current.rrsets.get(key, [])
+        records = wanted.rrsets.get(key, [])
+        if not records:
+            if keep is None or not keep(key):
+                deletes.append({"delete": {"name": existing[0]['name'], "type": existing[0]['type']}})
+            continue
+
+        index = index_records(existing)
+        added = [record for record in records
+                 if record_key(record) not in index or not same_record(index[record_key(record)], record)]
+        kept = set(record_key(record) for record in records) - set(record_key(record) for record in added)
+        removed = [record for record in existing if record_key(record) not in kept]
+        if not removed:
+            adds.extend(added)
+        elif len(removed) + len(added) < len(records):
+            for record in removed:
+                deletes.append({"delete": {"name": record['name'], "type": record['type'], "data": record['data']}})
+            adds.extend(added)
+        else:
+            sets.append({"set": {"name": records[0]['name'], "type": records[0]['type'], "records": records}})
+
+    changes = deletes + sets
+    if adds:
+        changes.append({"add": {"records": adds}})
+    return changes
+
+
+def plan_zone_import(current, desired, keep=None):
+    """Changes array replacing the records of a zone by the ones of a zone file, safe to send by chunks.
+
+    Unlike plan_zone_sync, which deletes first, the rrsets missing from the
+    zone file are deleted by the last changes, so the zone keeps serving its
+    records until the new ones are all sent. Only the deletes a CNAME needs
+    come first: the rrsets of a name which gets a CNAME, and the CNAME of a
+    name which gets other records. A changed rrset is set at once, a new one
+    added. The rrsets not desired for which keep(key) is true are left alone.
+    """
+    wanted = ZoneRecords()
+    for record in desired:
+        rrset = wanted.rrsets.setdefault(rrset_key(record), [])
+        if not any(record_key(existing) == record_key(record) for existing in rrset):
+            rrset.append(record)
+    cname_names = set(name for name, record_type in wanted.rrsets if record_type == 'CNAME')
+    other_names = set(name for name, record_type in wanted.rrsets if record_type != 'CNAME')
+
+    first = []
+    sets = []
+    adds = []
+    last = []
+    for key in sorted(set(current.rrsets) | set(wanted.rrsets)):
+        existing = current.rrsets.get(key, [])
+        records = wanted.rrsets.get(key, [])
+        if not records:
+            if keep is not None and keep(key):
+                continue
+            name, record_type = key
+            delete = {"delete": {"name": existing[0]['name'], "type": existing[0]['type']}}
+            if name in cname_names or (record_type == 'CNAME' and name in other_names):
+                first.append(delete)
+            else:
+                last.append(delete)
+        elif existing:
+            sets.extend(plan_rrset_changes(existing, records))
+        else:
+            adds.extend(records)
+
+    changes = first + sets
+    if adds:
+        changes.append({"add": {"records": adds}})
+    return changes + last
+
+
+def cname_conflicts(records):
+    """Names of the records which have a CNAME next to other types."""
+    types = {}
+    for record in records:
+        types.setdefault(normalize_name(record['name']), set()).add(record['type'])
+    return sorted(name for name, name_types in types.items() if 'CNAME' in name_types and len(name_types) > 1)
+
+
+def split_changes(changes, chunk_size):
+    """Split a changes array in chunks carrying at most chunk_size records.
+
+    changes holds (change, indexes) pairs, indexes being the records of the
+    module carried by the change. Adds bigger than a chunk are split in
+    several adds, a set can not be split without losing records so it always
+    stays in one chunk.
+    """
+    chunks = []
+    chunk = []
+    size = 0
+    for change, indexes in changes:
+        if "add" in change:
+            records = change["add"]["records"]
+            for start in range(0, len(records), chunk_size):
+                part = records[start:start + chunk_size]
+                if chunk and size + len(part) > chunk_size:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+                chunk.append(({"add": {"records": part}}, indexes[start:start + chunk_size]))
+                size += len(part)
+            continue
+
+        weight = len(change["set"]["records"]) if "set" in change else 1
+        if chunk and size + weight > chunk_size:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append((change, indexes))
+        size += weight
+    if chunk:
+        chunks.append(chunk)
+    return chunks
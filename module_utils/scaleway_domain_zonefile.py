@@ -0,0 +1,261 @@
+# encoding: utf-8
+
+# Streaming parser of BIND zone files, turning them into records of the api.
+#
+# The file is read line by line and the records are yielded as they are
+# parsed, so a zone of any size is imported in bounded memory. Each record is
+# validated (ttl, address, hostname, priority...) and the errors point to the
+# line of the file. The SOA and the NS records of the zone itself are managed
+# by Scaleway, they are skipped.
+
+import re
+import socket
+
+RECORD_TYPES = ('A', 'AAAA', 'MX', 'CNAME', 'TXT', 'SRV', 'TLSA', 'NS', 'PTR', 'CAA')
+CLASSES = ('IN', 'CH', 'HS')
+TTL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+TTL_RE = re.compile(r'^(\d+[smhdw]?)+$', re.IGNORECASE)
+HOSTNAME_RE = re.compile(r'^(\*\.)?([a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.)*[a-z0-9_]([a-z0-9_-]{0,61}[a-z0-9_])?\.?$', re.IGNORECASE)
+IPV4_RE = re.compile(r'^\d{1,3}(\.\d{1,3}){3}$')
+MAX_TTL = 2147483647
+SPECIAL_CHARS_RE = re.compile(r'[";()\\]')
+
+
+class ZoneFileError(Exception):
+
+    def __init__(self, line, msg):
+        super(ZoneFileError, self).__init__("line {}: {}" . format(line, msg))
+        self.line = line
+        self.msg = msg
+
+
+def tokenize(line):
+    """Tokens of a line without its comment, quoted strings keep their quotes."""
+    if not SPECIAL_CHARS_RE.search(line):
+        return line.split()
+    tokens = []
+    position = 0
+    length = len(line)
+    while position < length:
+        char = line[position]
+        if char in ' \t\r\n':
+            position += 1
+        elif char == ';':
+            break
+        elif char in '()':
+            tokens.append(char)
+            position += 1
+        elif char == '"':
+            end = position + 1
+            while end < length and line[end] != '"':
+                end += 2 if line[end] == '\\' else 1
+            if end >= length:
+                raise ValueError('unterminated quoted string')
+            tokens.append(line[position:end + 1])
+            position = end + 1
+        else:
+            end = position
+            while end < length and line[end] not in ' \t\r\n;()"':
+                end += 2 if line[end] == '\\' else 1
+            tokens.append(line[position:end])
+            position = end
+    return tokens
+
+
+def entries(lines):
+    """Yield the entries of a zone file: first line number, whether the owner is blank, and tokens.
+
+    An entry spans several lines inside parentheses.
+    """
+    tokens = None
+    depth = 0
+    start = blank = None
+    for number, line in enumerate(lines, 1):
+        try:
+            line_tokens = tokenize(line)
+        except ValueError as e:
+            raise ZoneFileError(number, str(e))
+        if tokens is None:
+            if not line_tokens:
+                continue
+            tokens, start, blank = [], number, line[:1] in (' ', '\t')
+        for token in line_tokens:
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth < 0:
+                    raise ZoneFileError(number, 'unbalanced parenthesis')
+            else:
+                tokens.append(token)
+        if depth == 0:
+            if tokens:
+                yield start, blank, tokens
+            tokens = None
+    if tokens is not None:
+        raise ZoneFileError(start, 'unbalanced parenthesis')
+
+
+def parse_ttl(value):
+    if value.isdigit() and int(value) <= MAX_TTL:
+        return int(value)
+    if not TTL_RE.match(value):
+        raise ValueError('invalid ttl {}' . format(value))
+    ttl = 0
+    for number, unit in re.findall(r'(\d+)([smhdw]?)', value, re.IGNORECASE):
+        ttl += int(number) * TTL_UNITS[unit.lower() or 's']
+    if ttl > MAX_TTL:
+        raise ValueError('ttl {} is too large' . format(value))
+    return ttl
+
+
+def parse_int(value, name, maximum=65535):
+    if not value.isdigit() or int(value) > maximum:
+        raise ValueError('invalid {} {}' . format(name, value))
+    return int(value)
+
+
+class ZoneFileParser(object):
+    """Parser of the zone file of a dns zone, keeping the $ORIGIN, $TTL and owner between entries."""
+
+    def __init__(self, dns_zone, default_ttl):
+        self.dns_zone = dns_zone.rstrip('.').lower()
+        self.origin = self.dns_zone
+        self.default_ttl = default_ttl
+        self.ttl = None
+        self.last_ttl = None
+        self.owner = None
+        self.skipped = 0
+
+    def absolute(self, name):
+        """Fully qualified name, without the trailing dot."""
+        if name == '@':
+            return self.origin
+        if name.endswith('.'):
+            return name[:-1]
+        return "{}.{}" . format(name, self.origin)
+
+    def hostname(self, value):
+        if not HOSTNAME_RE.match(value) and value != '@':
+            raise ValueError('invalid hostname {}' . format(value))
+        return self.absolute(value) + '.'
+
+    def relative(self, fqdn):
+        """Name of the record in the dns zone."""
+        name = fqdn.lower()
+        if name == self.dns_zone:
+            return ''
+        if not name.endswith('.' + self.dns_zone):
+            raise ValueError('{} is out of the dns zone {}' . format(fqdn, self.dns_zone))
+        return fqdn[:len(fqdn) - len(self.dns_zone) - 1]
+
+    def rdata(self, record_type, tokens):
+        """Priority and data of a record, as the api expects them."""
+        def expect(count, at_least=False):
+            if len(tokens) < count or (not at_least and len(tokens) > count):
+                raise ValueError('{} expects {}{} values' . format(record_type, at_least and 'at least ' or '', count))
+
+        if record_type == 'A':
+            expect(1)
+            if not IPV4_RE.match(tokens[0]) or any(int(part) > 255 for part in tokens[0].split('.')):
+                raise ValueError('invalid ipv4 address {}' . format(tokens[0]))
+            return 0, tokens[0]
+        if record_type == 'AAAA':
+            expect(1)
+            try:
+                socket.inet_pton(socket.AF_INET6, tokens[0])
+            except (socket.error, ValueError):
+                raise ValueError('invalid ipv6 address {}' . format(tokens[0]))
+            return 0, tokens[0]
+        if record_type in ('CNAME', 'NS', 'PTR'):
+            expect(1)
+            return 0, self.hostname(tokens[0])
+        if record_type == 'MX':
+            expect(2)
+            return parse_int(tokens[0], 'priority'), self.hostname(tokens[1])
+        if record_type == 'SRV':
+            expect(4)
+            priority = parse_int(tokens[0], 'priority')
+            weight = parse_int(tokens[1], 'weight')
+            port = parse_int(tokens[2], 'port')
+            return priority, "{} {} {}" . format(weight, port, self.hostname(tokens[3]))
+        if record_type == 'TXT':
+            expect(1, at_least=True)
+            return 0, ' '.join(tokens)
+        if record_type == 'CAA':
+            expect(3)
+            parse_int(tokens[0], 'flags', 255)
+            return 0, ' '.join(tokens)
+        if record_type == 'TLSA':
+            expect(4, at_least=True)
+            for value, name in zip(tokens[:3], ('usage', 'selector', 'matching type')):
+                parse_int(value, name, 255)
+            if not re.match(r'^[0-9a-f]+$', ''.join(tokens[3:]), re.IGNORECASE):
+                raise ValueError('invalid TLSA certificate data')
+            return 0, "{} {} {} {}" . format(tokens[0], tokens[1], tokens[2], ''.join(tokens[3:]))
+        raise ValueError('unsupported record type {}' . format(record_type))
+
+    def directive(self, tokens):
+        if tokens[0].upper() == '$ORIGIN' and len(tokens) == 2:
+            self.origin = self.absolute(tokens[1]).lower()
+        elif tokens[0].upper() == '$TTL' and len(tokens) == 2:
+            self.ttl = parse_ttl(tokens[1])
+        else:
+            raise ValueError('unsupported directive {}' . format(' '.join(tokens)))
+
+    def record(self, blank, tokens):
+        """The record of an entry, or None for the entries which are skipped."""
+        if tokens[0].startswith('$'):
+            self.directive(tokens)
+            return None
+
+        if not blank:
+            self.owner = self.absolute(tokens.pop(0))
+        elif self.owner is None:
+            raise ValueError('no owner name')
+
+        ttl = None
+        while tokens and (TTL_RE.match(tokens[0]) or tokens[0].upper() in CLASSES):
+            token = tokens.pop(0)
+            if token.upper() in CLASSES:
+                if token.upper() != 'IN':
+                    raise ValueError('unsupported class {}' . format(token))
+            else:
+                ttl = parse_ttl(token)
+        if not tokens:
+            raise ValueError('missing record type')
+
+        record_type = tokens.pop(0).upper()
+        name = self.relative(self.owner)
+        if record_type == 'SOA' or (record_type == 'NS' and name == ''):
+            self.skipped += 1
+            return None
+        if record_type not in RECORD_TYPES:
+            raise ValueError('unsupported record type {}' . format(record_type))
+
+        if ttl is not None:
+            self.last_ttl = ttl
+        elif self.ttl is not None:
+            ttl = self.ttl
+        else:
+            ttl = self.last_ttl if self.last_ttl is not None else self.default_ttl
+
+        priority, data = self.rdata(record_type, tokens)
+        return {"name": name, "type": record_type, "ttl": ttl, "priority": priority, "data": data, "comment": None}
+
+    def records(self, lines, errors=None):
+        """Yield the line and record of every record of the zone file.
+
+        An invalid entry raises ZoneFileError, or is appended to errors and
+        skipped when errors is a list.
+        """
+        for line, blank, tokens in entries(lines):
+            try:
+                record = self.record(blank, tokens)
+            except ValueError as e:
+                if errors is None:
+                    raise ZoneFileError(line, str(e))
+                errors.append(ZoneFileError(line, str(e)))
+                continue
+            if record is not None:
+                yield line, record
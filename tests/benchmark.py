@@ -0,0 +1,282 @@
+# encoding: utf-8
+
+# Benchmark of the modules against the fake api, seeded with large zones and
+# many domains, contacts and dns zones.
+#
+#   python tests/benchmark.py --output benchmark.json
+#   python tests/benchmark.py --sizes 1000 --compare benchmark.json
+#
+# Each case runs the module in a fresh python process (so the peak RSS is the
+# one of the module) against a fake api served by this process, which counts
+# the requests and the bytes of their bodies. The results are written as json
+# with the commit they were measured on, to be compared across commits.
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from runner import ROOT, run_module
+
+from fake_scaleway import TOKEN, FakeScaleway, bind_line
+
+from ansible.module_utils.scaleway_domain_ratelimit import DEFAULT_RATE_LIMIT
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_LIST_SIZE = 5000
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_OUTPUT = 'benchmark.json'
+
+METRICS = ('wall_time', 'requests', 'request_bytes', 'response_bytes', 'peak_rss_kb', 'result_bytes')
+
+
+def zone_name(size):
+    return "bench{}.example.com" . format(size)
+
+
+def zone_records(size, prefix='host'):
+    return [{
+        "name": "{}{:06d}" . format(prefix, i),
+        "type": "A",
+        "ttl": 3600,
+        "priority": 0,
+        "data": "10.{}.{}.{}" . format((i >> 16) & 255, (i >> 8) & 255, i & 255),
+        "comment": None,
+    } for i in range(size)]
+
+
+def cases(sizes, list_size, batch_size):
+    """Cases of the benchmark: the module, its args and the state to seed the api with."""
+    for size in sizes:
+        seed = {"zone_size": size}
+        zone = zone_name(size)
+        yield dict(name='list_records', size=size, seed=seed, module='domain_scaleway_dns_zone',
+                   args=dict(action='list_records', dns_zone=zone))
+        yield dict(name='export_raw', size=size, seed=seed, module='domain_scaleway_dns_zone',
+                   args=dict(action='export_raw', dns_zone=zone))
+        yield dict(name='export_dest', size=size, seed=seed, module='domain_scaleway_dns_zone',
+                   args=dict(action='export_raw', dns_zone=zone), export_dest=True)
+        yield dict(name='import_raw', size=size, seed=seed, module='domain_scaleway_dns_zone',
+                   args=dict(action='import_raw', dns_zone=zone), import_size=size)
+        yield dict(name='import_src', size=size, seed=seed, module='domain_scaleway_dns_zone',
+                   args=dict(action='import_raw', dns_zone=zone, import_mode='records'), import_size=size, import_src=True)
+        yield dict(name='record_upsert', size=size, seed=seed, module='domain_scaleway_record',
+                   args=dict(dns_zone=zone, name='host000000', type='A', content='10.255.255.255', ttl=3600))
+        # half of the batch already exists, the other half is new
+        batch = min(batch_size, size)
+        records = [dict(name=record['name'], type='A', content=record['data'], ttl=3600)
+                   for record in zone_records(batch // 2) + zone_records(batch - batch // 2, prefix='new')]
+        yield dict(name='records_upsert', size=size, seed=seed, module='domain_scaleway_records',
+                   args=dict(dns_zone=zone, records=records))
+
+        # the whole zone is requested, with 5 records changed
+        records = [dict(name=record['name'], type='A', content=record['data'], ttl=3600) for record in zone_records(size)]
+        for record in records[:5]:
+            record['ttl'] = 60
+        yield dict(name='zone_sync', size=size, seed=seed, module='domain_scaleway_zone_sync',
+                   args=dict(dns_zone=zone, records=records))
+
+    yield dict(name='domain_list', size=list_size, seed={"domains": list_size}, module='domain_scaleway_domain_list',
+               args=dict(action='list_domains'))
+    yield dict(name='domain_audit', size=list_size, seed={"domains": list_size}, module='domain_scaleway_domain_list',
+               args=dict(action='list_domains', details=True, max_concurrency=16,
+                         fields=['domain', 'expired_at', 'owner_contact']))
+    yield dict(name='domains_lock', size=list_size, seed={"domains": list_size}, module='domain_scaleway_domain',
+               args=dict(action='lock_domain_transfer', domains=["domain{:06d}.com" . format(i) for i in range(list_size)],
+                         max_concurrency=16))
+    yield dict(name='dns_zone_list', size=list_size, seed={"dns_zones": list_size}, module='domain_scaleway_dns_zone_list',
+               args=dict(action='list_dns_zones'))
+    yield dict(name='zones_refresh', size=list_size, seed={"dns_zones": list_size}, module='domain_scaleway_dns_zone',
+               args=dict(action='refresh', dns_zones=["zone{:06d}.com" . format(i) for i in range(list_size)], max_concurrency=8))
+    yield dict(name='contact_list', size=list_size, seed={"contacts": list_size}, module='domain_scaleway_contact_list',
+               args=dict(action='list_contacts'))
+
+
+def seed_api(api, seed):
+    if 'zone_size' in seed:
+        api.add_dns_zone(zone_name(seed['zone_size']), records=zone_records(seed['zone_size']))
+    for i in range(seed.get('domains', 0)):
+        api.add_domain("domain{:06d}.com" . format(i))
+    for i in range(seed.get('dns_zones', 0)):
+        api.add_dns_zone("zone{:06d}.com" . format(i))
+    for i in range(seed.get('contacts', 0)):
+        api.add_contact(email="contact{:06d}@example.com" . format(i))
+
+
+def peak_rss_kb():
+    # ru_maxrss of linux keeps the peak of the parent across fork and exec,
+    # the high water mark of the process memory starts again at exec
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def worker(case, endpoint):
+    """Run the case in this process and print its metrics."""
+    if case.get('transport') == 'http':
+        from ansible.module_utils import scaleway_domain_http
+        scaleway_domain_http.HAS_REQUESTS = False
+    args = dict(case['args'], token=TOKEN, endpoint=endpoint)
+    if case.get('rate_limit') is not None:
+        args['rate_limit'] = case['rate_limit']
+    path = None
+    if case.get('import_size'):
+        content = ''.join(bind_line(record) for record in zone_records(case['import_size'], prefix='imported'))
+        if case.get('import_src'):
+            fd, path = tempfile.mkstemp(suffix='.zone')
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            args['src'] = path
+        else:
+            args['import_content'] = content
+        del content
+
+    if case.get('export_dest'):
+        fd, path = tempfile.mkstemp(suffix='.zone')
+        os.close(fd)
+        args['dest'] = path
+
+    baseline = peak_rss_kb()
+    start = time.time()
+    try:
+        result, result_bytes = run_module(case['module'], args)
+    finally:
+        if path is not None:
+            os.remove(path)
+    wall_time = time.time() - start
+    print(json.dumps({
+        "wall_time": wall_time,
+        "failed": bool(result.get('failed')),
+        "msg": result.get('msg'),
+        "result_bytes": result_bytes,
+        "baseline_rss_kb": baseline,
+        "peak_rss_kb": peak_rss_kb(),
+    }))
+
+
+def run_case(case, latency):
+    api = FakeScaleway()
+    seed_api(api, case['seed'])
+    api.latency = latency
+    api.start()
+    state_dir = tempfile.mkdtemp()
+    try:
+        # the case goes through stdin, its records may not fit in an argument
+        # a fresh rate limiter state for each case
+        env = dict(os.environ, SCALEWAY_DOMAIN_RATE_LIMIT_DIR=state_dir)
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', api.url],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        output = process.communicate(json.dumps(case).encode('utf-8'))[0]
+    finally:
+        api.stop()
+        shutil.rmtree(state_dir)
+    if process.returncode != 0:
+        raise RuntimeError('{} failed' . format(case['name']))
+
+    measure = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+    measure.update(
+        requests=len(api.log),
+        request_bytes=sum(entry['request_bytes'] for entry in api.log),
+        response_bytes=sum(entry['response_bytes'] for entry in api.log),
+    )
+    return measure
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, results_rate_limit):
+    """Print the ratio of each metric to a previous run of the same case."""
+    before = dict(((result['name'], result['size']), result) for result in previous['results'])
+    print("\ncompared to {}" . format(previous.get('commit')))
+    if previous.get('rate_limit') != results_rate_limit:
+        print("rate_limit {} against {}: the wall times are not comparable" . format(results_rate_limit, previous.get('rate_limit')))
+    for result in results:
+        old = before.get((result['name'], result['size']))
+        if old is None:
+            continue
+        ratios = []
+        for metric in METRICS:
+            if old.get(metric):
+                ratios.append("{} x{:.2f}" . format(metric, float(result[metric]) / old[metric]))
+        print("{:<16} {:>7}  {}" . format(result['name'], result['size'], '  '.join(ratios)))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--worker':
+        worker(json.load(sys.stdin), sys.argv[2])
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmark of the modules against the fake Scaleway Domain API')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='records of the zones, comma separated')
+    parser.add_argument('--list-size', type=int, default=DEFAULT_LIST_SIZE,
+                        help='domains, dns zones and contacts of the list cases')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='records of the records_upsert case')
+    parser.add_argument('--cases', help='only run these cases, comma separated')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every api request')
+    parser.add_argument('--transport', choices=['requests', 'http'],
+                        help='transport of the modules, requests when it is installed by default')
+    parser.add_argument('--rate-limit', type=float,
+                        help='rate_limit of the modules, {} requests per second (their default) by default' . format(DEFAULT_RATE_LIMIT))
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each case, the median wall time is kept')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='json file of the results')
+    parser.add_argument('--compare', help='json file of a previous run to compare with')
+    options = parser.parse_args()
+
+    previous = None
+    if options.compare:
+        with open(options.compare) as f:
+            previous = json.load(f)
+
+    selected = options.cases and options.cases.split(',')
+    sizes = [int(size) for size in options.sizes.split(',') if size]
+    results = []
+    print("{:<16} {:>7} {:>9} {:>8} {:>12} {:>12} {:>10} {:>12}" . format(
+        'case', 'size', 'wall (s)', 'requests', 'sent', 'received', 'rss (kB)', 'result'))
+    for case in cases(sizes, options.list_size, options.batch_size):
+        if selected and case['name'] not in selected:
+            continue
+        case['transport'] = options.transport
+        case['rate_limit'] = options.rate_limit
+        runs = sorted((run_case(case, options.latency) for dummy in range(options.repeat)), key=lambda run: run['wall_time'])
+        result = dict(runs[len(runs) // 2], name=case['name'], size=case['size'], module=case['module'])
+        results.append(result)
+        print("{name:<16} {size:>7} {wall_time:>9.3f} {requests:>8} {request_bytes:>12} {response_bytes:>12} "
+              "{peak_rss_kb:>10} {result_bytes:>12}{failed}" . format(**dict(result, failed=result['failed'] and '  FAILED' or '')))
+
+    rate_limit = DEFAULT_RATE_LIMIT if options.rate_limit is None else options.rate_limit
+    with open(options.output, 'w') as f:
+        json.dump({
+            "commit": git_commit(),
+            "date": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "python": platform.python_version(),
+            "latency": options.latency,
+            "transport": options.transport,
+            "rate_limit": rate_limit,
+            "results": results,
+        }, f, indent=2, sort_keys=True)
+
+    if previous is not None:
+        compare(results, previous, rate_limit)
+
+
+if __name__ == '__main__':
+    main()
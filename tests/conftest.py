@@ -0,0 +1,63 @@
+# encoding: utf-8
+
+# The modules are run in the pytest process, against the fake api.
+
+import pytest
+
+from runner import run_module
+
+from ansible.module_utils import scaleway_domain, scaleway_domain_http
+
+from fake_dns import FakeDNS
+from fake_scaleway import TOKEN, FakeScaleway
+
+
+class ModuleRunner(object):
+
+    def __init__(self, api):
+        self.api = api
+
+    def __call__(self, module_name, check_mode=False, diff=False, **args):
+        """Run the module with args, return its result."""
+        args.setdefault('token', TOKEN)
+        args.setdefault('endpoint', self.api.url)
+        return run_module(module_name, args, check_mode=check_mode, diff=diff)[0]
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(scaleway_domain, 'BACKOFF_BASE', 0.001)
+    monkeypatch.setattr(scaleway_domain, 'WAIT_DELAY', 0.001)
+
+
+@pytest.fixture(autouse=True)
+def rate_limit_dir(monkeypatch, tmp_path):
+    # each test has its own rate limiter state
+    path = tmp_path / 'rate_limit'
+    monkeypatch.setenv('SCALEWAY_DOMAIN_RATE_LIMIT_DIR', str(path))
+    return path
+
+
+@pytest.fixture(params=['requests', 'http'])
+def api(request, monkeypatch):
+    # the modules run on both transports: requests when it is installed, the
+    # standard library otherwise
+    if request.param == 'http':
+        monkeypatch.setattr(scaleway_domain_http, 'HAS_REQUESTS', False)
+    elif not scaleway_domain_http.HAS_REQUESTS:
+        pytest.skip('requests is not installed')
+    fake = FakeScaleway().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def dns(api):
+    server = FakeDNS(api).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(name='run_module')
+def run_module_fixture(api):
+    return ModuleRunner(api)
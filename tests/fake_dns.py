@@ -0,0 +1,134 @@
+# encoding: utf-8
+
+# Authoritative nameserver stand-in answering over udp and tcp on localhost
+# with the records of a FakeScaleway api, so domain_scaleway_wait_record sees
+# the changes made by the other modules.
+
+import socket
+import struct
+import threading
+
+from ansible.module_utils.scaleway_domain_dns import QTYPE_NAMES, encode_name, read_name
+
+FLAG_RESPONSE = 0x8400
+FLAG_TC = 0x0200
+RCODE_NXDOMAIN = 3
+RCODE_REFUSED = 5
+
+
+def encode_rdata(record):
+    record_type, data = record['type'], record['data']
+    if record_type == 'A':
+        return socket.inet_aton(data)
+    if record_type == 'AAAA':
+        return socket.inet_pton(socket.AF_INET6, data)
+    if record_type in ('NS', 'CNAME', 'PTR'):
+        return bytes(encode_name(data))
+    if record_type == 'MX':
+        return struct.pack('!H', record.get('priority') or 0) + bytes(encode_name(data))
+    if record_type == 'TXT':
+        text = data.strip('"').encode('utf-8')
+        return b''.join(struct.pack('!B', len(text[i:i + 255])) + text[i:i + 255] for i in range(0, max(len(text), 1), 255))
+    raise ValueError('type {} is not served' . format(record_type))
+
+
+class FakeDNS(object):
+
+    def __init__(self, api):
+        self.api = api
+        self.queries = []
+        # answer truncated over udp, to force the tcp fallback
+        self.truncate_udp = False
+        # rcode of every answer, as a nameserver which has not loaded the zone
+        self.rcode = None
+        # bytes cut from the end of the answers, as a broken nameserver
+        self.cut_answers = 0
+
+    def lookup(self, fqdn, record_type):
+        fqdn = fqdn.rstrip('.').lower()
+        with self.api.lock:
+            for zone in sorted(self.api.dns_zones, key=len, reverse=True):
+                if fqdn == zone or fqdn.endswith('.' + zone):
+                    name = fqdn[:-len(zone)].rstrip('.')
+                    return [dict(record) for record in self.api.zone_records(zone, name, record_type)]
+        return None
+
+    def answer(self, packet, udp=False):
+        packet = bytearray(packet)
+        query_id = struct.unpack('!H', bytes(packet[:2]))[0]
+        name, offset = read_name(packet, 12)
+        qtype = struct.unpack('!H', bytes(packet[offset:offset + 2]))[0]
+        question = bytes(packet[12:offset + 4])
+        self.queries.append((name, QTYPE_NAMES.get(qtype), 'udp' if udp else 'tcp'))
+
+        records = self.lookup(name, QTYPE_NAMES.get(qtype))
+        flags = FLAG_RESPONSE
+        if records is None:
+            flags |= RCODE_NXDOMAIN
+            records = []
+        if self.rcode is not None:
+            flags = FLAG_RESPONSE | self.rcode
+            records = []
+        if udp and self.truncate_udp:
+            return struct.pack('!HHHHHH', query_id, flags | FLAG_TC, 1, 0, 0, 0) + question
+
+        answers = b''
+        for record in records:
+            rdata = encode_rdata(record)
+            # the name is a pointer to the question
+            answers += b'\xc0\x0c' + struct.pack('!HHIH', qtype, 1, record['ttl'], len(rdata)) + rdata
+        response = struct.pack('!HHHHHH', query_id, flags, 1, len(records), 0, 0) + question + answers
+        return response[:len(response) - self.cut_answers]
+
+    def bind(self):
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.bind(('127.0.0.1', 0))
+        self.port = self.udp.getsockname()[1]
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.tcp.bind(('127.0.0.1', self.port))
+        except socket.error:
+            self.stop()
+            return False
+        return True
+
+    def start(self):
+        # the free udp port may be the port of a tcp connection, then another one is tried
+        while not self.bind():
+            pass
+        self.tcp.listen(16)
+
+        for target in (self.serve_udp, self.serve_tcp):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def serve_udp(self):
+        while True:
+            try:
+                packet, address = self.udp.recvfrom(4096)
+            except socket.error:
+                return
+            self.udp.sendto(self.answer(packet, udp=True), address)
+
+    def serve_tcp(self):
+        while True:
+            try:
+                connection = self.tcp.accept()[0]
+            except socket.error:
+                return
+            try:
+                length = struct.unpack('!H', connection.recv(2))[0]
+                packet = b''
+                while len(packet) < length:
+                    packet += connection.recv(length - len(packet))
+                response = self.answer(packet)
+                connection.sendall(struct.pack('!H', len(response)) + response)
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.udp.close()
+        self.tcp.close()
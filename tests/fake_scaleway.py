@@ -0,0 +1,554 @@
+# encoding: utf-8
+
+# In memory stand-in of the Scaleway Domain API, served over http on
+# localhost, so the modules can be run without network access nor token.
+#
+# It implements the endpoints used by the modules: dns zones, records (with
+# the add/set/delete/clear semantics of PATCH), raw import/export, refresh,
+# domains and contacts. Every request is logged, and latency or error
+# responses (429, 5xx) can be injected to exercise the retries.
+
+import base64
+import copy
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlsplit
+
+TOKEN = 'fake-token'
+DEFAULT_TTL = 86400
+DEFAULT_NS = ['ns0.dom.scw.cloud', 'ns1.dom.scw.cloud']
+# responses bigger than this are compressed when the client accepts gzip
+GZIP_MIN_SIZE = 1024
+CONTACT_FIELDS = ('owner_contact', 'administrative_contact', 'technical_contact')
+
+
+class APIError(Exception):
+
+    def __init__(self, status, message):
+        super(APIError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+def zone_name(zone):
+    return zone['subdomain'] and "{}.{}" . format(zone['subdomain'], zone['domain']) or zone['domain']
+
+
+def same_name(a, b):
+    return (a or '').rstrip('.').lower() == (b or '').rstrip('.').lower()
+
+
+def paginate(items, key, params, max_page_size=None):
+    page = int(params.get('page', 1))
+    page_size = min(int(params.get('page_size', 20)), max_page_size or float('inf'))
+    start = (page - 1) * page_size
+    return {key: items[start:start + page_size], "total_count": len(items)}
+
+
+def check_cname_conflicts(records):
+    """A CNAME can not be next to other records of its name."""
+    types = {}
+    for record in records:
+        types.setdefault(record['name'].lower().rstrip('.'), set()).add(record['type'])
+    for name, name_types in types.items():
+        if 'CNAME' in name_types and len(name_types) > 1:
+            raise APIError(400, 'CNAME {} conflicts with the other records of its name' . format(name or '@'))
+
+
+def bind_line(record):
+    data = record['data']
+    if record['type'] in ('MX', 'SRV') and record.get('priority') is not None:
+        data = "{} {}" . format(record['priority'], data)
+    return "{} {} IN {} {}\n" . format(record['name'] or '@', record['ttl'], record['type'], data)
+
+
+def parse_bind(content):
+    """Records of a simple bind zone content: name [ttl] [IN] type [priority] data, one per line."""
+    records = []
+    ttl = DEFAULT_TTL
+    for line in content.splitlines():
+        line = line.split(';', 1)[0].strip()
+        if line.startswith('$TTL'):
+            ttl = int(line.split()[1])
+            continue
+        if not line or line.startswith('$'):
+            continue
+        fields = line.split()
+        name = fields.pop(0)
+        record_ttl = ttl
+        if fields and fields[0].isdigit():
+            record_ttl = int(fields.pop(0))
+        if fields and fields[0].upper() == 'IN':
+            fields.pop(0)
+        if len(fields) < 2:
+            raise APIError(400, 'invalid bind line: {}' . format(line))
+        record_type = fields.pop(0).upper()
+        if record_type == 'SOA':
+            continue
+        priority = 0
+        if record_type in ('MX', 'SRV'):
+            priority = int(fields.pop(0))
+        records.append({
+            "name": '' if name == '@' else name,
+            "ttl": record_ttl,
+            "type": record_type,
+            "priority": priority,
+            "data": ' '.join(fields),
+            "comment": None,
+        })
+    return records
+
+
+class FakeScaleway(object):
+
+    def __init__(self, version='v2alpha2', token=TOKEN):
+        self.version = version
+        self.token = token
+        self.lock = threading.Lock()
+        self.dns_zones = {}
+        self.records = {}
+        self.domains = {}
+        self.contacts = {}
+        self.log = []
+        # connections opened by the clients
+        self.connections = 0
+        self.latency = 0
+        # the page size the list endpoints cap page_size to
+        self.max_page_size = None
+        self.faults = []
+        self.serial = itertools.count(2020010100)
+        # buying or renewing a domain and recreating a dns zone go on once
+        # answered: the domain or dns zone is pending until its status was
+        # read work_reads times, then gets its status in work_results, active
+        # by default
+        self.work_reads = 2
+        self.work = {}
+        self.work_results = {}
+        self.server = None
+
+        self.routes = [
+            ('GET', r'/dns-zones', self.list_dns_zones),
+            ('DELETE', r'/dns-zones/(?P<zone>[^/]+)', self.delete_dns_zone),
+            ('GET', r'/dns-zones/(?P<zone>[^/]+)/records', self.list_records),
+            ('PATCH', r'/dns-zones/(?P<zone>[^/]+)/records', self.update_records),
+            ('GET', r'/dns-zones/(?P<zone>[^/]+)/raw', self.export_raw),
+            ('POST', r'/dns-zones/(?P<zone>[^/]+)/raw', self.import_raw),
+            ('POST', r'/dns-zones/(?P<zone>[^/]+)/refresh', self.refresh_dns_zone),
+            ('GET', r'/domains', self.list_domains),
+            ('POST', r'/domains', self.buy_domain),
+            ('GET', r'/domains/(?P<domain>[^/]+)', self.get_domain),
+            ('PATCH', r'/domains/(?P<domain>[^/]+)', self.update_domain),
+            ('POST', r'/domains/(?P<domain>[^/]+)/renew', self.renew_domain),
+            ('POST', r'/domains/(?P<domain>[^/]+)/lock-transfer', self.lock_transfer),
+            ('POST', r'/domains/(?P<domain>[^/]+)/unlock-transfer', self.unlock_transfer),
+            ('POST', r'/domains/(?P<domain>[^/]+)/enable-auto-renew', self.enable_auto_renew),
+            ('POST', r'/domains/(?P<domain>[^/]+)/disable-auto-renew', self.disable_auto_renew),
+            ('GET', r'/domains/(?P<domain>[^/]+)/auth-code', self.auth_code),
+            ('GET', r'/contacts', self.list_contacts),
+            ('GET', r'/contacts/(?P<contact>[^/]+)', self.get_contact),
+            ('PATCH', r'/contacts/(?P<contact>[^/]+)', self.update_contact),
+        ]
+
+    # state
+
+    def add_dns_zone(self, domain, subdomain='', records=(), ns=None):
+        zone = {
+            "domain": domain,
+            "subdomain": subdomain,
+            "ns": list(ns or DEFAULT_NS),
+            "ns_default": list(DEFAULT_NS),
+            "ns_master": [],
+            "status": "active",
+            "message": None,
+            "updated_at": None,
+        }
+        name = zone_name(zone)
+        self.dns_zones[name] = zone
+        self.records[name] = []
+        self.insert_records(name, records)
+        self.touch(name)
+        return name
+
+    def add_domain(self, domain, **fields):
+        self.domains[domain] = dict({
+            "domain": domain,
+            "organization_id": str(uuid.uuid4()),
+            "status": "active",
+            "auto_renew_status": "disabled",
+            "epp_code": ["clientDeleteProhibited"],
+            "expired_at": "2030-01-01T00:00:00Z",
+            "owner_contact": None,
+            "administrative_contact": None,
+            "technical_contact": None,
+        }, **fields)
+        return self.domains[domain]
+
+    def add_contact(self, **fields):
+        contact = dict({
+            "id": str(uuid.uuid4()),
+            "legal_form": "individual",
+            "firstname": "John",
+            "lastname": "Doe",
+            "email": "john.doe@example.com",
+            "phone_number": "+33.123456789",
+            "address1": "8 rue de la Ville l'Eveque",
+            "zip": "75008",
+            "city": "Paris",
+            "country": "FR",
+            "domains": [],
+        }, **fields)
+        self.contacts[contact['id']] = contact
+        return contact
+
+    def zone_records(self, dns_zone, name=None, record_type=None):
+        return [record for record in self.records[dns_zone]
+                if (name is None or same_name(record['name'], name)) and record_type in (None, record['type'])]
+
+    def insert_records(self, dns_zone, records):
+        inserted = []
+        for record in records:
+            record = dict({"ttl": DEFAULT_TTL, "priority": 0, "comment": None}, **record)
+            record['id'] = str(uuid.uuid4())
+            self.records[dns_zone].append(record)
+            inserted.append(record)
+        return inserted
+
+    def touch(self, dns_zone):
+        # the records changed: new serial, as the real zone does
+        self.dns_zones[dns_zone]['updated_at'] = "{}" . format(next(self.serial))
+
+    def start_work(self, name, resource, status):
+        resource['status'] = status
+        self.work[name] = [self.work_reads, resource]
+
+    def read_work(self, name):
+        work = self.work.get(name)
+        if work is None:
+            return
+        work[0] -= 1
+        if work[0] <= 0:
+            work[1]['status'] = self.work_results.get(name, 'active')
+            del self.work[name]
+
+    def fail_next(self, status, method=None, path=None, times=1, retry_after=None, after=0):
+        """Answer status to times requests matching method and path (a regex), once after requests passed."""
+        self.faults.append({
+            "status": status,
+            "method": method,
+            "path": path,
+            "times": times,
+            "retry_after": retry_after,
+            "after": after,
+        })
+
+    def requests(self, method=None, path=None):
+        """Logged requests, optionally filtered on method and path regex."""
+        return [entry for entry in self.log
+                if method in (None, entry['method']) and (path is None or re.search(path, entry['path']))]
+
+    # server
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}" . format(self.server.server_address[1])
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are written separately, without nagle the
+            # delayed ack of the client does not add 40ms to every request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with fake.lock:
+                    fake.connections += 1
+
+            def handle_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                entry = {"method": self.command, "request_bytes": len(body), "response_bytes": 0}
+                status, data, headers = fake.handle(entry, self.path, self.headers, body)
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if len(payload) > GZIP_MIN_SIZE and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+                    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                    payload = compressor.compress(payload) + compressor.flush()
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(payload)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                # logged before the response, which the client may read before this thread goes on
+                entry['status'] = status
+                entry['response_bytes'] = len(payload)
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_request
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+            # the modules open up to max_concurrency connections at once, an
+            # overflowing listen queue makes the client retry them after 1s
+            request_queue_size = 128
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, entry, raw_path, headers, body):
+        """Status, body and headers of the response to a request, logged in entry."""
+        if self.latency:
+            time.sleep(self.latency)
+
+        method = entry['method']
+        url = urlsplit(raw_path)
+        params = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        entry.update(path=url.path, params=params, body=json.loads(body.decode('utf-8')) if body else None)
+        with self.lock:
+            self.log.append(entry)
+            fault = self.take_fault(method, url.path)
+            if fault is not None:
+                extra = {}
+                if fault['retry_after'] is not None:
+                    extra['Retry-After'] = str(fault['retry_after'])
+                return fault['status'], {"message": "injected error", "type": "fake"}, extra
+
+            if headers.get('x-auth-token') != self.token:
+                return 401, {"message": "authentication is denied", "type": "denied_authentication"}, {}
+
+            prefix = "/domain/{}" . format(self.version)
+            if not url.path.startswith(prefix):
+                return 404, {"message": "resource is not found", "type": "not_found"}, {}
+            path = url.path[len(prefix):]
+            for route_method, pattern, handler in self.routes:
+                match = re.match(pattern + '$', path)
+                if route_method == method and match:
+                    try:
+                        return 200, handler(params=params, body=json.loads(body.decode('utf-8')) if body else {},
+                                            **match.groupdict()), {}
+                    except APIError as e:
+                        return e.status, {"message": e.message, "type": "invalid_arguments"}, {}
+                    except Exception as e:
+                        return 500, {"message": repr(e), "type": "internal_error"}, {}
+            return 404, {"message": "resource is not found", "type": "not_found"}, {}
+
+    def take_fault(self, method, path):
+        for fault in self.faults:
+            if fault['method'] not in (None, method):
+                continue
+            if fault['path'] is not None and not re.search(fault['path'], path):
+                continue
+            if fault['after'] > 0:
+                fault['after'] -= 1
+                continue
+            fault['times'] -= 1
+            if fault['times'] <= 0:
+                self.faults.remove(fault)
+            return fault
+        return None
+
+    # dns zones
+
+    def dns_zone(self, zone):
+        if zone not in self.dns_zones:
+            raise APIError(404, 'dns zone {} is not found' . format(zone))
+        return zone
+
+    def list_dns_zones(self, params, body):
+        names = [name for name, zone in sorted(self.dns_zones.items(), key=lambda item: (item[1]['domain'], item[1]['subdomain']))
+                 if params.get('dns_zone') in (None, name) and params.get('domain') in (None, zone['domain'])]
+        for name in names:
+            self.read_work(name)
+        zones = [self.dns_zones[name] for name in names]
+        return paginate(zones, 'dns_zones', params, self.max_page_size)
+
+    def delete_dns_zone(self, params, body, zone):
+        self.dns_zone(zone)
+        del self.dns_zones[zone]
+        del self.records[zone]
+        return {}
+
+    def refresh_dns_zone(self, params, body, zone):
+        self.dns_zone(zone)
+        self.touch(zone)
+        if body.get('recreate_dns_zone') or body.get('recreate_sub_dns_zone'):
+            self.start_work(zone, self.dns_zones[zone], 'pending')
+        return {"dns_zones": [self.dns_zones[zone]]}
+
+    def list_records(self, params, body, zone):
+        self.dns_zone(zone)
+        return paginate(self.zone_records(zone, params.get('name'), params.get('type')), 'records', params, self.max_page_size)
+
+    def update_records(self, params, body, zone):
+        self.dns_zone(zone)
+        records = self.records[zone]
+        # the changes of a request are applied all or nothing
+        before = copy.deepcopy(records)
+        try:
+            changed = self.apply_changes(zone, body.get('changes', []))
+        except APIError:
+            records[:] = before
+            raise
+        self.touch(zone)
+        return {"records": copy.deepcopy(records if body.get('return_all_records', True) else changed)}
+
+    def apply_changes(self, zone, changes):
+        records = self.records[zone]
+        changed = []
+        for change in changes:
+            if 'add' in change:
+                changed.extend(self.insert_records(zone, change['add']['records']))
+            elif 'set' in change:
+                target = change['set']
+                records[:] = [record for record in records
+                              if not (same_name(record['name'], target['name']) and record['type'] == target['type'])]
+                changed.extend(self.insert_records(zone, target['records']))
+            elif 'delete' in change:
+                target = change['delete']
+                kept = []
+                for record in records:
+                    if target.get('id'):
+                        deleted = record['id'] == target['id']
+                    else:
+                        deleted = same_name(record['name'], target['name']) and record['type'] == target['type'] and \
+                            target.get('data') in (None, record['data'])
+                    if not deleted:
+                        kept.append(record)
+                records[:] = kept
+            elif 'clear' in change:
+                del records[:]
+            else:
+                raise APIError(400, 'unknown change {}' . format(sorted(change)))
+            check_cname_conflicts(records)
+        return changed
+
+    def export_raw(self, params, body, zone):
+        self.dns_zone(zone)
+        if params.get('format', 'bind') != 'bind':
+            raise APIError(400, 'unknown format {}' . format(params['format']))
+        # the soa carries the serial of the zone, as in a real export
+        content = "@ 3600 IN SOA ns0.dom.scw.cloud. hostmaster.scaleway.com. {} 10800 3600 604800 3600\n" . format(
+            self.dns_zones[zone]['updated_at'] or 1)
+        content += ''.join(bind_line(record) for record in self.records[zone])
+        return {"name": zone, "content": base64.b64encode(content.encode('utf-8')).decode('ascii')}
+
+    def import_raw(self, params, body, zone):
+        self.dns_zone(zone)
+        if body.get('format', 'bind') != 'bind':
+            raise APIError(400, 'unknown format {}' . format(body['format']))
+        records = parse_bind(body.get('content') or '')
+        del self.records[zone][:]
+        self.insert_records(zone, records)
+        self.touch(zone)
+        return {"records": copy.deepcopy(self.records[zone])}
+
+    # domains
+
+    def domain(self, domain):
+        if domain not in self.domains:
+            raise APIError(404, 'domain {} is not found' . format(domain))
+        return self.domains[domain]
+
+    def list_domains(self, params, body):
+        # the list holds summaries of the domains, without their contacts
+        domains = [dict((key, value) for key, value in domain.items() if key not in CONTACT_FIELDS)
+                   for name, domain in sorted(self.domains.items()) if params.get('status') in (None, domain['status'])]
+        return paginate(domains, 'domains', params, self.max_page_size)
+
+    def get_domain(self, params, body, domain):
+        self.read_work(domain)
+        return {"domain": self.domain(domain)}
+
+    def buy_domain(self, params, body):
+        if body['domain'] in self.domains:
+            raise APIError(409, 'domain {} is already registered' . format(body['domain']))
+        domain = self.add_domain(body['domain'], organization_id=body.get('organization_id'))
+        self.start_work(body['domain'], domain, 'creating')
+        return {"domain": domain}
+
+    def renew_domain(self, params, body, domain):
+        domain = self.domain(domain)
+        year = int(domain['expired_at'][:4]) + int(body.get('period') or 1)
+        domain['expired_at'] = "{}{}" . format(year, domain['expired_at'][4:])
+        self.start_work(domain['domain'], domain, 'renewing')
+        return {"domain": domain}
+
+    def update_domain(self, params, body, domain):
+        domain = self.domain(domain)
+        for contact_type in ('owner_contact', 'administrative_contact', 'technical_contact'):
+            if body.get(contact_type + '_id'):
+                domain[contact_type] = self.contact(body[contact_type + '_id'])
+            elif body.get(contact_type):
+                domain[contact_type] = self.add_contact(**body[contact_type])
+        return {"domain": domain}
+
+    def lock_transfer(self, params, body, domain):
+        domain = self.domain(domain)
+        if 'clientTransferProhibited' not in domain['epp_code']:
+            domain['epp_code'].append('clientTransferProhibited')
+        return {"domain": domain}
+
+    def unlock_transfer(self, params, body, domain):
+        domain = self.domain(domain)
+        domain['epp_code'] = [code for code in domain['epp_code'] if code != 'clientTransferProhibited']
+        return {"domain": domain}
+
+    def enable_auto_renew(self, params, body, domain):
+        domain = self.domain(domain)
+        domain['auto_renew_status'] = 'enabled'
+        return {"domain": domain}
+
+    def disable_auto_renew(self, params, body, domain):
+        domain = self.domain(domain)
+        domain['auto_renew_status'] = 'disabled'
+        return {"domain": domain}
+
+    def auth_code(self, params, body, domain):
+        self.domain(domain)
+        return {"auth_code": "fake-auth-code"}
+
+    # contacts
+
+    def contact(self, contact):
+        if contact not in self.contacts:
+            raise APIError(404, 'contact {} is not found' . format(contact))
+        return self.contacts[contact]
+
+    def list_contacts(self, params, body):
+        contacts = [contact for contact in self.contacts.values()
+                    if params.get('domain') in [None] + contact['domains']]
+        return paginate(contacts, 'contacts', params, self.max_page_size)
+
+    def get_contact(self, params, body, contact):
+        return self.contact(contact)
+
+    def update_contact(self, params, body, contact):
+        contact = self.contact(contact)
+        contact.update((key, value) for key, value in body.items() if value is not None)
+        return contact
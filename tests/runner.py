@@ -0,0 +1,40 @@
+# encoding: utf-8
+
+# Runs the modules of the role in the current process: the module_utils of
+# the role are added to the ansible.module_utils package, as ansible does
+# when it builds the module payload.
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import ansible.module_utils
+ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
+sys.path.insert(0, os.path.join(ROOT, 'library'))
+
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+
+def run_module(module_name, args, check_mode=False, diff=False):
+    """Run the module with args, return its result and the size of its json output."""
+    args = dict(args, _ansible_check_mode=check_mode, _ansible_diff=diff)
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    # required by recent ansible-core to serialize the result
+    basic._ANSIBLE_PROFILE = 'legacy'
+
+    module = importlib.import_module(module_name)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            module.main()
+        except SystemExit:
+            pass
+        else:
+            raise AssertionError('{} did not exit' . format(module_name))
+    return json.loads(output.getvalue()), len(output.getvalue())
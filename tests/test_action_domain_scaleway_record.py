@@ -0,0 +1,140 @@
+# encoding: utf-8
+
+import os
+
+import pytest
+
+from runner import ROOT
+
+try:
+    from importlib.util import module_from_spec, spec_from_file_location
+except ImportError:
+    module_from_spec = None
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    if module_from_spec is None:
+        pytest.skip('python 3 is required to load the action plugin')
+    monkeypatch.setenv('SCALEWAY_DOMAIN_DEFERRED_DIR', str(tmp_path.joinpath('deferred')))
+
+    spec = spec_from_file_location('action_domain_scaleway_record',
+                                   os.path.join(ROOT, 'action_plugins', 'domain_scaleway_record.py'))
+    plugin = module_from_spec(spec)
+    spec.loader.exec_module(plugin)
+    return plugin
+
+
+@pytest.fixture
+def action(plugin, run_module):
+    # the plugin is only driven through defer and flush, the modules it
+    # executes run in process against the fake api
+    action = plugin.ActionModule.__new__(plugin.ActionModule)
+    action._execute_module = lambda module_name, module_args, task_vars: run_module(module_name, **module_args)
+    return action
+
+
+def test_deferred_records_are_flushed_in_one_request(api, action):
+    api.add_dns_zone('example.com')
+
+    for host in range(3):
+        result = action.defer(dict(token='fake-token', endpoint=api.url, dns_zone='example.com',
+                                   name='host{}' . format(host), type='A', content='10.0.0.{}' . format(host)),
+                              {"inventory_hostname": 'host{}' . format(host)})
+        assert result['deferred']
+    assert api.log == []
+
+    result = action.flush(dict(token='fake-token', dns_zone='example.com'), {})
+
+    assert result['changed']
+    assert result['flushed'] == 3
+    assert [item['host'] for item in result['results']] == ['host0', 'host1', 'host2']
+    assert len(api.requests('PATCH')) == 1
+    assert len(api.records['example.com']) == 3
+
+    result = action.flush(dict(token='fake-token', dns_zone='example.com'), {})
+    assert result['flushed'] == 0
+
+
+def test_failed_flush_requeues_the_records(api, action):
+    api.add_dns_zone('example.com')
+    action.defer(dict(token='fake-token', endpoint=api.url, dns_zone='example.com', name='www', type='A',
+                      content='1.2.3.4'), {"inventory_hostname": 'host0'})
+    api.fail_next(400, method='PATCH')
+
+    result = action.flush(dict(token='fake-token'), {})
+    assert result['failed']
+
+    result = action.flush(dict(token='fake-token'), {})
+    assert result['flushed'] == 1
+    assert len(api.records['example.com']) == 1
+
+
+@pytest.mark.parametrize('record', [
+    dict(type='AA', content='1.2.3.4'),
+    dict(type='A', content='1.2.3.4', state='gone'),
+    dict(type='A', content='1.2.3.4', ttl='long'),
+    dict(type='A', content='', unique=True),
+])
+def test_invalid_record_fails_its_deferred_task(api, plugin, action, record):
+    api.add_dns_zone('example.com')
+
+    with pytest.raises(plugin.AnsibleActionFail):
+        action.defer(dict(record, token='fake-token', endpoint=api.url, dns_zone='example.com', name='bad'),
+                     {"inventory_hostname": 'host0'})
+    action.defer(dict(token='fake-token', endpoint=api.url, dns_zone='example.com', name='www', type='A', content='1.2.3.4',
+                      ttl='600', unique='yes'), {"inventory_hostname": 'host1'})
+
+    result = action.flush(dict(token='fake-token'), {})
+
+    assert result['flushed'] == 1
+    assert [(r['name'], r['ttl']) for r in api.records['example.com']] == [('www', 600)]
+
+
+def test_flush_returns_the_metrics_of_each_dns_zone(api, action):
+    api.add_dns_zone('example.com')
+    api.add_dns_zone('example.org')
+    for zone in ('example.com', 'example.org'):
+        action.defer(dict(token='fake-token', endpoint=api.url, dns_zone=zone, name='www', type='A', content='10.0.0.1'),
+                     {"inventory_hostname": 'host0'})
+
+    result = action.flush(dict(token='fake-token', collect_metrics=True), {})
+
+    assert sorted(metrics['dns_zone'] for metrics in result['metrics']) == ['example.com', 'example.org']
+    assert sum(metrics['requests'] for metrics in result['metrics']) == len(api.log)
+
+
+def test_queue_is_removed_after_the_flush(api, action, tmp_path):
+    deferred_dir = str(tmp_path.joinpath('deferred'))
+    for zone in ('example.com', 'example.org'):
+        api.add_dns_zone(zone)
+        action.defer(dict(token='fake-token', endpoint=api.url, dns_zone=zone, name='www', type='A', content='10.0.0.1'),
+                     {"inventory_hostname": 'host0'})
+
+    action.flush(dict(token='fake-token', dns_zone='example.com'), {})
+    # the records of the other dns zone are still queued
+    assert len(os.listdir(deferred_dir)) == 1
+
+    action.flush(dict(token='fake-token', dns_zone='example.org'), {})
+    assert os.listdir(deferred_dir) == []
+
+
+def test_queues_of_gone_runs_are_not_flushed(api, plugin, action, tmp_path):
+    api.add_dns_zone('example.com')
+    # an earlier run with the same pid, and a run still going on
+    deferred_dir = tmp_path.joinpath('deferred')
+    stale = deferred_dir.joinpath('{}-1' . format(os.getppid()))
+    running = deferred_dir.joinpath(plugin.run_id(os.getpid()))
+    for path in (stale, running):
+        path.mkdir(parents=True)
+        path.joinpath('queue.jsonl').write_text(u'{"endpoint": "%s", "version": "v2alpha2", "dns_zone": "example.com", '
+                                                u'"token": "%s", "host": "host0", "record": {"name": "old", "type": "A", '
+                                                u'"content": "10.0.0.1"}}\n' % (api.url, plugin.token_hash('fake-token')))
+
+    action.defer(dict(token='fake-token', endpoint=api.url, dns_zone='example.com', name='www', type='A',
+                      content='1.2.3.4'), {"inventory_hostname": 'host0'})
+    result = action.flush(dict(token='fake-token'), {})
+
+    assert result['flushed'] == 1
+    assert [r['name'] for r in api.records['example.com']] == ['www']
+    assert os.listdir(str(deferred_dir)) == [running.name]
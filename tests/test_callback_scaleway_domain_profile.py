@@ -0,0 +1,156 @@
+# encoding: utf-8
+
+import json
+import os
+
+import pytest
+
+from runner import ROOT
+
+
+class Task(object):
+
+    def __init__(self, name, action):
+        self.name = name
+        self.action = action
+        self._uuid = name
+
+    def get_name(self):
+        return self.name
+
+
+class Host(object):
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class Result(object):
+
+    def __init__(self, task, host, result):
+        self._task = task
+        self._host = Host(host)
+        self._result = result
+
+
+@pytest.fixture
+def callback(monkeypatch):
+    from ansible.plugins.loader import callback_loader
+    callback_loader.add_directory(os.path.join(ROOT, 'callback_plugins'))
+    monkeypatch.delenv('SCALEWAY_DOMAIN_COLLECT_METRICS', raising=False)
+
+    def load(**options):
+        plugin = callback_loader.get('scaleway_domain_profile')
+        plugin.set_options(direct=options)
+        plugin._display.display = lambda msg, **kwargs: plugin.lines.append(msg)
+        plugin._display.banner = lambda msg, **kwargs: plugin.lines.append(msg)
+        plugin.lines = []
+        return plugin
+    yield load
+    os.environ.pop('SCALEWAY_DOMAIN_COLLECT_METRICS', None)
+
+
+def run_task(plugin, task, host, result):
+    plugin.v2_playbook_on_task_start(task, False)
+    plugin.v2_runner_on_start(Host(host), task)
+    plugin.v2_runner_on_ok(Result(task, host, result))
+
+
+def test_profile_of_the_runs(api, run_module, callback):
+    api.add_dns_zone('example.com')
+    api.add_dns_zone('example.org')
+    plugin = callback()
+    records = Task('records', 'domain_scaleway_record')
+    for host, zone in (('host0', 'example.com'), ('host1', 'example.com'), ('host2', 'example.org')):
+        result = run_module('domain_scaleway_record', dns_zone=zone, name=host, type='A', content='10.0.0.1',
+                            collect_metrics=True)
+        run_task(plugin, records, host, result)
+    run_task(plugin, Task('debug', 'debug'), 'host0', {"msg": "hello"})
+
+    profile = plugin.profile()
+
+    assert profile['runs'] == 3
+    assert profile['requests'] == len(api.log) == 6
+    assert [(stats['task'], stats['hosts'], stats['requests']) for stats in profile['tasks']] == [('records', 3, 6)]
+    assert [(stats['dns_zone'], stats['requests']) for stats in profile['dns_zones']] == [('example.com', 4), ('example.org', 2)]
+    assert [(entry['endpoint'], entry['requests']) for entry in profile['endpoints']] == [
+        ('GET /dns-zones/*/records', 3), ('PATCH /dns-zones/*/records', 3)]
+    endpoint = profile['endpoints'][0]
+    assert endpoint['p50'] <= endpoint['p95'] <= endpoint['p99'] <= endpoint['max']
+
+
+def test_duplicate_get_requests(api, run_module, callback):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "10.0.0.1"}])
+    plugin = callback()
+    for name in ('first', 'second'):
+        result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com', collect_metrics=True)
+        run_task(plugin, Task(name, 'domain_scaleway_dns_zone'), 'host0', result)
+
+    profile = plugin.profile()
+
+    assert profile['duplicate_requests'] == 1
+    assert profile['duplicates'] == [{
+        "request": "GET /dns-zones/example.com/records?page=1&page_size=1000",
+        "count": 2,
+        "tasks": ['first', 'second'],
+    }]
+
+
+def test_metrics_of_loops_and_flush(callback):
+    plugin = callback()
+    call = {"method": "GET", "path": "/domains", "status": 200, "start": 0.0, "latency": 0.01, "retries": 1}
+    metrics = {"requests": 1, "retries": 1, "api_time": 0.01, "total_time": 0.02, "calls": [call]}
+    run_task(plugin, Task('loop', 'domain_scaleway_domain'), 'host0', {"results": [{"metrics": metrics}, {"metrics": metrics}]})
+    run_task(plugin, Task('flush', 'namespace.collection.domain_scaleway_record'), 'host0', {"metrics": [
+        dict(metrics, dns_zone='example.com'),
+    ]})
+
+    profile = plugin.profile()
+
+    assert [(stats['task'], stats['requests'], stats['retries']) for stats in profile['tasks'][:2]] in (
+        [('loop', 2, 2), ('flush', 1, 1)], [('flush', 1, 1), ('loop', 2, 2)])
+    assert profile['dns_zones'][0]['dns_zone'] == 'example.com'
+    assert profile['retries'] == 3
+
+
+def test_summary_json_and_trace(api, run_module, callback, tmp_path):
+    api.add_dns_zone('example.com')
+    plugin = callback(json_path=str(tmp_path / 'profile.json'), trace_path=str(tmp_path / 'trace.json'))
+    task = Task('record', 'domain_scaleway_record')
+    plugin.v2_playbook_on_task_start(task, False)
+    plugin.v2_runner_on_start(Host('host0'), task)
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='10.0.0.1',
+                        collect_metrics=True)
+    plugin.v2_runner_on_ok(Result(task, 'host0', result))
+
+    plugin.v2_playbook_on_stats(None)
+
+    assert any('GET /dns-zones/*/records' in line for line in plugin.lines)
+    with open(str(tmp_path / 'profile.json')) as f:
+        profile = json.load(f)
+    assert profile['requests'] == 2
+    assert profile['runs'][0]['host'] == 'host0'
+    with open(str(tmp_path / 'trace.json')) as f:
+        events = json.load(f)['traceEvents']
+    assert [event['ph'] for event in events] == ['M', 'X', 'X', 'X']
+    assert [event['cat'] for event in events[1:]] == ['domain_scaleway_record', 'api', 'api']
+    task = events[1]
+    for call in events[2:]:
+        assert task['ts'] <= call['ts'] <= task['ts'] + task['dur']
+
+
+def test_modules_on_the_controller_collect_metrics(callback):
+    callback()
+    assert os.environ['SCALEWAY_DOMAIN_COLLECT_METRICS'] == '1'
+
+
+def test_collect_metrics_from_the_environment(api, run_module, monkeypatch):
+    api.add_dns_zone('example.com')
+    monkeypatch.setenv('SCALEWAY_DOMAIN_COLLECT_METRICS', '1')
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones')
+
+    assert result['metrics']['requests'] == 1
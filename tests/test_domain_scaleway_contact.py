@@ -0,0 +1,80 @@
+# encoding: utf-8
+
+
+def test_get_contact(api, run_module):
+    contact = api.add_contact()
+
+    result = run_module('domain_scaleway_contact', action='get_contact', id=contact['id'])
+
+    assert not result['changed']
+    assert result['contents']['email'] == contact['email']
+
+
+def test_update_contact(api, run_module):
+    contact = api.add_contact()
+
+    result = run_module('domain_scaleway_contact', action='update_contact', id=contact['id'],
+                        contact={"email": "jane.doe@example.com", "city": "Lyon"})
+
+    assert result['changed']
+    assert api.contacts[contact['id']]['email'] == 'jane.doe@example.com'
+    assert api.contacts[contact['id']]['city'] == 'Lyon'
+
+
+def test_update_contact_check_mode(api, run_module):
+    contact = api.add_contact()
+
+    result = run_module('domain_scaleway_contact', check_mode=True, diff=True, action='update_contact', id=contact['id'],
+                        contact={"email": contact['email'], "city": "Lyon"})
+
+    assert result['changed']
+    assert result['diff'] == {"before": {"city": "Paris"}, "after": {"city": "Lyon"}}
+    assert api.contacts[contact['id']]['city'] == 'Paris'
+
+
+def test_unknown_contact(run_module):
+    result = run_module('domain_scaleway_contact', action='get_contact', id='unknown')
+
+    assert result['failed']
+    assert result['meta']['status'] == 404
+
+
+def test_update_contact_only_sends_the_changes(api, run_module):
+    contact = api.add_contact()
+
+    result = run_module('domain_scaleway_contact', action='update_contact', id=contact['id'],
+                        contact={"email": contact['email'], "city": "Lyon"})
+
+    assert result['changed']
+    assert result['data'] == {"city": "Lyon"}
+    assert api.requests('PATCH')[0]['body'] == {"city": "Lyon"}
+
+    result = run_module('domain_scaleway_contact', action='update_contact', id=contact['id'],
+                        contact={"email": contact['email'], "city": "Lyon"})
+    assert not result['changed']
+    assert len(api.requests('PATCH')) == 1
+
+
+def test_update_several_contacts(api, run_module):
+    contacts = [api.add_contact(email='hostmaster@example.com')] + [api.add_contact() for i in range(4)]
+
+    result = run_module('domain_scaleway_contact', action='update_contact', max_concurrency=3,
+                        ids=[contact['id'] for contact in contacts], contact={"email": "hostmaster@example.com"})
+
+    assert result['changed']
+    assert [item['id'] for item in result['contacts']] == [contact['id'] for contact in contacts]
+    assert [item['changed'] for item in result['contacts']] == [False, True, True, True, True]
+    assert len(api.requests('PATCH')) == 4
+    assert all(contact['email'] == 'hostmaster@example.com' for contact in api.contacts.values())
+
+
+def test_update_several_contacts_failure(api, run_module):
+    contact = api.add_contact()
+
+    result = run_module('domain_scaleway_contact', action='update_contact', fail_fast=False,
+                        ids=['unknown', contact['id']], contact={"city": "Lyon"})
+
+    assert result['failed']
+    assert result['contacts'][0]['meta']['status'] == 404
+    assert result['contacts'][1]['changed']
+    assert api.contacts[contact['id']]['city'] == 'Lyon'
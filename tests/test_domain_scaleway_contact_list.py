@@ -0,0 +1,13 @@
+# encoding: utf-8
+
+
+def test_list_contacts(api, run_module):
+    api.add_contact(domains=['example.com'])
+    api.add_contact(domains=['example.org'])
+
+    result = run_module('domain_scaleway_contact_list', action='list_contacts')
+    assert not result['changed']
+    assert len(result['contents']) == 2
+
+    result = run_module('domain_scaleway_contact_list', action='list_contacts', domain='example.org')
+    assert [contact['domains'] for contact in result['contents']] == [['example.org']]
@@ -0,0 +1,369 @@
+# encoding: utf-8
+
+import base64
+import hashlib
+import os
+
+
+def test_list_records(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "", "type": "MX", "data": "mx.example.com.", "priority": 10},
+    ])
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com')
+
+    assert not result['changed']
+    assert [(r['name'], r['type'], r.get('priority')) for r in result['contents']] == [('www', 'A', None), ('', 'MX', 10)]
+
+
+def test_list_records_filters(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "www", "type": "AAAA", "data": "::1"},
+        {"name": "_acme-challenge", "type": "TXT", "data": "token1"},
+        {"name": "_acme-challenge.www", "type": "TXT", "data": "token2"},
+        {"name": "_sip._tcp", "type": "SRV", "data": "0 5060 SIP.example.com.", "priority": 10},
+    ])
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com', name='www', type=['A'])
+    assert [(r['name'], r['type']) for r in result['contents']] == [('www', 'A')]
+    # the name and the single type are filtered by the api
+    assert api.requests('GET', '/records$')[-1]['params'] == {"name": "www", "type": "A", "page": "1", "page_size": "1000"}
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com',
+                        name_prefix='_acme-challenge', fields=['name', 'data'])
+    assert result['contents'] == [{"name": "_acme-challenge", "data": "token1"}, {"name": "_acme-challenge.www", "data": "token2"}]
+    assert result['count'] == 2
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com', type=['A', 'SRV'],
+                        data='0 5060 sip.example.com')
+    assert result['contents'] == [{"name": "_sip._tcp", "ttl": 86400, "type": "SRV", "data": "0 5060 SIP.example.com.",
+                                   "comment": None, "priority": 10}]
+    assert 'type' not in api.requests('GET', '/records$')[-1]['params']
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com', type=['TXT'], count_only=True)
+    assert result['contents'] == []
+    assert result['count'] == 2
+
+
+def test_list_records_filters_with_zone_cache(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "mail", "type": "A", "data": "1.1.1.2"},
+    ])
+    args = dict(action='list_records', dns_zone='example.com', zone_cache=True, zone_cache_dir=str(tmp_path / 'zones'))
+
+    assert run_module('domain_scaleway_dns_zone', count_only=True, **args)['count'] == 2
+    result = run_module('domain_scaleway_dns_zone', name='mail', **args)
+
+    assert [r['data'] for r in result['contents']] == ['1.1.1.2']
+    # the second run filtered the snapshot of the zone
+    assert len(api.requests('GET', '/records$')) == 1
+
+
+def test_clear(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', action='clear', dns_zone='example.com')
+
+    assert result['changed']
+    assert api.records['example.com'] == []
+
+
+def test_clear_check_mode(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', check_mode=True, diff=True, action='clear', dns_zone='example.com')
+
+    assert result['changed']
+    assert result['diff']['before'] == "www 86400 A 1.1.1.1\n"
+    assert len(api.records['example.com']) == 1
+
+
+def test_export_and_import_raw(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', dns_zone='example.com')
+    assert result['contents'][0].endswith(" SOA ns0.dom.scw.cloud. hostmaster.scaleway.com. {} 10800 3600 604800 3600\n"
+                                          "www 86400 IN A 1.1.1.1\n" . format(api.dns_zones['example.com']['updated_at']))
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com',
+                        import_content="@ 600 IN MX 10 mx.example.com.\napi 60 IN A 2.2.2.2\n")
+    assert result['changed']
+    assert [(r['name'], r['type'], r['priority']) for r in api.records['example.com']] == [('', 'MX', 10), ('api', 'A', 0)]
+    assert base64.b64decode(api.export_raw({}, {}, 'example.com')['content']).endswith(b'\n@ 600 IN MX 10 mx.example.com.\napi 60 IN A 2.2.2.2\n')
+
+
+def test_export_raw_to_dest(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+    zones = tmp_path / 'zones'
+    zones.mkdir()
+    dest = str(zones / 'example.com.zone')
+
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', dns_zone='example.com', dest=dest)
+
+    with open(dest, 'rb') as f:
+        content = f.read()
+    assert result['changed']
+    assert result['contents'] == []
+    assert result['size'] == len(content)
+    assert result['sha256'] == hashlib.sha256(content).hexdigest()
+    assert str(result['serial']) == api.dns_zones['example.com']['updated_at']
+    assert content.endswith(b"www 86400 IN A 1.1.1.1\n")
+
+    # same export, the file is left as is
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', dns_zone='example.com', dest=dest)
+    assert not result['changed']
+    assert os.listdir(str(zones)) == ['example.com.zone']
+
+    api.insert_records('example.com', [{"name": "api", "type": "A", "data": "2.2.2.2"}])
+    api.touch('example.com')
+    result = run_module('domain_scaleway_dns_zone', check_mode=True, action='export_raw', dns_zone='example.com', dest=dest)
+    assert result['changed']
+    assert str(result['serial']) == api.dns_zones['example.com']['updated_at']
+    with open(dest, 'rb') as f:
+        assert f.read() == content
+
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', dns_zone='example.com', dest=dest)
+    assert result['changed']
+    with open(dest, 'rb') as f:
+        assert b"api 86400 IN A 2.2.2.2\n" in f.read()
+
+
+def test_export_raw_to_missing_directory(api, run_module, tmp_path):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', dns_zone='example.com',
+                        dest=str(tmp_path / 'missing' / 'example.com.zone'))
+
+    assert result['failed']
+    assert api.log == []
+
+
+def test_refresh_and_delete(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone', action='refresh', dns_zone='example.com')
+    assert result['changed']
+    assert api.requests('POST', '/refresh$')[0]['body'] == {"recreate_dns_zone": False, "recreate_sub_dns_zone": False}
+
+    result = run_module('domain_scaleway_dns_zone', action='delete', dns_zone='example.com')
+    assert result['changed']
+    assert 'example.com' not in api.dns_zones
+
+
+def test_refresh_recreate_and_wait(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone', action='refresh', dns_zone='example.com', refresh_recreate_dns_zone=True)
+    assert 'status' not in result
+    assert api.dns_zones['example.com']['status'] == 'pending'
+
+    result = run_module('domain_scaleway_dns_zone', action='refresh', dns_zone='example.com', refresh_recreate_dns_zone=True,
+                        wait=True)
+    assert result['changed']
+    assert result['status'] == 'active'
+    assert result['polls'] == 2
+
+    api.work_results['example.com'] = 'error'
+    result = run_module('domain_scaleway_dns_zone', action='refresh', dns_zones=['example.com'],
+                        refresh_recreate_sub_dns_zone=True, wait=True)
+    assert result['failed']
+    assert result['dns_zones'][0]['msg'] == 'dns zone example.com is error'
+    assert result['dns_zones'][0]['changed']
+
+
+def test_unknown_dns_zone(run_module):
+    result = run_module('domain_scaleway_dns_zone', action='refresh', dns_zone='unknown.com')
+
+    assert result['failed']
+    assert result['meta']['status'] == 404
+
+    result = run_module('domain_scaleway_dns_zone', check_mode=True, action='delete', dns_zone='unknown.com')
+    assert result['failed']
+
+
+def zone_file(tmp_path, count):
+    path = tmp_path / 'example.com.zone'
+    with open(str(path), 'w') as f:
+        f.write("$TTL 3600\n@ IN SOA ns0.dom.scw.cloud. root.example.com. ( 1 2 3 4 5 )\n")
+        for i in range(count):
+            f.write("host{} IN A 10.0.{}.{}\n" . format(i, i // 256, i % 256))
+    return str(path)
+
+
+def test_import_zone_file_by_chunks(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "old", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com',
+                        src=zone_file(tmp_path, 25), chunk_size=10)
+
+    assert result['changed']
+    assert result['imported'] == 25
+    assert result['skipped'] == 1
+    assert [(batch['records'], batch['deleted'], batch['first_line'], batch['last_line']) for batch in result['batches']] == [
+        (10, 0, 3, 12), (10, 0, 13, 22), (5, 1, 23, 27),
+    ]
+    # the zone is not cleared, the rrset missing from the file is deleted last
+    patches = api.requests('PATCH')
+    assert [list(change) for change in patches[0]['body']['changes']] == [['add']]
+    assert [list(change) for change in patches[2]['body']['changes']] == [['add'], ['delete']]
+    assert sorted(r['name'] for r in api.records['example.com']) == sorted("host{}" . format(i) for i in range(25))
+    assert api.requests('POST', '/raw$') == []
+
+    # the same file again changes nothing, in check mode as for real
+    for check_mode in (True, False):
+        result = run_module('domain_scaleway_dns_zone', check_mode=check_mode, action='import_raw', dns_zone='example.com',
+                            src=zone_file(tmp_path, 25), chunk_size=10)
+        assert not result['changed']
+    assert len(api.requests('PATCH')) == 3
+
+
+def test_import_sets_the_changed_rrsets(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[
+        {"name": "host0", "type": "A", "data": "1.1.1.1"},
+        {"name": "host0", "type": "A", "data": "10.0.0.0"},
+        {"name": "host1", "type": "CNAME", "data": "www.example.com."},
+    ])
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com', src=zone_file(tmp_path, 2))
+
+    assert result['changed']
+    # the CNAME is deleted before the A record of its name is added
+    assert api.requests('PATCH')[0]['body']['changes'] == [
+        {"delete": {"name": "host1", "type": "CNAME"}},
+        {"set": {"name": "host0", "type": "A", "records": [
+            {"name": "host0", "type": "A", "data": "10.0.0.0", "ttl": 3600, "priority": 0, "comment": None}]}},
+        {"add": {"records": [{"name": "host1", "type": "A", "data": "10.0.0.1", "ttl": 3600, "priority": 0, "comment": None}]}},
+    ]
+    assert sorted((r['name'], r['type'], r['data']) for r in api.records['example.com']) == [
+        ('host0', 'A', '10.0.0.0'), ('host1', 'A', '10.0.0.1')]
+
+
+def test_import_invalid_zone_file(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "old", "type": "A", "data": "1.1.1.1"}])
+    path = tmp_path / 'bad.zone'
+    path.write_text(u"www A 192.0.2.1\nbad A 300.0.0.1\nmx MX mx.example.com.\n")
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com', src=str(path))
+
+    assert result['failed']
+    assert [error['line'] for error in result['errors']] == [2, 3]
+    assert api.requests('PATCH') == []
+    assert len(api.records['example.com']) == 1
+
+
+def test_import_failed_chunk(api, run_module, tmp_path):
+    api.add_dns_zone('example.com')
+    api.fail_next(400, method='PATCH', after=1)
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com',
+                        src=zone_file(tmp_path, 5), chunk_size=2)
+
+    assert result['failed']
+    assert result['imported'] == 2
+    assert [batch['request'] for batch in result['batches']] == [0]
+    assert (result['batch']['first_line'], result['batch']['last_line']) == (5, 6)
+    # the records of the first request stay, the zone was not cleared
+    assert sorted(r['name'] for r in api.records['example.com']) == ['host0', 'host1']
+
+
+def test_import_zone_file_raw(api, run_module, tmp_path):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone', action='import_raw', dns_zone='example.com',
+                        src=zone_file(tmp_path, 3), import_mode='raw')
+
+    assert result['changed']
+    assert api.requests('POST', '/raw$')[0]['body']['content'].startswith('$TTL 3600')
+    assert api.requests('PATCH') == []
+
+
+def test_import_zone_file_check_mode(api, run_module, tmp_path):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone', check_mode=True, diff=True, action='import_raw',
+                        dns_zone='example.com', src=zone_file(tmp_path, 2))
+
+    assert result['changed']
+    assert result['imported'] == 2
+    assert result['diff']['after'] == "host0 3600 A 10.0.0.0\nhost1 3600 A 10.0.0.1\n"
+    assert set(entry['method'] for entry in api.log) == set(['GET'])
+
+
+def test_refresh_several_dns_zones(api, run_module):
+    for i in range(6):
+        api.add_dns_zone('example{}.com' . format(i))
+    api.latency = 0.1
+
+    result = run_module('domain_scaleway_dns_zone', action='refresh', max_concurrency=6,
+                        dns_zones=['example{}.com' . format(i) for i in range(6)])
+
+    assert result['changed']
+    assert [zone['dns_zone'] for zone in result['dns_zones']] == ['example{}.com' . format(i) for i in range(6)]
+    assert all(zone['meta']['status'] == 200 and zone['elapsed'] >= 0.1 for zone in result['dns_zones'])
+    assert len(api.requests('POST', '/refresh$')) == 6
+    # the zones ran in parallel
+    assert max(zone['elapsed'] for zone in result['dns_zones']) < 0.5
+
+
+def test_export_the_dns_zones_of_a_domain(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+    api.add_dns_zone('example.com', subdomain='sub')
+    api.add_dns_zone('other.com')
+
+    result = run_module('domain_scaleway_dns_zone', action='export_raw', domain='example.com', dest=str(tmp_path))
+
+    assert [zone['dns_zone'] for zone in result['dns_zones']] == ['example.com', 'sub.example.com']
+    assert all(zone['changed'] for zone in result['dns_zones'])
+    with open(str(tmp_path / 'example.com.zone')) as f:
+        assert f.read().endswith("www 86400 IN A 1.1.1.1\n")
+    assert (tmp_path / 'sub.example.com.zone').exists()
+
+
+def test_several_dns_zones_fail_fast(api, run_module):
+    for i in range(4):
+        api.add_dns_zone('example{}.com' . format(i), records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', action='clear', max_concurrency=1,
+                        dns_zones=['example0.com', 'unknown.com', 'example2.com', 'example3.com'])
+
+    assert result['failed']
+    assert [zone.get('failed', False) for zone in result['dns_zones']] == [False, True, False, False]
+    assert result['dns_zones'][1]['meta']['status'] == 404
+    assert [zone.get('skipped', False) for zone in result['dns_zones']] == [False, False, True, True]
+    # the unknown dns zone failed at the read of its records
+    assert [entry['status'] for entry in api.requests('PATCH')] == [200]
+
+
+def test_several_dns_zones_continue_on_error(api, run_module):
+    for i in range(4):
+        api.add_dns_zone('example{}.com' . format(i), records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_dns_zone', action='clear', max_concurrency=2, fail_fast=False,
+                        dns_zones=['example0.com', 'unknown.com', 'example2.com', 'example3.com'])
+
+    assert result['failed']
+    assert result['changed']
+    assert [zone['dns_zone'] for zone in result['dns_zones'] if zone.get('failed')] == ['unknown.com']
+    assert sorted(entry['status'] for entry in api.requests('PATCH')) == [200, 200, 200]
+
+
+def test_clear_reports_the_same_changed_in_check_mode(api, run_module):
+    api.add_dns_zone('example.com')
+
+    for check_mode in (True, False):
+        result = run_module('domain_scaleway_dns_zone', check_mode=check_mode, action='clear', dns_zone='example.com')
+        assert not result['changed']
+    assert api.requests('PATCH') == []
+
+
+def test_several_dns_zones_check_mode(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+    api.add_dns_zone('example.org')
+
+    result = run_module('domain_scaleway_dns_zone', check_mode=True, action='clear', dns_zones=['example.com', 'example.org'])
+
+    assert [zone['changed'] for zone in result['dns_zones']] == [True, False]
+    assert api.requests('PATCH') == []
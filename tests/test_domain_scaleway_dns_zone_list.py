@@ -0,0 +1,25 @@
+# encoding: utf-8
+
+
+def test_list_dns_zones(api, run_module):
+    api.add_dns_zone('example.com')
+    api.add_dns_zone('example.com', subdomain='sub')
+    api.add_dns_zone('example.org')
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones', page_size=2)
+
+    assert not result['changed']
+    assert result['total'] == 3
+    assert [(zone['domain'], zone['subdomain']) for zone in result['contents']] == [
+        ('example.com', ''), ('example.com', 'sub'), ('example.org', ''),
+    ]
+
+
+def test_list_dns_zones_of_a_domain(api, run_module):
+    api.add_dns_zone('example.com')
+    api.add_dns_zone('example.org')
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones', domain='example.org')
+
+    assert [zone['domain'] for zone in result['contents']] == ['example.org']
+    assert api.log[0]['params']['domain'] == 'example.org'
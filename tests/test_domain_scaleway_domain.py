@@ -0,0 +1,228 @@
+# encoding: utf-8
+
+
+def test_get_domain(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', action='get_domain', domain='example.com')
+
+    assert not result['changed']
+    assert result['contents']['domain'] == 'example.com'
+
+
+def test_get_unknown_domain(run_module):
+    result = run_module('domain_scaleway_domain', action='get_domain', domain='unknown.com')
+
+    assert result['failed']
+    assert result['meta']['status'] == 404
+
+
+def test_buy_domain(api, run_module):
+    result = run_module('domain_scaleway_domain', action='buy_domain', domain='example.com',
+                        organization_id='11111111-1111-1111-1111-111111111111', period=1, contact_id='contact')
+
+    assert result['changed']
+    assert api.domains['example.com']['status'] == 'creating'
+    assert api.requests('POST')[0]['body']['contact_id'] == 'contact'
+
+
+def test_buy_domain_and_wait(api, run_module):
+    result = run_module('domain_scaleway_domain', action='buy_domain', domain='example.com', period=1, wait=True)
+
+    assert result['changed']
+    assert result['status'] == 'active'
+    assert result['contents']['domain']['status'] == 'active'
+    # creating at the first read, active at the second one, after the read
+    # which found the domain was not owned yet
+    assert result['polls'] == 2
+    assert [entry['status'] for entry in api.requests('GET', '/domains/example.com$')] == [404, 200, 200]
+
+
+def test_renew_domain_wait_error_and_timeout(api, run_module):
+    api.add_domain('example.com')
+    api.work_results['example.com'] = 'renew_error'
+
+    result = run_module('domain_scaleway_domain', action='renew_domain', domain='example.com', period=1, wait=True)
+
+    assert result['failed']
+    assert result['changed']
+    assert result['msg'] == 'domain example.com is renew_error'
+
+    api.work_reads = 100
+    result = run_module('domain_scaleway_domain', action='renew_domain', domain='example.com', period=1, wait=True,
+                        wait_timeout=0)
+
+    assert result['failed']
+    assert result['msg'] == 'domain example.com is still renewing after 0s'
+    assert result['polls'] == 1
+
+
+def test_buy_domain_check_mode(api, run_module):
+    api.add_domain('owned.com')
+
+    result = run_module('domain_scaleway_domain', check_mode=True, action='buy_domain', domain='new.com', period=1)
+    assert result['changed']
+
+    result = run_module('domain_scaleway_domain', check_mode=True, action='buy_domain', domain='owned.com', period=1)
+    assert not result['changed']
+    assert 'new.com' not in api.domains
+    assert api.requests('POST') == []
+
+
+def test_actions_report_the_same_changed_in_check_mode(api, run_module):
+    api.add_domain('example.com', epp_code=['clientTransferProhibited'])
+
+    for check_mode in (True, False):
+        result = run_module('domain_scaleway_domain', check_mode=check_mode, diff=True, action='lock_domain_transfer',
+                            domain='example.com')
+        assert not result['changed']
+        assert result['diff'] == {"before": {"transfer_locked": True}, "after": {"transfer_locked": True}}
+
+        result = run_module('domain_scaleway_domain', check_mode=check_mode, action='buy_domain', domain='example.com', period=1)
+        assert not result['changed']
+    assert api.requests('POST') == []
+
+
+def test_renew_domain(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', action='renew_domain', domain='example.com', period=2)
+
+    assert result['changed']
+    assert api.domains['example.com']['expired_at'].startswith('2032')
+
+
+def test_transfer_lock(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', check_mode=True, diff=True, action='lock_domain_transfer',
+                        domain='example.com')
+    assert result['changed']
+    assert result['diff'] == {"before": {"transfer_locked": False}, "after": {"transfer_locked": True}}
+
+    run_module('domain_scaleway_domain', action='lock_domain_transfer', domain='example.com')
+    assert 'clientTransferProhibited' in api.domains['example.com']['epp_code']
+
+    result = run_module('domain_scaleway_domain', check_mode=True, action='lock_domain_transfer', domain='example.com')
+    assert not result['changed']
+
+    run_module('domain_scaleway_domain', action='unlock_domain_transfer', domain='example.com')
+    assert 'clientTransferProhibited' not in api.domains['example.com']['epp_code']
+
+
+def test_auto_renew(api, run_module):
+    api.add_domain('example.com')
+
+    run_module('domain_scaleway_domain', action='enable_domain_auto_renew', domain='example.com')
+    assert api.domains['example.com']['auto_renew_status'] == 'enabled'
+
+    result = run_module('domain_scaleway_domain', check_mode=True, action='enable_domain_auto_renew', domain='example.com')
+    assert not result['changed']
+
+    run_module('domain_scaleway_domain', action='disable_domain_auto_renew', domain='example.com')
+    assert api.domains['example.com']['auto_renew_status'] == 'disabled'
+
+
+def test_update_domain(api, run_module):
+    contact = api.add_contact()
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', action='update_domain', domain='example.com',
+                        technical_contact_id=contact['id'])
+
+    assert result['changed']
+    assert api.domains['example.com']['technical_contact']['id'] == contact['id']
+
+    result = run_module('domain_scaleway_domain', check_mode=True, action='update_domain', domain='example.com',
+                        technical_contact_id=contact['id'])
+    assert not result['changed']
+
+
+def test_get_domain_auth_code(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', action='get_domain_auth_code', domain='example.com')
+
+    assert not result['changed']
+    assert result['contents'] == {"auth_code": "fake-auth-code"}
+
+
+def test_lock_several_domains(api, run_module):
+    api.add_domain('locked.com', epp_code=['clientTransferProhibited'])
+    for i in range(5):
+        api.add_domain('example{}.com' . format(i))
+
+    domains = ['locked.com'] + ['example{}.com' . format(i) for i in range(5)]
+    result = run_module('domain_scaleway_domain', action='lock_domain_transfer', domains=domains, max_concurrency=3)
+
+    assert result['changed']
+    assert [domain['changed'] for domain in result['domains']] == [False] + [True] * 5
+    # one read of the domains list, then only the domains to lock
+    assert len(api.requests('GET')) == 1
+    assert len(api.requests('POST', '/lock-transfer$')) == 5
+    assert all('clientTransferProhibited' in domain['epp_code'] for domain in api.domains.values())
+
+    result = run_module('domain_scaleway_domain', action='lock_domain_transfer', domains=domains)
+    assert not result['changed']
+    assert len(api.requests('POST')) == 5
+
+
+def test_update_several_domains(api, run_module):
+    api.add_domain('example.com', owner_contact={"id": "old"})
+    api.add_domain('example.org', owner_contact={"id": "new"})
+
+    result = run_module('domain_scaleway_domain', check_mode=True, diff=True, action='update_domain',
+                        domains=['example.com', 'example.org'], owner_contact_id='new')
+
+    assert [domain['changed'] for domain in result['domains']] == [True, False]
+    assert result['domains'][0]['diff'] == {"before": {"owner_contact_id": "old"}, "after": {"owner_contact_id": "new"}}
+    assert len(api.requests('GET', '/domains/')) == 2
+    assert api.requests('PATCH') == []
+
+    result = run_module('domain_scaleway_domain', action='update_domain', domains=['example.com', 'example.org'],
+                        owner_contact_id='new')
+    assert [entry['path'] for entry in api.requests('PATCH')] == ['/domain/v2alpha2/domains/example.com']
+
+
+def test_renew_several_domains_fail_fast(api, run_module):
+    api.add_domain('example.com')
+    api.add_domain('example.org')
+    api.add_domain('example.net')
+    api.fail_next(400, method='POST', path='/domains/example.org/renew')
+
+    result = run_module('domain_scaleway_domain', action='renew_domain', period=1, max_concurrency=1,
+                        domains=['example.com', 'example.org', 'example.net'])
+
+    assert result['failed']
+    assert result['changed']
+    assert [domain.get('failed', False) for domain in result['domains']] == [False, True, False]
+    assert result['domains'][1]['meta']['status'] == 400
+    assert result['domains'][2]['skipped']
+    assert api.domains['example.net']['expired_at'].startswith('2030')
+
+
+def test_several_domains_continue_on_error(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain', action='enable_domain_auto_renew', fail_fast=False,
+                        domains=['unknown.com', 'example.com'])
+
+    assert result['failed']
+    assert result['domains'][0]['meta']['status'] == 404
+    assert result['domains'][1]['changed']
+    assert api.domains['example.com']['auto_renew_status'] == 'enabled'
+
+
+def test_renew_several_domains_and_wait(api, run_module):
+    names = ['example{}.com' . format(i) for i in range(6)]
+    for name in names:
+        api.add_domain(name)
+    api.work_results['example3.com'] = 'renew_error'
+
+    result = run_module('domain_scaleway_domain', action='renew_domain', period=1, max_concurrency=6, fail_fast=False,
+                        domains=names, wait=True)
+
+    assert result['failed']
+    assert [domain['status'] for domain in result['domains']] == ['active'] * 3 + ['renew_error'] + ['active'] * 2
+    assert [domain['domain'] for domain in result['domains'] if domain.get('failed')] == ['example3.com']
+    assert all(domain['polls'] == 2 and domain['changed'] for domain in result['domains'])
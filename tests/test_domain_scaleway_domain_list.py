@@ -0,0 +1,61 @@
+# encoding: utf-8
+
+
+def test_list_domains(api, run_module):
+    for i in range(45):
+        api.add_domain('example{:02d}.com' . format(i))
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', page_size=10, max_concurrency=3)
+
+    assert not result['changed']
+    assert result['total'] == 45
+    assert [domain['domain'] for domain in result['contents']] == ['example{:02d}.com' . format(i) for i in range(45)]
+    assert len(api.log) == 5
+
+
+def test_list_domains_check_mode(api, run_module):
+    api.add_domain('example.com')
+
+    result = run_module('domain_scaleway_domain_list', check_mode=True, action='list_domains')
+
+    assert result['total'] == 1
+
+
+def test_audit_domains(api, run_module):
+    api.add_domain('expiring.com', expired_at='2000-01-01T00:00:00Z', owner_contact={"id": "1"})
+    api.add_domain('renewed.com', expired_at='2000-01-01T00:00:00Z', auto_renew_status='enabled')
+    api.add_domain('locked.com', expired_at='2000-01-01T00:00:00Z', epp_code=['clientTransferProhibited'])
+    api.add_domain('later.com')
+    api.add_domain('creating.com', expired_at='2000-01-01T00:00:00Z', status='creating')
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', status=['active'], expires_within=30,
+                        auto_renew=False, transfer_locked=False, details=True, fields=['domain', 'owner_contact'])
+
+    assert result['total'] == 4
+    assert result['matched'] == 1
+    assert result['contents'] == [{"domain": "expiring.com", "owner_contact": {"id": "1"}}]
+    assert api.requests('GET', '/domains$')[0]['params']['status'] == 'active'
+    assert [entry['path'] for entry in api.requests('GET', '/domains/')] == ['/domain/v2alpha2/domains/expiring.com']
+
+
+def test_domain_details_are_fetched_concurrently(api, run_module):
+    for i in range(30):
+        api.add_domain('example{:02d}.com' . format(i))
+    api.latency = 0.05
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', details=True, page_size=10,
+                        max_concurrency=10, fields=['domain', 'technical_contact'])
+
+    assert [domain['domain'] for domain in result['contents']] == ['example{:02d}.com' . format(i) for i in range(30)]
+    assert all('technical_contact' in domain for domain in result['contents'])
+    assert len(api.requests('GET', '/domains/')) == 30
+
+
+def test_domain_details_failure(api, run_module):
+    api.add_domain('example.com')
+    api.fail_next(403, method='GET', path='/domains/example.com')
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', details=True)
+
+    assert result['failed']
+    assert result['meta']['status'] == 403
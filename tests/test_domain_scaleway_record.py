@@ -0,0 +1,113 @@
+# encoding: utf-8
+
+
+def test_add_record(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4')
+
+    assert result['changed']
+    assert [(r['name'], r['type'], r['data']) for r in api.records['example.com']] == [('www', 'A', '1.2.3.4')]
+
+
+def test_existing_record_is_not_written(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4')
+
+    assert not result['changed']
+    assert api.requests('PATCH') == []
+
+
+def test_unique_record_replaces_the_rrset(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "www", "type": "A", "data": "2.2.2.2"},
+    ])
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='3.3.3.3',
+                        unique=True, diff=True)
+
+    assert result['changed']
+    assert [r['data'] for r in api.records['example.com']] == ['3.3.3.3']
+    assert result['diff']['before'] == "www 86400 A 1.1.1.1\nwww 86400 A 2.2.2.2\n"
+    assert result['diff']['after'] == "www 86400 A 3.3.3.3\n"
+
+
+def test_delete_all_records_of_a_name(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "www", "type": "A", "data": "2.2.2.2"},
+        {"name": "www", "type": "AAAA", "data": "::1"},
+    ])
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', state='absent')
+
+    assert result['changed']
+    assert [r['type'] for r in api.records['example.com']] == ['AAAA']
+
+
+def test_check_mode_only_reads(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_record', check_mode=True, dns_zone='example.com', name='www', type='A',
+                        content='1.2.3.4')
+
+    assert result['changed']
+    assert result['changes'] == [{"add": {"records": [{
+        "name": "www", "type": "A", "ttl": 86400, "priority": 10, "data": "1.2.3.4", "comment": None,
+    }]}}]
+    assert set(entry['method'] for entry in api.log) == set(['GET'])
+    assert api.records['example.com'] == []
+
+
+def test_zone_cache(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+    args = dict(dns_zone='example.com', type='A', content='1.2.3.4', zone_cache=True, zone_cache_dir=str(tmp_path))
+
+    for name in ('www', 'www', 'api'):
+        run_module('domain_scaleway_record', name=name, **args)
+
+    # one full read, a cache hit, then a write and a new read after it
+    assert len(api.requests('GET', '/records$')) == 1
+    run_module('domain_scaleway_record', name='web', **args)
+    assert len(api.requests('GET', '/records$')) == 2
+    assert sorted(r['name'] for r in api.records['example.com']) == ['api', 'web', 'www']
+
+
+def test_return_records(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "mail", "type": "A", "data": "1.1.1.2"},
+    ])
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='2.2.2.2',
+                        return_records='rrset')
+
+    assert result['changed']
+    assert [r['data'] for r in result['records']] == ['1.1.1.1', '2.2.2.2']
+    assert all(r['id'] for r in result['records'])
+    assert result['meta']['serial'] == api.dns_zones['example.com']['updated_at']
+    assert api.requests('PATCH')[0]['body']['return_all_records']
+    # no listing of the records after the write
+    assert len(api.requests('GET', '/records$')) == 1
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='2.2.2.2',
+                        state='absent', return_records='zone', check_mode=True)
+
+    assert result['changed']
+    assert [(r['name'], r['data']) for r in result['records']] == [('mail', '1.1.1.2'), ('www', '1.1.1.1')]
+    assert len(api.requests('PATCH')) == 1
+
+
+def test_return_records_drops_the_zone_snapshot(api, run_module, tmp_path):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+    args = dict(dns_zone='example.com', type='A', content='1.2.3.4', zone_cache=True, zone_cache_dir=str(tmp_path))
+
+    result = run_module('domain_scaleway_record', name='api', return_records='zone', **args)
+    assert sorted(r['name'] for r in result['records']) == ['api', 'www']
+
+    # the records of the response are not stored: the next run reads the zone again
+    result = run_module('domain_scaleway_record', name='api', **args)
+    assert not result['changed']
+    assert len(api.requests('GET', '/records$')) == 2
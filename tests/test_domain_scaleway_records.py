@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+
+def test_batch_is_sent_in_one_request(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "old", "type": "A", "data": "1.1.1.1"}])
+    records = [{"name": "host{}" . format(i), "type": "A", "content": "10.0.0.{}" . format(i)} for i in range(50)]
+    records.append({"name": "old", "type": "A", "state": "absent"})
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records)
+
+    assert result['changed']
+    assert len(api.requests('PATCH')) == 1
+    assert result['dns_zones'] == [{"dns_zone": "example.com", "changes": 2, "requests": 1}]
+    assert sorted(r['name'] for r in api.records['example.com']) == sorted("host{}" . format(i) for i in range(50))
+
+
+def test_batch_is_chunked(api, run_module):
+    api.add_dns_zone('example.com')
+    records = [{"name": "host{}" . format(i), "type": "A", "content": "10.0.0.1"} for i in range(25)]
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records, chunk_size=10)
+
+    assert len(api.requests('PATCH')) == 3
+    assert [item['request'] for item in result['results']] == [0] * 10 + [1] * 10 + [2] * 5
+    assert len(api.records['example.com']) == 25
+
+
+def test_batch_only_sends_the_changes(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.1.1.1"}])
+    records = [
+        {"name": "www", "type": "A", "content": "1.1.1.1"},
+        {"name": "www", "type": "A", "content": "2.2.2.2", "unique": True},
+        {"name": "www", "type": "A", "content": "3.3.3.3", "unique": True},
+    ]
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records)
+
+    assert [item['changed'] for item in result['results']] == [False, True, True]
+    assert sorted(r['data'] for r in api.records['example.com']) == ['2.2.2.2', '3.3.3.3']
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records[1:])
+    assert not result['changed']
+    assert len(api.requests('PATCH')) == 1
+
+
+def test_records_are_applied_in_list_order(api, run_module):
+    api.add_dns_zone('example.com')
+    records = [
+        {"name": "www", "type": "A", "content": "1.1.1.1", "unique": True},
+        {"name": "mail", "type": "A", "content": "1.1.1.2", "unique": True},
+        {"name": "www", "type": "A", "state": "absent"},
+        {"name": "www", "type": "A", "content": "2.2.2.2", "unique": True},
+        {"name": "mail", "type": "A", "content": "2.2.2.3", "unique": True},
+    ]
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records)
+
+    # the absent www splits its unique records, nothing splits the ones of mail
+    assert sorted((r['name'], r['data']) for r in api.records['example.com']) == [
+        ('mail', '1.1.1.2'), ('mail', '2.2.2.3'), ('www', '2.2.2.2')]
+    assert [item['changed'] for item in result['results']] == [True, True, True, True, True]
+
+
+def test_records_of_several_zones(api, run_module):
+    api.add_dns_zone('example.com')
+    api.add_dns_zone('example.com', subdomain='sub')
+    records = [
+        {"name": "www", "type": "A", "content": "1.1.1.1"},
+        {"dns_zone": "sub.example.com", "name": "www", "type": "A", "content": "2.2.2.2"},
+    ]
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com', records=records)
+
+    assert [zone['dns_zone'] for zone in result['dns_zones']] == ['example.com', 'sub.example.com']
+    assert [r['data'] for r in api.records['sub.example.com']] == ['2.2.2.2']
+
+
+def test_failed_request(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(400, method='PATCH')
+
+    result = run_module('domain_scaleway_records', dns_zone='example.com',
+                        records=[{"name": "www", "type": "A", "content": "1.1.1.1"}])
+
+    assert result['failed']
+    assert result['meta']['status'] == 400
+    assert result['dns_zone'] == 'example.com'
@@ -0,0 +1,106 @@
+# encoding: utf-8
+
+import threading
+
+from fake_dns import RCODE_REFUSED
+
+
+def wait_args(dns, **args):
+    return dict(dns_zone='example.com', dns_servers=['127.0.0.1'], port=dns.port, delay=0.05, max_delay=0.1,
+                query_timeout=1, **args)
+
+
+def test_record_already_served(api, dns, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+
+    result = run_module('domain_scaleway_wait_record', name='www', type='A', content='1.2.3.4', **wait_args(dns))
+
+    assert not result.get('failed')
+    assert result['attempts'] == 1
+
+
+def test_wait_for_a_record(api, dns, run_module):
+    api.add_dns_zone('example.com')
+    timer = threading.Timer(0.2, api.insert_records, ['example.com', [{"name": "www", "type": "A", "data": "1.2.3.4"}]])
+    timer.start()
+
+    result = run_module('domain_scaleway_wait_record', name='www', type='A', content='1.2.3.4', timeout=10,
+                        **wait_args(dns))
+    timer.join()
+
+    assert not result.get('failed')
+    assert result['attempts'] > 1
+
+
+def test_wait_for_records_absent_and_mx(api, dns, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "", "type": "MX", "data": "mx.example.com.", "priority": 10}])
+    records = [
+        {"name": "@", "type": "MX", "content": "mx.example.com"},
+        {"name": "old", "type": "A", "state": "absent"},
+    ]
+
+    result = run_module('domain_scaleway_wait_record', records=records, **wait_args(dns))
+
+    assert not result.get('failed')
+
+
+def test_timeout(api, dns, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_wait_record', name='www', type='A', timeout=1, **wait_args(dns))
+
+    assert result['failed']
+    assert result['pending'][0]['fqdn'] == 'www.example.com.'
+
+
+def test_refused_answer_is_not_an_absent_record(api, dns, run_module):
+    api.add_dns_zone('example.com')
+    # a secondary which has not loaded the zone yet
+    dns.rcode = RCODE_REFUSED
+
+    result = run_module('domain_scaleway_wait_record', name='old', type='A', state='absent', timeout=1, **wait_args(dns))
+
+    assert result['failed']
+    assert result['records'][0]['answers']['127.0.0.1']['rcode'] == 'REFUSED'
+
+    dns.rcode = None
+    result = run_module('domain_scaleway_wait_record', name='old', type='A', state='absent', timeout=1, **wait_args(dns))
+    assert not result.get('failed')
+
+
+def test_label_too_long_fails(api, dns, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_wait_record', name='a' * 64, type='A', **wait_args(dns))
+
+    assert result['failed']
+    assert result['msg'].startswith('invalid name')
+    assert dns.queries == []
+
+
+def test_malformed_answer_is_not_an_answer(api, dns, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+    dns.cut_answers = 2
+
+    result = run_module('domain_scaleway_wait_record', name='www', type='A', content='1.2.3.4', timeout=1, **wait_args(dns))
+
+    assert result['failed']
+    assert result['records'][0]['answers']['127.0.0.1']['error'].startswith('malformed response')
+
+
+def test_tcp_fallback(api, dns, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "txt", "type": "TXT", "data": "hello"}])
+    dns.truncate_udp = True
+
+    result = run_module('domain_scaleway_wait_record', name='txt', type='TXT', content='hello', **wait_args(dns))
+
+    assert not result.get('failed')
+    assert [protocol for name, qtype, protocol in dns.queries] == ['udp', 'tcp']
+
+
+def test_nameservers_of_the_zone(api, dns, run_module):
+    api.add_dns_zone('example.com', ns=['127.0.0.1'], records=[{"name": "www", "type": "A", "data": "1.2.3.4"}])
+
+    result = run_module('domain_scaleway_wait_record', dns_zone='example.com', name='www', type='A', port=dns.port)
+
+    assert result['dns_servers'] == ['127.0.0.1']
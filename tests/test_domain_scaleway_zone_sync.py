@@ -0,0 +1,103 @@
+# encoding: utf-8
+
+
+def zone_records(count):
+    return [{"name": "host{}" . format(i), "type": "A", "data": "10.0.{}.{}" . format(i // 256, i % 256)} for i in range(count)]
+
+
+def desired(records):
+    return [{"name": r['name'], "type": r['type'], "content": r['data']} for r in records]
+
+
+def test_sync_only_sends_the_changes(api, run_module):
+    records = zone_records(2000)
+    api.add_dns_zone('example.com', records=records)
+    wanted = desired(records)
+    wanted[0]['content'] = '192.0.2.1'
+    wanted[1]['ttl'] = 60
+    del wanted[2]
+    wanted.append({"name": "new", "type": "A", "content": "192.0.2.2"})
+    wanted.append({"name": "txt", "type": "TXT", "content": "hello"})
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com', records=wanted)
+
+    assert result['changed']
+    assert result['records'] == 5
+    assert result['requests'] == 1
+    assert result['plan'] == {"rrsets_deleted": 1, "records_deleted": 0, "rrsets_set": 2, "records_added": 2}
+    patches = api.requests('PATCH')
+    assert len(patches) == 1
+    assert [list(change) for change in patches[0]['body']['changes']] == [['delete'], ['set'], ['set'], ['add']]
+    assert sorted((r['name'], r['data'], r['ttl']) for r in api.records['example.com']) == \
+        sorted((r['name'], r['content'], r.get('ttl', 86400)) for r in wanted)
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com', records=wanted)
+    assert not result['changed']
+    assert len(api.requests('PATCH')) == 1
+
+
+def test_sync_replaces_records_by_a_cname(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "www", "type": "A", "data": "1.1.1.1"},
+        {"name": "www", "type": "TXT", "data": "hello"},
+        {"name": "blog", "type": "CNAME", "data": "www.example.com."},
+    ])
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com', records=[
+        {"name": "www", "type": "CNAME", "content": "lb.example.com."},
+        {"name": "blog", "type": "A", "content": "2.2.2.2"},
+    ], chunk_size=1)
+
+    assert result['changed']
+    assert result['requests'] == 5
+    assert sorted((r['name'], r['type']) for r in api.records['example.com']) == [('blog', 'A'), ('www', 'CNAME')]
+
+
+def test_sync_rejects_cname_conflicts(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com', records=[
+        {"name": "www", "type": "CNAME", "content": "lb.example.com."},
+        {"name": "www", "type": "A", "content": "2.2.2.2"},
+    ])
+
+    assert result['failed']
+    assert api.log == []
+
+
+def test_sync_keeps_the_ns_of_the_zone(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "", "type": "NS", "data": "ns0.dom.scw.cloud."},
+        {"name": "old", "type": "A", "data": "1.1.1.1"},
+    ])
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com',
+                        records=[{"name": "@", "type": "A", "content": "2.2.2.2"}])
+
+    assert result['changed']
+    assert sorted((r['name'], r['type']) for r in api.records['example.com']) == [('', 'A'), ('', 'NS')]
+
+
+def test_sync_check_mode(api, run_module):
+    api.add_dns_zone('example.com', records=[{"name": "old", "type": "A", "data": "1.1.1.1"}])
+
+    result = run_module('domain_scaleway_zone_sync', check_mode=True, diff=True, dns_zone='example.com',
+                        records=[{"name": "www", "type": "A", "content": "2.2.2.2"}])
+
+    assert result['changed']
+    assert result['requests'] == 0
+    assert result['diff']['before'] == "old 86400 A 1.1.1.1\n"
+    assert result['diff']['after'] == "www 86400 A 2.2.2.2\n"
+    assert api.requests('PATCH') == []
+
+
+def test_sync_failed_request(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(400, method='PATCH')
+
+    result = run_module('domain_scaleway_zone_sync', dns_zone='example.com',
+                        records=[{"name": "www", "type": "A", "content": "2.2.2.2"}])
+
+    assert result['failed']
+    assert result['meta']['status'] == 400
+    assert result['request'] == 0
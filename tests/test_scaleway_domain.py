@@ -0,0 +1,86 @@
+# encoding: utf-8
+
+from ansible.module_utils.scaleway_domain import backoff_delay, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('') is None
+    assert parse_retry_after('not a date') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_backoff_delay_honours_retry_after():
+    assert backoff_delay(0, retry_after=0.002) >= 0.002
+
+
+def test_rate_limited_request_is_retried(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(429, method='GET', path='/dns-zones$', times=2, retry_after=0)
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones')
+
+    assert not result.get('failed')
+    assert len(api.requests('GET', '/dns-zones$')) == 3
+
+
+def test_server_error_is_retried_for_idempotent_requests(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(502, method='GET', times=1)
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones')
+
+    assert result['total'] == 1
+
+
+def test_server_error_is_not_retried_for_patch(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(502, method='PATCH')
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4')
+
+    assert result['failed']
+    assert result['meta']['status'] == 502
+    assert len(api.requests('PATCH')) == 1
+
+
+def test_retries_are_limited(api, run_module):
+    api.fail_next(503, times=10, retry_after=0)
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', max_retries=2)
+
+    assert result['failed']
+    assert result['meta']['status'] == 503
+    assert len(api.log) == 3
+
+
+def test_invalid_token(run_module):
+    result = run_module('domain_scaleway_domain_list', action='list_domains', token='wrong')
+
+    assert result['failed']
+    assert result['meta']['status'] == 401
+
+
+def test_pages_are_fetched_concurrently_in_order(api, run_module):
+    api.add_dns_zone('example.com', records=[
+        {"name": "host{:04d}" . format(i), "type": "A", "data": "10.0.0.1"} for i in range(250)
+    ])
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com',
+                        page_size=20, max_concurrency=4)
+
+    assert [record['name'] for record in result['contents']] == ["host{:04d}" . format(i) for i in range(250)]
+    assert len(api.requests('GET', '/records$')) == 13
+
+
+def test_pages_capped_by_the_api_are_all_fetched(api, run_module):
+    api.max_page_size = 100
+    api.add_dns_zone('example.com', records=[
+        {"name": "host{:04d}" . format(i), "type": "A", "data": "10.0.0.1"} for i in range(250)
+    ])
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com', page_size=1000)
+
+    assert [record['name'] for record in result['contents']] == ["host{:04d}" . format(i) for i in range(250)]
+    assert sorted((request['params']['page'], request['params']['page_size']) for request in api.requests('GET', '/records$')) == [
+        ('1', '1000'), ('2', '100'), ('3', '100')]
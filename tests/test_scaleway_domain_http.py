@@ -0,0 +1,179 @@
+# encoding: utf-8
+
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from ansible.module_utils.scaleway_domain_http import HTTPTransport, TransportError
+from ansible.module_utils.six.moves import http_client
+
+from fake_scaleway import TOKEN, FakeScaleway
+
+
+@pytest.fixture
+def fake():
+    api = FakeScaleway().start()
+    yield api
+    api.stop()
+
+
+def transport(pool_size=10):
+    return HTTPTransport({"x-auth-token": TOKEN, "Content-Type": "application/json"}, True, pool_size)
+
+
+def test_connections_are_kept_alive(fake):
+    fake.add_dns_zone('example.com')
+    http = transport()
+
+    for i in range(5):
+        response = http.request('GET', fake.url + '/domain/v2alpha2/dns-zones', params={"dns_zone": "example.com", "page": None})
+        assert response.status_code == 200
+        assert response.json()['total_count'] == 1
+
+    assert fake.connections == 1
+    assert fake.log[0]['params'] == {"dns_zone": "example.com"}
+
+
+def test_responses_are_compressed(fake):
+    fake.add_dns_zone('example.com', records=[{"name": "host{}" . format(i), "type": "A", "data": "10.0.0.1"} for i in range(500)])
+
+    response = transport().request('GET', fake.url + '/domain/v2alpha2/dns-zones/example.com/records', params={"page_size": 1000})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert len(response.json()['records']) == 500
+    assert fake.log[0]['response_bytes'] < len(response.content) / 5
+
+
+def test_request_body_and_errors(fake):
+    fake.add_dns_zone('example.com')
+    body = json.dumps({"return_all_records": False, "changes": []}, separators=(',', ':'))
+
+    response = transport().request('PATCH', fake.url + '/domain/v2alpha2/dns-zones/example.com/records', body=body)
+    assert response.status_code == 200
+    assert fake.log[0]['request_bytes'] == len(body)
+
+    response = transport().request('GET', fake.url + '/domain/v2alpha2/dns-zones/unknown.com/records')
+    assert response.status_code == 404
+    assert response.headers.get('Content-Type') == 'application/json'
+
+
+class ClosedConnection(object):
+    sock = None
+
+    def request(self, *args):
+        raise http_client.BadStatusLine('')
+
+    def close(self):
+        pass
+
+
+def test_closed_connection_is_replaced(fake):
+    fake.add_dns_zone('example.com')
+    http = transport()
+    http.idle[('http', fake.url.split('//')[1])] = [ClosedConnection(), ClosedConnection()]
+
+    response = http.request('GET', fake.url + '/domain/v2alpha2/dns-zones')
+
+    assert response.status_code == 200
+    assert fake.connections == 1
+
+
+class DroppingServer(object):
+    """Answers the first request of each connection, then reads the next one and closes without answering.
+
+    With close_idle, the connection is closed right after the first answer instead.
+    """
+
+    def __init__(self, close_idle=False):
+        self.close_idle = close_idle
+        self.requests = []
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.url = "http://127.0.0.1:{}" . format(self.listener.getsockname()[1])
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def read_request(self, connection):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = connection.recv(65536)
+            if not chunk:
+                return None
+            data += chunk
+        self.requests.append(data.split(b'\r\n')[0].decode('ascii'))
+        return data
+
+    def serve(self):
+        while True:
+            try:
+                connection = self.listener.accept()[0]
+            except socket.error:
+                return
+            if self.read_request(connection) is not None:
+                connection.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: application/json\r\n\r\n{}')
+                if not self.close_idle:
+                    self.read_request(connection)
+            connection.close()
+
+    def stop(self):
+        self.listener.close()
+
+
+def test_post_is_not_sent_again_on_a_failed_reused_connection():
+    server = DroppingServer()
+    http = transport()
+    try:
+        assert http.request('GET', server.url + '/domains').status_code == 200
+
+        with pytest.raises(TransportError):
+            http.request('POST', server.url + '/domains/example.com/renew', body='{}')
+        assert server.requests == ['GET /domains HTTP/1.1', 'POST /domains/example.com/renew HTTP/1.1']
+
+        # a GET can be sent again on a new connection
+        assert http.request('GET', server.url + '/domains').status_code == 200
+    finally:
+        server.stop()
+
+
+def test_idle_connection_closed_by_the_server_is_not_used():
+    server = DroppingServer(close_idle=True)
+    http = transport()
+    try:
+        http.request('GET', server.url + '/domains')
+        time.sleep(0.1)
+
+        response = http.request('POST', server.url + '/domains/example.com/renew', body='{}')
+
+        assert response.status_code == 200
+        assert server.requests == ['GET /domains HTTP/1.1', 'POST /domains/example.com/renew HTTP/1.1']
+    finally:
+        server.stop()
+
+
+def test_connection_error():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+
+    with pytest.raises(TransportError):
+        transport().request('GET', 'http://127.0.0.1:{}/domain/v2alpha2/dns-zones' . format(port))
+
+
+def test_proxy_goes_through_open_url(fake, monkeypatch):
+    fake.add_dns_zone('example.com')
+    # the fake api is its own proxy: it is sent the absolute url
+    monkeypatch.setenv('http_proxy', fake.url)
+    monkeypatch.setenv('no_proxy', '')
+    monkeypatch.delenv('NO_PROXY', raising=False)
+
+    response = transport().request('GET', 'http://api.invalid/domain/v2alpha2/dns-zones', params={"page": 1})
+
+    assert response.status_code == 200
+    assert response.json()['dns_zones'][0]['domain'] == 'example.com'
+    assert fake.log[0]['path'] == '/domain/v2alpha2/dns-zones'
@@ -0,0 +1,83 @@
+# encoding: utf-8
+
+from ansible.module_utils.scaleway_domain_metrics import Metrics
+
+
+def test_no_metrics_by_default(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones')
+
+    assert 'metrics' not in result
+
+
+def test_metrics_of_the_requests(api, run_module):
+    api.add_dns_zone('example.com')
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4',
+                        collect_metrics=True)
+
+    metrics = result['metrics']
+    assert metrics['requests'] == len(api.log) == 2
+    assert [(call['method'], call['path'], call['status']) for call in metrics['calls']] == [
+        ('GET', '/dns-zones/example.com/records', 200),
+        ('PATCH', '/dns-zones/example.com/records', 200),
+    ]
+    assert metrics['bytes_sent'] == sum(entry['request_bytes'] for entry in api.log)
+    assert metrics['bytes_received'] > 0
+    assert metrics['retries'] == 0
+    assert abs(metrics['api_time'] + metrics['local_time'] - metrics['total_time']) < 0.001
+
+
+def test_metrics_count_the_retries(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(429, method='GET', path='/dns-zones$', times=2, retry_after=0.01)
+
+    result = run_module('domain_scaleway_dns_zone_list', action='list_dns_zones', collect_metrics=True)
+
+    metrics = result['metrics']
+    assert metrics['requests'] == 1
+    assert metrics['retries'] == 2
+    assert metrics['calls'][0]['status'] == 200
+    assert metrics['calls'][0]['wait'] >= 0.02
+    assert metrics['wait_time'] == metrics['calls'][0]['wait']
+
+
+def test_metrics_of_a_failed_module(api, run_module):
+    api.add_dns_zone('example.com')
+    api.fail_next(400, method='PATCH')
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4',
+                        collect_metrics=True)
+
+    assert result['failed']
+    assert [call['status'] for call in result['metrics']['calls']] == [200, 400]
+
+
+def test_concurrent_requests_are_counted_once_in_the_api_time(api, run_module):
+    for i in range(4):
+        api.add_dns_zone('example{}.com' . format(i))
+    api.latency = 0.1
+
+    result = run_module('domain_scaleway_dns_zone', action='clear', max_concurrency=4, collect_metrics=True,
+                        dns_zones=['example{}.com' . format(i) for i in range(4)])
+
+    metrics = result['metrics']
+    assert metrics['requests'] == 4
+    assert sum(call['latency'] for call in metrics['calls']) >= 0.4
+    assert metrics['api_time'] < 0.3
+    assert metrics['api_time'] <= metrics['total_time']
+
+
+def test_api_time_spans_the_requests_in_flight():
+    metrics = Metrics()
+    first = metrics.begin()
+    second = metrics.begin()
+    metrics.end('GET', '/a', first, status=200)
+    assert metrics.result()['api_time'] >= 0
+    metrics.end('GET', '/b', second, status=None)
+
+    result = metrics.result()
+    assert result['requests'] == 2
+    assert [call['status'] for call in result['calls']] == [200, None]
+    assert result['api_time'] <= result['total_time']
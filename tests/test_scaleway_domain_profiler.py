@@ -0,0 +1,79 @@
+# encoding: utf-8
+
+import glob
+import os
+import pstats
+import subprocess
+import sys
+
+from ansible.module_utils.scaleway_domain_profiler import profile_name
+
+
+def profile_files(directory, pattern):
+    return sorted(glob.glob(os.path.join(str(directory), pattern)))
+
+
+def function_calls(path, name):
+    stats = pstats.Stats(path).stats
+    return sum(value[1] for key, value in stats.items() if key[2] == name)
+
+
+def test_profile_name():
+    assert profile_name('domain_scaleway_dns_zone', {"action": "list_records", "dns_zone": "example.com"}) == \
+        'domain_scaleway_dns_zone-list_records-example.com'
+    assert profile_name('domain_scaleway_dns_zone', {"action": "refresh", "dns_zones": ['a.com', 'b.com']}) == \
+        'domain_scaleway_dns_zone-refresh-2-dns_zones'
+    assert profile_name('domain_scaleway_record', {"state": "present", "dns_zone": "example.com/x"}) == \
+        'domain_scaleway_record-present-example.com_x'
+
+
+def test_profiling_modules_are_not_imported_by_default():
+    # in a fresh process, the test process has them imported already
+    code = ("import runner, sys; from ansible.module_utils import scaleway_domain_profiler; "
+            "print(' ' . join(name for name in ('cProfile', 'pstats', 'tracemalloc', 'resource') if name in sys.modules))")
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert output.decode('ascii').strip() == ''
+
+
+def test_module_is_not_profiled_by_default(api, run_module, tmp_path):
+    api.add_dns_zone('example.com')
+
+    run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com')
+
+    assert os.listdir(str(tmp_path)) == ['rate_limit']
+
+
+def test_profile_of_a_module_run(api, run_module, tmp_path, monkeypatch):
+    api.add_dns_zone('example.com', records=[
+        {"name": "host{}" . format(i), "type": "A", "data": "10.0.0.1"} for i in range(250)
+    ])
+    monkeypatch.setenv('SCALEWAY_DOMAIN_PROFILE_DIR', str(tmp_path / 'profiles'))
+
+    result = run_module('domain_scaleway_dns_zone', action='list_records', dns_zone='example.com',
+                        page_size=20, max_concurrency=4)
+
+    assert len(result['contents']) == 250
+    stats = profile_files(tmp_path / 'profiles', 'domain_scaleway_dns_zone-list_records-example.com-*.pstats')
+    assert len(stats) == 1
+    assert function_calls(stats[0], 'run_module') == 1
+    # the pages fetched by the worker threads are profiled too
+    assert function_calls(stats[0], 'fetch') == 13
+
+    report = profile_files(tmp_path / 'profiles', '*.memory.txt')
+    with open(report[0]) as f:
+        contents = f.read()
+    assert 'traced peak:' in contents
+    assert 'largest allocations alive at exit:' in contents
+
+
+def test_profile_without_tracemalloc(api, run_module, tmp_path, monkeypatch):
+    api.add_dns_zone('example.com')
+    monkeypatch.setenv('SCALEWAY_DOMAIN_PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('SCALEWAY_DOMAIN_PROFILE_MEMORY', 'false')
+
+    result = run_module('domain_scaleway_record', dns_zone='example.com', name='www', type='A', content='1.2.3.4')
+
+    assert result['changed']
+    assert len(profile_files(tmp_path / 'profiles', 'domain_scaleway_record-present-example.com-*.pstats')) == 1
+    with open(profile_files(tmp_path / 'profiles', '*.memory.txt')[0]) as f:
+        assert 'tracemalloc disabled' in f.read()
@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+import json
+import time
+
+import pytest
+
+from ansible.module_utils import scaleway_domain_ratelimit
+from ansible.module_utils.scaleway_domain_ratelimit import RateLimiter, rate_limit_quota
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # the waits are recorded instead of slept
+    waits = []
+    monkeypatch.setattr(scaleway_domain_ratelimit.time, 'sleep', waits.append)
+    return waits
+
+
+def test_bucket(tmp_path, sleeps):
+    limiter = RateLimiter(str(tmp_path / 'state.json'), 20)
+
+    waits = [limiter.acquire() for dummy in range(25)]
+
+    assert waits[:20] == [0.0] * 20
+    assert waits[20:] == sorted(waits[20:])
+    assert waits[-1] == pytest.approx(0.25, abs=0.05)
+
+
+def test_bucket_is_shared_by_the_processes(tmp_path, sleeps):
+    path = str(tmp_path / 'state.json')
+    first, second = RateLimiter(path, 10), RateLimiter(path, 10)
+
+    for dummy in range(10):
+        first.acquire()
+
+    assert second.acquire() == pytest.approx(0.1, abs=0.02)
+
+
+def test_rate_limited_response(tmp_path, sleeps):
+    limiter = RateLimiter(str(tmp_path / 'state.json'), 10)
+
+    limiter.update(429, {}, retry_after=2)
+
+    with open(limiter.path) as f:
+        assert json.load(f)['rate'] == 5
+    assert limiter.acquire() == pytest.approx(2, abs=0.05)
+
+    # the rate grows back with the successes
+    for dummy in range(100):
+        limiter.update(200, {})
+    with open(limiter.path) as f:
+        assert json.load(f)['rate'] == 10
+
+
+def test_rate_limit_headers(tmp_path, sleeps):
+    limiter = RateLimiter(str(tmp_path / 'state.json'), 10)
+
+    limiter.update(200, {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "5"})
+    with open(limiter.path) as f:
+        assert json.load(f)['rate'] == 2
+
+    limiter.update(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 3)})
+    assert limiter.acquire() == pytest.approx(3, abs=1)
+
+
+def test_rate_limit_quota():
+    assert rate_limit_quota({}, 1000) is None
+    assert rate_limit_quota({"RateLimit-Remaining": "5", "RateLimit-Reset": "2"}, 1000) == (5, 2)
+
+
+def test_modules_share_the_rate(api, run_module, rate_limit_dir):
+    api.add_domain('example.com')
+    api.fail_next(429, retry_after=0)
+
+    result = run_module('domain_scaleway_domain_list', action='list_domains', rate_limit=8)
+    assert result['total'] == 1
+
+    state, = [json.load(open(str(path))) for path in rate_limit_dir.iterdir()]
+    assert 4 <= state['rate'] < 8
+
+
+def test_rate_limit_disabled(api, run_module, rate_limit_dir):
+    result = run_module('domain_scaleway_domain_list', action='list_domains', rate_limit=0)
+
+    assert result['total'] == 0
+    assert not rate_limit_dir.exists()
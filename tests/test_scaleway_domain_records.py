@@ -0,0 +1,123 @@
+# encoding: utf-8
+
+from ansible.module_utils.scaleway_domain_records import (
+    ZoneRecords,
+    cname_conflicts,
+    format_records,
+    normalize_data,
+    plan_record_changes,
+    plan_zone_sync,
+    record_key,
+    split_changes,
+)
+
+
+def record(name, record_type, data, ttl=3600, priority=0, comment=None):
+    return {"name": name, "type": record_type, "data": data, "ttl": ttl, "priority": priority, "comment": comment}
+
+
+def test_record_key_normalization():
+    assert record_key(record('WWW.', 'CNAME', 'Target.Example.com.')) == ('www', 'CNAME', 'target.example.com')
+    assert record_key(record('@', 'TXT', '"v=spf1 -all"')) == ('', 'TXT', 'v=spf1 -all')
+    assert normalize_data('A', ' 1.2.3.4 ') == '1.2.3.4'
+
+
+def test_plan_present_record():
+    current = [record('www', 'A', '1.1.1.1')]
+
+    assert plan_record_changes(current, record('www', 'A', '1.1.1.1'), 'present', False) == []
+    assert plan_record_changes(current, record('www', 'A', '2.2.2.2'), 'present', False) == [
+        {"add": {"records": [record('www', 'A', '2.2.2.2')]}},
+    ]
+    changes = plan_record_changes(current, record('www', 'A', '1.1.1.1', ttl=60), 'present', False)
+    assert [list(change) for change in changes] == [['delete'], ['add']]
+
+
+def test_plan_unique_record():
+    current = [record('www', 'A', '1.1.1.1'), record('www', 'A', '2.2.2.2')]
+
+    changes = plan_record_changes(current, record('www', 'A', '1.1.1.1'), 'present', True)
+
+    assert changes == [{"set": {"name": "www", "type": "A", "records": [record('www', 'A', '1.1.1.1')]}}]
+    assert plan_record_changes(current[:1], record('www', 'A', '1.1.1.1'), 'present', True) == []
+
+
+def test_plan_absent_record():
+    current = [record('www', 'A', '1.1.1.1')]
+
+    assert plan_record_changes(current, record('www', 'A', '2.2.2.2'), 'absent', False) == []
+    assert plan_record_changes([], record('www', 'A', ''), 'absent', False) == []
+    assert plan_record_changes(current, record('www', 'A', ''), 'absent', False) == [
+        {"delete": {"name": "www", "type": "A"}},
+    ]
+
+
+def test_zone_records_apply():
+    zone = ZoneRecords([record('www', 'A', '1.1.1.1'), record('mail', 'MX', 'mx.example.com', priority=10)])
+
+    touched = zone.apply([
+        {"add": {"records": [record('www', 'A', '2.2.2.2')]}},
+        {"delete": {"name": "mail", "type": "MX"}},
+    ])
+
+    assert touched == set([('www', 'A'), ('mail', 'MX')])
+    assert format_records(zone.records()) == "www 3600 A 1.1.1.1\nwww 3600 A 2.2.2.2\n"
+
+
+def test_plan_zone_sync():
+    current = ZoneRecords([
+        record('www', 'A', '1.1.1.1'),
+        record('www', 'A', '2.2.2.2'),
+        record('old', 'A', '3.3.3.3'),
+        record('mail', 'MX', 'mx.example.com.', priority=10),
+        record('', 'NS', 'ns0.dom.scw.cloud.'),
+    ])
+    desired = [
+        record('www', 'A', '1.1.1.1'),
+        record('www', 'A', '2.2.2.2'),
+        record('www', 'A', '4.4.4.4'),
+        record('mail', 'MX', 'mx.example.com.', priority=20),
+        record('new', 'TXT', 'hello'),
+    ]
+
+    changes = plan_zone_sync(current, desired, keep=lambda key: key == ('', 'NS'))
+
+    assert changes == [
+        {"delete": {"name": "old", "type": "A"}},
+        {"set": {"name": "mail", "type": "MX", "records": [record('mail', 'MX', 'mx.example.com.', priority=20)]}},
+        {"add": {"records": [record('new', 'TXT', 'hello'), record('www', 'A', '4.4.4.4')]}},
+    ]
+    assert plan_zone_sync(current, current.records()) == []
+
+
+def test_plan_zone_sync_deletes_before_cname():
+    current = ZoneRecords([record('www', 'A', '1.1.1.1'), record('www', 'AAAA', '::1'), record('blog', 'CNAME', 'www.')])
+
+    changes = plan_zone_sync(current, [record('www', 'CNAME', 'lb.example.com.'), record('blog', 'A', '1.1.1.1')])
+
+    assert changes == [
+        {"delete": {"name": "blog", "type": "CNAME"}},
+        {"delete": {"name": "www", "type": "A"}},
+        {"delete": {"name": "www", "type": "AAAA"}},
+        {"add": {"records": [record('blog', 'A', '1.1.1.1'), record('www', 'CNAME', 'lb.example.com.')]}},
+    ]
+    assert cname_conflicts([record('www', 'CNAME', 'lb.'), record('WWW.', 'TXT', 'x')]) == ['www']
+
+
+def test_plan_zone_sync_patches_large_rrsets():
+    current = ZoneRecords([record('', 'TXT', str(i)) for i in range(10)])
+    desired = [record('', 'TXT', str(i)) for i in range(1, 11)]
+
+    assert plan_zone_sync(current, desired) == [
+        {"delete": {"name": "", "type": "TXT", "data": "0"}},
+        {"add": {"records": [record('', 'TXT', '10')]}},
+    ]
+
+
+def test_split_changes():
+    changes = [({"delete": {"name": "old", "type": "A"}}, [0]), ({"add": {"records": [record('a', 'A', '1.1.1.1')] * 5}}, [1, 2, 3, 4, 5])]
+
+    chunks = split_changes(changes, 3)
+
+    assert [[list(change)[0] for change, indexes in chunk] for chunk in chunks] == [['delete'], ['add'], ['add']]
+    assert [indexes for chunk in chunks for change, indexes in chunk] == [[0], [1, 2, 3], [4, 5]]
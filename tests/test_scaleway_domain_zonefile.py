@@ -0,0 +1,90 @@
+# encoding: utf-8
+
+import pytest
+
+from ansible.module_utils.scaleway_domain_zonefile import ZoneFileError, ZoneFileParser, tokenize
+
+ZONE = """$ORIGIN example.com.
+$TTL 1h
+@       IN  SOA ns0.dom.scw.cloud. root.example.com. (
+            2020010101 ; serial
+            1d 2h 4w 1h )
+@           NS  ns0.dom.scw.cloud.
+@       600 IN  MX  10 mx
+            IN  MX  20 mx2.example.net.
+www     60      A   192.0.2.1
+                A   192.0.2.2
+ftp             CNAME www
+txt             TXT "v=spf1 ; -all" "second"
+_sip._tcp       SRV 10 60 5060 sip.example.com.
+$ORIGIN sub.example.com.
+host            AAAA 2001:db8::1
+"""
+
+
+def parse(content, dns_zone='example.com'):
+    parser = ZoneFileParser(dns_zone, 86400)
+    return [record for line, record in parser.records(content.splitlines())], parser
+
+
+def test_tokenize():
+    assert tokenize('txt TXT "a ; b" ; comment') == ['txt', 'TXT', '"a ; b"']
+    assert tokenize('@ SOA ns. root. ( 1 2') == ['@', 'SOA', 'ns.', 'root.', '(', '1', '2']
+
+
+def test_parse_zone_file():
+    records, parser = parse(ZONE)
+
+    assert [(r['name'], r['ttl'], r['type'], r['priority'], r['data']) for r in records] == [
+        ('', 600, 'MX', 10, 'mx.example.com.'),
+        ('', 3600, 'MX', 20, 'mx2.example.net.'),
+        ('www', 60, 'A', 0, '192.0.2.1'),
+        ('www', 3600, 'A', 0, '192.0.2.2'),
+        ('ftp', 3600, 'CNAME', 0, 'www.example.com.'),
+        ('txt', 3600, 'TXT', 0, '"v=spf1 ; -all" "second"'),
+        ('_sip._tcp', 3600, 'SRV', 10, '60 5060 sip.example.com.'),
+        ('host.sub', 3600, 'AAAA', 0, '2001:db8::1'),
+    ]
+    assert parser.skipped == 2
+
+
+def test_previous_ttl_without_default():
+    records, parser = parse("a 300 A 192.0.2.1\nb A 192.0.2.2\n")
+
+    assert [r['ttl'] for r in records] == [300, 300]
+
+
+@pytest.mark.parametrize('line, error', [
+    ('www A 192.0.2.256', 'invalid ipv4 address'),
+    ('www AAAA 2001:db8::g', 'invalid ipv6 address'),
+    ('www MX mx.example.com.', 'MX expects 2 values'),
+    ('www 1x A 192.0.2.1', 'unsupported record type 1X'),
+    ('www IN HINFO a b', 'unsupported record type HINFO'),
+    ('www CH A 192.0.2.1', 'unsupported class CH'),
+    ('www.example.org. A 192.0.2.1', 'out of the dns zone'),
+    ('$INCLUDE other.zone', 'unsupported directive'),
+    ('www CNAME bad_host!', 'invalid hostname'),
+])
+def test_invalid_records(line, error):
+    with pytest.raises(ZoneFileError) as e:
+        parse("ok A 192.0.2.1\n" + line)
+
+    assert e.value.line == 2
+    assert error in e.value.msg
+
+
+def test_errors_are_collected():
+    errors = []
+    parser = ZoneFileParser('example.com', 86400)
+
+    records = list(parser.records(["a A 1.2.3", "b A 192.0.2.1", "c MX x"], errors))
+
+    assert len(records) == 1
+    assert [error.line for error in errors] == [1, 3]
+
+
+def test_unbalanced_parenthesis():
+    with pytest.raises(ZoneFileError) as e:
+        parse("@ SOA ns. root. ( 1 2 3 4 5\nwww A 192.0.2.1\n")
+
+    assert e.value.line == 1